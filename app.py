@@ -4,20 +4,21 @@ This is a simple Kivy application to test the performance of the ADC1115 and MCP
 '''
 
 # Standard imports.
+import threading
 import time
 
 # Third-party imports.
 from kivy.clock import Clock
 from kivy.lang import Builder
-from kivy.properties import DictProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
+from kivy.properties import BooleanProperty, DictProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
 from kivy.uix.screenmanager import NoTransition, ScreenManager
 from kivymd.app import MDApp
 from kivymd.uix.screen import MDScreen
 import settings.kivy_config
 
 # Local imports.
-from components import ADCDialog, ADCResults, MCPDialog, MCPResults
-from utility import ADC, MCP
+from components import ADCDialog, ADCResults, CapacityDialog, MCPDialog, MCPResults
+from utility import ADC, MCP, ADCProcess, MODE_CONTINUOUS, MODE_SINGLE, SEQUENCES, AdaptiveRefresh, CapacitySearch
 
 
 class StressTestApp(MDApp):
@@ -63,50 +64,77 @@ class ADCTestScreen(MDScreen):
 
     requests = NumericProperty()
     frequency = NumericProperty()
+    continuous = BooleanProperty(False)
+    data_rate = NumericProperty(128)
+    gain = NumericProperty(1)
+    process = BooleanProperty(False)
     requests_filled = NumericProperty()
     missed_requests = NumericProperty()
     bus_status = StringProperty('OK')
     last = NumericProperty()
     adc_task = None
+    capacity_task = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.adc = None
+        self.adc_snapshot = None
+        self.adc_refresh = None
+        self.capacity_search = None
+        self.capacity_thread = None
 
-    def start_adc_test(self, requests, frequency):
+    def start_adc_test(self, requests, frequency, continuous=False, data_rate=128, gain=1, process=False):
         ''' Test to simulate ADC readings. '''
         self.requests = int(requests)
         self.frequency = int(frequency)
+        self.continuous = continuous
+        self.data_rate = data_rate
+        self.gain = gain
+        self.process = process
         self.schedule_adc()
 
     def schedule_adc(self):
-        ''' Schedule the intervals for the ADC test. '''
-        self.adc = ADC()
-        self.adc_task = Clock.schedule_interval(self.update_adc_information, 1/60)
+        '''
+        Schedule the intervals for the ADC test, continuous mode reads once per conversion.
+        The worker process keeps the reads away from the GIL held by the UI.
+        '''
+        self.adc = (ADCProcess if self.process else ADC)(
+            gain=self.gain, requests=0 if self.continuous else self.requests, frequency=self.frequency,
+            mode=MODE_CONTINUOUS if self.continuous else MODE_SINGLE, data_rate=self.data_rate
+        )
+        self.adc_snapshot = None
+        self.adc_refresh = AdaptiveRefresh(min_interval=0.05, max_interval=0.5)
+        self.adc_refresh.start()
+        self.adc_task = Clock.schedule_once(self.update_adc_information, self.adc_refresh.interval)
         self.show_adc_dialog()
 
     def update_adc_information(self, *args):
-        ''' Update the ADC info on screen. '''
-        payload = self.adc.get_payload()
-        if payload is not None:
-            self.check_missed_payloads_adc()
-            self.adc_dialog.update_information(self.requests, self.requests_filled, self.missed_requests, payload)
+        '''
+        Update the ADC info on screen from a single snapshot, so every number shown existed together.
+        Only changed widgets are re-rendered and the next update is scheduled by the adaptive refresh.
+        '''
+        started = time.perf_counter()
+        snapshot = self.adc.get_snapshot()
+        if not snapshot.faults.bus_failed:
+            changed = False
+            if snapshot is not self.adc_snapshot:
+                self.adc_snapshot = snapshot
+                self.check_missed_payloads_adc(snapshot)
+                changed = self.adc_dialog.update_information(
+                    self.requests, snapshot.requests_filled, snapshot.missed_requests, snapshot.payload,
+                    snapshot.max_lateness, snapshot.latency_summary(), snapshot.achieved_rate, snapshot.configured_rate,
+                    snapshot.windows, snapshot.faults
+                )
+            interval = self.adc_refresh.frame(changed, time.perf_counter() - started)
+            self.adc_task = Clock.schedule_once(self.update_adc_information, interval)
         else:
             self.bus_status = 'FAILED'
             self.stop_adc_test()
 
-    def check_missed_payloads_adc(self, *args):
+    def check_missed_payloads_adc(self, snapshot):
         ''' Check for missed payloads in the ADC test. '''
-        total_requests = self.adc.get_requests_filled()
-        duration = self.adc.get_duration()
-        expected_total = (int(duration) / self.frequency) * self.requests
-        difference = int(expected_total) - total_requests
-        if expected_total > total_requests:
-            self.missed_requests = difference
-            self.requests_filled = int(total_requests)
-        else:
-            self.missed_requests = 0
-            self.requests_filled = int(expected_total)
+        self.requests_filled = snapshot.requests_filled
+        self.missed_requests = snapshot.missed_requests
 
     def show_adc_dialog(self):
         ''' Display a dialog with live statistics for the ongoing ADC test. '''
@@ -120,7 +148,13 @@ class ADCTestScreen(MDScreen):
         ''' Display the results of the ADC test. '''
         if not hasattr(self, 'adc_results'):
             self.adc_results = ADCResults(self)
-        self.adc_results.update_status(self.requests, self.requests_filled, self.missed_requests, self.bus_status)
+        snapshot = self.adc.get_snapshot()
+        self.check_missed_payloads_adc(snapshot)
+        self.adc_results.update_status(
+            self.requests, snapshot.requests_filled, snapshot.missed_requests, snapshot.latency_summary(),
+            snapshot.achieved_rate, snapshot.configured_rate, snapshot.windows, snapshot.faults, self.adc_refresh.report(),
+            self.bus_status
+        )
         self.adc_results.open()
 
     def stop_adc_test(self, instance=None):
@@ -134,6 +168,45 @@ class ADCTestScreen(MDScreen):
             self.adc.stop()
         self.show_adc_results()
 
+    def start_capacity_search(self, continuous=False, data_rate=128, gain=1):
+        '''
+        Search for the highest request rate the ADC sustains with under 1% missed requests.
+        The rate is ramped from 10 up to 1000 requests a second, or the data rate in continuous mode.
+        '''
+        self.capacity_search = CapacitySearch(
+            start_rate=10, max_rate=data_rate if continuous else 1000, max_miss_ratio=0.01, gain=gain,
+            mode=MODE_CONTINUOUS if continuous else MODE_SINGLE, data_rate=data_rate
+        )
+        self.capacity_thread = threading.Thread(target=self.capacity_search.run, daemon=True)
+        self.capacity_thread.start()
+        self.capacity_task = Clock.schedule_interval(self.update_capacity_information, 0.5)
+        self.show_capacity_dialog()
+
+    def update_capacity_information(self, *args):
+        ''' Show the levels measured so far, and the result once the search has finished. '''
+        search = self.capacity_search
+        self.capacity_dialog.update_information(search.current_rate, search.capacity, list(search.levels))
+        if not self.capacity_thread.is_alive():
+            self.capacity_task.cancel()
+            self.capacity_task = None
+            self.capacity_dialog.finish(search.capacity)
+
+    def show_capacity_dialog(self):
+        ''' Display a dialog with the progress of the capacity search. '''
+        if not hasattr(self, 'capacity_dialog'):
+            self.capacity_dialog = CapacityDialog(self)
+            self.capacity_dialog.dialog.bind(on_dismiss=self.stop_capacity_search)
+        self.capacity_dialog.start(self.capacity_search.max_miss_ratio, self.capacity_search.max_p99)
+        self.capacity_dialog.open()
+
+    def stop_capacity_search(self, instance=None):
+        ''' Stop the capacity search after the level being measured. '''
+        if self.capacity_task:
+            self.capacity_task.cancel()
+            self.capacity_task = None
+        if self.capacity_search is not None:
+            self.capacity_search.stop()
+
 
 class MCPTestScreen(MDScreen):
     ''' MCP test screen. '''
@@ -147,6 +220,7 @@ class MCPTestScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.mcp = None
+        self.mcp_refresh = None
 
     def set_delays(self, pin_delay, cycle_delay):
         ''' Set custom delay times. '''
@@ -159,58 +233,61 @@ class MCPTestScreen(MDScreen):
         self.pin_delay = int(pin_delay) / 1000
         self.mcp.set_pin_delay(self.pin_delay)
 
-    def start_run_cycle(self, pin_delay, cycle_delay):
-        ''' Start run cycle with custom delay. '''
-        self.function = 'Run Cycle'
+    def start_sequence(self, name, pin_delay, cycle_delay, atomic=False, verify=False):
+        ''' Start a declared sequence with custom delay. '''
+        self.function = SEQUENCES[name].name
         self.mcp = MCP()
         self.set_delays(pin_delay, cycle_delay)
+        self.mcp.set_atomic(atomic)
+        self.mcp.set_verify(verify)
         self.schedule_mcp()
-        self.mcp.run_cycle()
+        self.mcp.run_sequence(name)
 
-    def start_functionality_test(self, pin_delay, cycle_delay):
+    def start_run_cycle(self, pin_delay, cycle_delay, atomic=False, verify=False):
+        ''' Start run cycle with custom delay. '''
+        self.start_sequence('run_cycle', pin_delay, cycle_delay, atomic, verify)
+
+    def start_functionality_test(self, pin_delay, cycle_delay, atomic=False, verify=False):
         ''' Start functionality test with custom delay. '''
-        self.function = 'Functionality Test'
-        self.mcp = MCP()
-        self.set_delays(pin_delay, cycle_delay)
-        self.schedule_mcp()
-        self.mcp.functionality_test()
+        self.start_sequence('functionality_test', pin_delay, cycle_delay, atomic, verify)
 
-    def start_test_mode(self, pin_delay, cycle_delay):
+    def start_test_mode(self, pin_delay, cycle_delay, atomic=False, verify=False):
         ''' Start test mode with custom delay. '''
-        self.function = 'Test Mode'
-        self.mcp = MCP()
-        self.set_delays(pin_delay, cycle_delay)
-        self.schedule_mcp()
-        self.mcp.test_mode()
+        self.start_sequence('test_mode', pin_delay, cycle_delay, atomic, verify)
 
-    def start_leak_test(self, pin_delay, cycle_delay):
+    def start_leak_test(self, pin_delay, cycle_delay, atomic=False, verify=False):
         ''' Start leak test with custom delay. '''
-        self.function = 'Leak Test'
-        self.mcp = MCP()
-        self.set_delays(pin_delay, cycle_delay)
-        self.schedule_mcp()
-        self.mcp.leak_test()
+        self.start_sequence('leak_test', pin_delay, cycle_delay, atomic, verify)
 
     def schedule_mcp(self):
         ''' Schedule the intervals for checking values of the MCP test. '''
-        self.mcp_task = Clock.schedule_interval(self.update_mcp_information, 1)
-        self.show_mcp_dialog()        
+        self.mcp_refresh = AdaptiveRefresh(min_interval=0.1, max_interval=1)
+        self.mcp_refresh.start()
+        self.mcp_task = Clock.schedule_once(self.update_mcp_information, self.mcp_refresh.interval)
+        self.show_mcp_dialog()
 
     def update_mcp_information(self, *args):
-        ''' Get relay values in real time. '''
+        ''' Get relay values in real time, re-rendering only what changed at the pace of the adaptive refresh. '''
+        started = time.perf_counter()
         mode = self.mcp.get_mode()
         motor, v1, v2, v5 = self.mcp.get_values()
-        if mode is not None:
+        if self.mcp.get_verify_faults():
+            self.bus_status = 'FAILED'
+            self.stop_mcp_test()
+        elif mode is not None:
             if mode == 'Complete':
                 self.bus_status = 'OK'
                 self.stop_mcp_test()
             else:
-                self.mcp_dialog.update_information(
+                changed = self.mcp_dialog.update_information(
                     self.function, mode.capitalize(),
                     self.pin_delay, 
                     self.cycle_delay,
+                    self.mcp.get_overruns(),
                     motor, v1, v2, v5
                 )
+                interval = self.mcp_refresh.frame(changed, time.perf_counter() - started)
+                self.mcp_task = Clock.schedule_once(self.update_mcp_information, interval)
         else:
             self.bus_status = 'FAILED'
             self.stop_mcp_test()
@@ -227,7 +304,10 @@ class MCPTestScreen(MDScreen):
         ''' Display the results of the MCP test. '''
         if not hasattr(self, 'mcp_results'):
             self.mcp_results = MCPResults(self)
-        self.mcp_results.update_status(self.function, self.bus_status)
+        self.mcp_results.update_status(
+            self.function, self.mcp.get_verify_faults(), self.mcp.get_overruns(),
+            self.mcp.get_timing_error(), self.mcp_refresh.report(), self.bus_status
+        )
         self.mcp_results.open()
    
     def stop_mcp_test(self, instance=None):
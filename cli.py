@@ -0,0 +1,994 @@
+#!/usr/bin/env python3
+'''
+This is the headless command-line runner for the ADC1115 and MCP23017 stress tests.
+
+It never imports Kivy, so tests can be run over SSH on boards with no display or in CI:
+
+    i2c-stress-test run adc --requests 100 --frequency 1 --duration 3600
+    i2c-stress-test run mcp --sequence run_cycle --pin-delay 250 --cycle-delay 5
+    i2c-stress-test run mixed --requests 100 --sequence run_cycle --cycle-delay 5
+    i2c-stress-test run toggle --rate 500 --pins none --duration 60
+    i2c-stress-test run inputs --interrupt-pin 17 --sequence run_cycle --cycle-delay 5
+    i2c-stress-test run scan
+    i2c-stress-test run fanout --requests 100 --strategy interleaved --duration 60
+    i2c-stress-test run capacity --max-rate 1000 --max-p99 20 --csv capacity.csv
+    i2c-stress-test run matrix --frequencies 100000,400000,1000000 --duration 10
+'''
+
+# Standard imports.
+import argparse
+import csv
+import sys
+import time
+
+# Local imports.
+from utility import (
+    ADS1115_ADDRESSES, ADS1115_CHANNELS, ADS1115_DATA_RATES, ADS1115_GAINS, BACKENDS, BUS_FREQUENCIES, ENGINE_ADAFRUIT,
+    ENGINE_RAW, FAULT_CLASSES, INPUT_PINS, MCP23017_ADDRESSES, MODE_CONTINUOUS, MODE_SINGLE, OUTPUT_PINS, SEQUENCES,
+    STRATEGIES, WORKLOADS,
+    ADC, MCP, ADCProcess, BusBenchmark, BusProfile, CapacityLevel, CapacitySearch, FanOutStress, InputEdge, InputMonitor,
+    MixedStress, RetryPolicy, SampleRecorder, SimulatedBackend, ToggleStress,
+    discover_devices, get_backend
+)
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_HARDWARE = 3
+
+MCP_SEQUENCES = {key: sequence.name for key, sequence in SEQUENCES.items()}
+
+
+def format_latency(latency) -> str:
+    ''' Format a latency summary as p50 / p90 / p99 / p99.9 / max in milliseconds. '''
+    return ' / '.join(f'{latency[key]:.2f}' for key in ('p50', 'p90', 'p99', 'p99.9', 'max')) + ' ms'
+
+
+def format_worst_window(windows) -> str:
+    ''' Format the reads of the worst window and when it started. '''
+    if windows.worst_reads is None:
+        return '-'
+    if not windows.target:
+        return f'{windows.worst_reads} reads at {windows.worst_start:.1f}s'
+    return f'{windows.worst_reads} of {windows.target:g} reads at {windows.worst_start:.1f}s'
+
+
+def print_stats_table(report, *headings):
+    ''' Print read statistics as a table, with one column for each part of the report keys. '''
+    print(''.join(f'{heading:<12}' for heading in headings) +
+          f'{"Reads":>9}{"Reads/s":>10}{"Errors":>8}{"Error %":>9}{"p50":>9}{"p99":>9}{"p99.9":>9}{"max":>9}  (ms)')
+    for key, stats in report.items():
+        print(
+            ''.join(f'{part:<12}' for part in key) +
+            f'{stats["reads"]:>9}{stats["throughput"]:>10.1f}{stats["errors"]:>8}{stats["error_rate"] * 100:>9.3f}'
+            f'{stats["p50"]:>9.2f}{stats["p99"]:>9.2f}{stats["p99.9"]:>9.2f}{stats["max"]:>9.2f}'
+        )
+
+
+def positive_int(value) -> int:
+    ''' Parse a whole number above 0. '''
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'invalid value {value!r}, expected a whole number above 0')
+    return number
+
+
+def non_negative_int(value) -> int:
+    ''' Parse a whole number of 0 or more. '''
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'invalid value {value!r}, expected a whole number of 0 or more')
+    return number
+
+
+def positive_float(value) -> float:
+    ''' Parse a number above 0. '''
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f'invalid value {value!r}, expected a number above 0')
+    return number
+
+
+def non_negative_float(value) -> float:
+    ''' Parse a number of 0 or more. '''
+    number = float(value)
+    if not number >= 0:
+        raise argparse.ArgumentTypeError(f'invalid value {value!r}, expected a number of 0 or more')
+    return number
+
+
+def parse_gain(value):
+    ''' Parse an ADS1115 programmable gain. '''
+    gain = 2/3 if value == '2/3' else float(value)
+    if gain not in ADS1115_GAINS:
+        raise argparse.ArgumentTypeError(f'invalid gain {value!r}, expected one of: 2/3, 1, 2, 4, 8, 16')
+    return gain
+
+
+def parse_channels(value) -> list:
+    ''' Parse a comma-separated list of ADS1115 channels. '''
+    channels = value.split(',')
+    for channel in channels:
+        if channel not in ADS1115_CHANNELS:
+            raise argparse.ArgumentTypeError(f'unknown channel {channel!r}, expected one of: {",".join(ADS1115_CHANNELS)}')
+    return channels
+
+
+def parse_cpus(value) -> list:
+    ''' Parse a comma-separated list of CPU numbers. '''
+    try:
+        return [int(cpu) for cpu in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid CPU list {value!r}, expected numbers such as 2,3')
+
+
+def parse_pins(value) -> list:
+    ''' Parse a comma-separated list of MCP output pins, or none. '''
+    if value == 'none':
+        return []
+    pins = value.split(',')
+    for pin in pins:
+        if pin not in OUTPUT_PINS:
+            raise argparse.ArgumentTypeError(f'unknown output pin {pin!r}, expected none or any of: {",".join(OUTPUT_PINS)}')
+    return pins
+
+
+def parse_input_pins(value) -> list:
+    ''' Parse a comma-separated list of MCP input pins. '''
+    pins = value.split(',')
+    for pin in pins:
+        if pin not in INPUT_PINS:
+            raise argparse.ArgumentTypeError(f'unknown input pin {pin!r}, expected any of: {",".join(INPUT_PINS)}')
+    return pins
+
+
+def parse_addresses(value) -> list:
+    ''' Parse a comma-separated list of I2C addresses such as 0x48,0x49, or none. '''
+    if value == 'none':
+        return []
+    try:
+        return [int(address, 0) for address in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid address list {value!r}, expected addresses such as 0x48,0x49')
+
+
+def format_addresses(addresses) -> str:
+    ''' Format I2C addresses in hex. '''
+    return ', '.join(f'{address:#04x}' for address in addresses) or 'None'
+
+
+def parse_frequencies(value) -> list:
+    ''' Parse a comma-separated list of bus frequencies in Hz. '''
+    try:
+        frequencies = [int(frequency) for frequency in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid frequency list {value!r}, expected Hz such as 100000,400000')
+    if min(frequencies) <= 0:
+        raise argparse.ArgumentTypeError('bus frequencies must be positive')
+    return frequencies
+
+
+def parse_workloads(value) -> list:
+    ''' Parse a comma-separated list of bus benchmark workloads. '''
+    workloads = value.split(',')
+    for workload in workloads:
+        if workload not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f'unknown workload {workload!r}, expected any of: {",".join(WORKLOADS)}')
+    return workloads
+
+
+def format_frequency(frequency) -> str:
+    ''' Format a bus frequency in kHz. '''
+    return f'{frequency / 1000:g} kHz'
+
+
+def report_unavailable(name, *devices) -> int:
+    ''' Report hardware that is not available, with the error that stopped a device being set up if there was one. '''
+    errors = [device.last_error for device in devices if device.last_error]
+    print(f'{name} hardware is not available' + (f': {errors[0]}' if errors else '.'), file=sys.stderr)
+    return EXIT_NO_HARDWARE
+
+
+def create_backend(args, frequency=None):
+    ''' Create the bus backend selected on the command line, at a frequency other than --bus-frequency if given. '''
+    frequency = frequency or args.bus_frequency
+    if (args.backend or get_backend().name) == SimulatedBackend.name:
+        return SimulatedBackend(frequency=frequency, profile=BusProfile(
+            latency=args.sim_latency / 1000,
+            jitter=args.sim_jitter / 1000,
+            nack_rate=args.sim_nack_rate,
+            timeout_rate=args.sim_timeout_rate,
+            stall_rate=args.sim_stall_rate,
+            stall_duration=args.sim_stall / 1000,
+            seed=args.sim_seed,
+            arbitration_rate=args.sim_arbitration_rate,
+            corrupt_rate=args.sim_corrupt_rate,
+            stuck_rate=args.sim_stuck_rate,
+            input_edge_rate=args.sim_input_edge_rate,
+            glitch_rate=args.sim_glitch_rate,
+            glitch_duration=args.sim_glitch / 1_000_000,
+            adc_addresses=ADS1115_ADDRESSES[:args.sim_adcs],
+            mcp_addresses=MCP23017_ADDRESSES[:args.sim_mcps]
+        ))
+    return get_backend(args.backend, frequency=frequency)
+
+
+def run_adc(args) -> int:
+    ''' Run the ADC stress test until the duration elapses, the bus fails or it is interrupted. '''
+    if args.requests is None:
+        args.requests = 0 if args.mode == MODE_CONTINUOUS else 100
+    options = dict(
+        gain=args.gain, requests=args.requests, frequency=args.frequency,
+        backend=create_backend(args), autostart=False, channels=args.channels, burst=args.burst,
+        mode=args.mode, data_rate=args.data_rate, alert_pin=args.alert_pin, engine=args.engine, batch=args.batch,
+        window=args.window, retry=RetryPolicy(
+            retries=args.retries, backoff=args.backoff / 1000, recover_after=args.recover_after,
+            fail_after=args.fail_after
+        )
+    )
+    if args.process:
+        adc = ADCProcess(cpus=args.cpus, nice=args.nice, realtime_priority=args.realtime, **options)
+    else:
+        adc = ADC(**options)
+    if not adc.is_initialized():
+        print('ADC hardware is not available.', file=sys.stderr)
+        return EXIT_NO_HARDWARE
+    recorder = SampleRecorder(args.record) if args.record else None
+    if recorder is not None:
+        adc.add_sample_listener(recorder.record)
+    adc.start()
+    status = 'OK'
+    started = time.monotonic()
+    next_report = started + args.interval
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(0.1)
+            snapshot = adc.get_snapshot()
+            if snapshot.faults.bus_failed:
+                status = 'FAILED'
+                break
+            if time.monotonic() >= next_report:
+                next_report += args.interval
+                print(
+                    f'{snapshot.duration:10.1f}s  '
+                    f'received={snapshot.requests_filled}  missed={snapshot.missed_requests}  '
+                    f'rate={snapshot.achieved_rate:.1f}/{snapshot.configured_rate:.1f}/s  '
+                    f'rolling={snapshot.windows.rolling_rate:.1f}/s  '
+                    f'missed windows={snapshot.windows.missed}/{snapshot.windows.closed} '
+                    f'({snapshot.windows.consecutive_missed} in a row)  '
+                    f'latency={format_latency(snapshot.latency_summary())}',
+                    flush=True
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        adc.stop()
+        if recorder is not None:
+            recorder.close()
+    snapshot = adc.get_snapshot()
+    if snapshot.faults.bus_failed:
+        status = 'FAILED'
+    print(f'Payload Size: {args.requests}')
+    print(f'Frequency: {args.frequency}')
+    print(f'Duration: {snapshot.duration:.1f}s')
+    print(f'Requests Received: {snapshot.requests_filled}')
+    print(f'Total Missed: {snapshot.missed_requests}')
+    print(f'Max Lateness: {snapshot.max_lateness * 1000:.2f} ms')
+    print(f'Conversion Mode: {args.mode.capitalize()} at {args.data_rate} SPS')
+    print(f'Engine: {args.engine.capitalize()}, {args.batch} read(s) per bus lock')
+    faults = snapshot.faults
+    print(f'Reads: {snapshot.reads}')
+    print(f'Read Errors: {snapshot.errors}')
+    print('Faults: ' + ', '.join(f'{fault_class}={getattr(faults, fault_class)}' for fault_class in FAULT_CLASSES))
+    print(f'Retries: {faults.retries}, {faults.recovered} read(s) recovered by a retry')
+    print(f'Bus Recoveries: {faults.recoveries}')
+    print(f'Failed Reads In A Row: {faults.max_consecutive_failures} at most')
+    windows = snapshot.windows
+    if snapshot.configured_rate:
+        print(f'Read Rate: {snapshot.achieved_rate:.1f}/s achieved of {snapshot.configured_rate:.1f}/s configured')
+        print(f'Windows: {windows.closed} of {windows.length:g}s, each targeting {windows.target:g} reads')
+    else:
+        print(f'Read Rate: {snapshot.achieved_rate:.1f}/s achieved, unpaced')
+        print(f'Windows: {windows.closed} of {windows.length:g}s, with no target')
+    print(f'Missed Windows: {windows.missed}, at most {windows.max_consecutive_missed} in a row')
+    print(f'Worst Window: {format_worst_window(windows)}')
+    print(f'Rolling Rate: {windows.rolling_rate:.1f}/s')
+    if args.alert_pin is not None:
+        print(f'Ready Timeouts: {snapshot.ready_timeouts}')
+    print(f'Latency p50/p90/p99/p99.9/max: {format_latency(snapshot.latency_summary())}')
+    if len(adc.channels) > 1:
+        print_stats_table({(channel,): stats for channel, stats in adc.get_channel_report().items()}, 'Channel')
+        print(f'Mux Switches: {adc.get_mux_switches()}')
+    if args.process:
+        print(f'Samples Dropped: {adc.get_dropped_samples()}')
+    if recorder is not None:
+        print(f'Samples Recorded: {recorder.records} to {recorder.path}')
+    if adc.last_error:
+        print(f'Last Error: {adc.last_error}')
+    print(f'Bus Status: {status}')
+    return EXIT_OK if status == 'OK' else EXIT_FAILED
+
+
+def run_mcp(args) -> int:
+    ''' Run an MCP sequence until it completes, the bus fails or it is interrupted. '''
+    mcp = MCP(backend=create_backend(args))
+    if not mcp.is_initialized():
+        return report_unavailable('MCP', mcp)
+    mcp.set_pin_delay(args.pin_delay / 1000)
+    mcp.set_cycle_delay(args.cycle_delay)
+    mcp.set_atomic(args.atomic)
+    mcp.set_verify(args.verify)
+    mcp.run_sequence(args.sequence)
+    status = 'OK'
+    started = time.monotonic()
+    last_mode = None
+    try:
+        while True:
+            mode = mcp.get_mode()
+            mcp.get_values()
+            if mode is None or mcp.get_verify_faults():
+                status = 'FAILED'
+                break
+            if mode == 'Complete':
+                break
+            if mode != last_mode:
+                last_mode = mode
+                print(f'{time.monotonic() - started:10.1f}s  mode={mode.capitalize()}', flush=True)
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mcp.stop_cycle()
+    print(f'Function: {MCP_SEQUENCES[args.sequence]}')
+    print(f'Bus Transactions: {mcp.get_bus_transactions()}')
+    print(f'Verify Faults: {mcp.get_verify_faults()}')
+    if mcp.last_verify_fault:
+        print(f'Last Verify Fault: {mcp.last_verify_fault}')
+    print(f'Overruns: {mcp.get_overruns()} (max {mcp.max_overrun * 1000:.1f} ms)')
+    for kind, timing in mcp.get_timing_error().items():
+        print(f'{kind.capitalize()} Delay Error: mean {timing["mean"]:+.2f} / worst {timing["worst"]:+.2f} ms '
+              f'over {timing["count"]} delays')
+    if mcp.last_error:
+        print(f'Last Error: {mcp.last_error}')
+    print(f'Bus Status: {status}')
+    return EXIT_OK if status == 'OK' else EXIT_FAILED
+
+
+def run_mixed(args) -> int:
+    ''' Run the ADC read loop while an MCP sequence runs, then report the ADC statistics per MCP mode. '''
+    mixed = MixedStress(
+        requests=args.requests, frequency=args.frequency, sequence=args.sequence,
+        pin_delay=args.pin_delay / 1000, cycle_delay=args.cycle_delay, backend=create_backend(args)
+    )
+    mixed.mcp.set_atomic(args.atomic)
+    if not mixed.is_initialized():
+        return report_unavailable('ADC or MCP', mixed.mcp)
+    recorder = SampleRecorder(args.record) if args.record else None
+    if recorder is not None:
+        mixed.adc.add_sample_listener(recorder.record)
+    mixed.start()
+    try:
+        while not mixed.is_complete():
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mixed.stop()
+        if recorder is not None:
+            recorder.close()
+    report = mixed.get_report()
+    failed = mixed.is_failed() or sum(stats['errors'] for stats in report.values()) > 0
+    print_stats_table({(mode.capitalize(), phase): stats for (mode, phase), stats in report.items()}, 'Mode', 'Phase')
+    print(f'Function: {MCP_SEQUENCES[args.sequence]}')
+    print(f'Total Missed: {mixed.adc.get_missed_requests()}')
+    if recorder is not None:
+        print(f'Samples Recorded: {recorder.records} to {recorder.path}')
+    if mixed.mcp.last_error:
+        print(f'Last Error: {mixed.mcp.last_error}')
+    print(f'Bus Status: {"FAILED" if failed else "OK"}')
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def run_toggle(args) -> int:
+    ''' Toggle the MCP output latch until the duration elapses, the bus fails or it is interrupted. '''
+    toggle = ToggleStress(
+        rate=args.rate, pins=args.pins, verify=not args.no_verify, backend=create_backend(args),
+        fail_after=args.fail_after
+    )
+    if not toggle.is_initialized():
+        return report_unavailable('MCP', toggle.mcp)
+    toggle.start()
+    started = time.monotonic()
+    next_report = started + args.interval
+    try:
+        while toggle.is_running() and (not args.duration or time.monotonic() - started < args.duration):
+            time.sleep(0.1)
+            if time.monotonic() >= next_report:
+                next_report += args.interval
+                snapshot = toggle.get_snapshot()
+                print(
+                    f'{snapshot.duration:10.1f}s  writes={snapshot.writes}  missed={snapshot.missed}  '
+                    f'rate={snapshot.achieved_rate:.1f}/s  verify failures={snapshot.verify_failures}  '
+                    f'latency={format_latency(snapshot.latency_summary())}',
+                    flush=True
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        toggle.stop()
+    snapshot = toggle.get_snapshot()
+    faults = snapshot.faults
+    status = 'FAILED' if faults.bus_failed or snapshot.verify_failures or snapshot.errors else 'OK'
+    print(f'Pins: {", ".join(toggle.pins) or "None, the latch is rewritten unchanged"}')
+    print(f'Duration: {snapshot.duration:.1f}s')
+    print(f'Writes: {snapshot.writes}')
+    if snapshot.target_rate:
+        print(f'Write Rate: {snapshot.achieved_rate:.1f}/s achieved of {snapshot.target_rate:.1f}/s target')
+        print(f'Total Missed: {snapshot.missed}')
+    else:
+        print(f'Write Rate: {snapshot.achieved_rate:.1f}/s')
+    print(f'Write Errors: {snapshot.errors}')
+    print('Faults: ' + ', '.join(f'{fault_class}={getattr(faults, fault_class)}' for fault_class in FAULT_CLASSES))
+    if toggle.verify:
+        print(f'Verify Failures: {snapshot.verify_failures}')
+        if snapshot.last_fault:
+            print(f'Last Verify Fault: {snapshot.last_fault}')
+    print(f'Latency p50/p90/p99/p99.9/max: {format_latency(snapshot.latency_summary())}')
+    print(f'Bus Status: {status}')
+    return EXIT_OK if status == 'OK' else EXIT_FAILED
+
+
+def run_inputs(args) -> int:
+    ''' Log the changes of the MCP input pins until the duration elapses, the sequence completes or it is interrupted. '''
+    mcp = MCP(backend=create_backend(args))
+    if not mcp.is_initialized():
+        return report_unavailable('MCP', mcp)
+    monitor = InputMonitor(
+        pins=args.pins, mcp=mcp, interrupt_pin=args.interrupt_pin, poll_interval=args.poll_interval / 1000,
+        settle=args.settle / 1000
+    )
+    monitor.start()
+    if args.sequence:
+        mcp.set_pin_delay(args.pin_delay / 1000)
+        mcp.set_cycle_delay(args.cycle_delay)
+        mcp.set_atomic(args.atomic)
+        mcp.run_sequence(args.sequence)
+    printed = 0
+    try:
+        while not args.duration or time.monotonic() - monitor.start_time < args.duration:
+            time.sleep(0.1)
+            edges = monitor.get_edges()
+            for edge in edges[printed:]:
+                print(
+                    f'{edge.timestamp - monitor.start_time:10.4f}s  {edge.pin}={int(edge.value)}  '
+                    f'mode={(edge.mode or "None").capitalize()}{" switching" if edge.switching else ""}'
+                    f'{"" if edge.captured else "  (uncaptured)"}',
+                    flush=True
+                )
+            printed = len(edges)
+            if args.sequence and mcp.get_mode() in ('Complete', None):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mcp.stop_cycle()
+        monitor.stop()
+    if args.log:
+        with open(args.log, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(InputEdge._fields)
+            writer.writerows(
+                (f'{edge.timestamp - monitor.start_time:.6f}',) + edge[1:] for edge in monitor.get_edges()
+            )
+    report = monitor.get_report()
+    print('Edges: ' + ', '.join(f'{pin}={count}' for pin, count in report['edges'].items()))
+    print(f'Edges While Switching: {report["switching"]}')
+    print(f'Uncaptured Edges: {report["uncaptured"]}')
+    print(f'Interrupts Serviced: {report["interrupts"]}')
+    print(f'Bus Reads: {report["bus_reads"]}')
+    print(f'Read Errors: {report["errors"]}')
+    print(f'Service Latency p50/p90/p99/p99.9/max: {format_latency(report)}')
+    if args.log:
+        print(f'Edge Log: {len(monitor.edges)} edges to {args.log}')
+    status = 'OK' if report['errors'] == 0 and mcp.get_mode() is not None else 'FAILED'
+    print(f'Bus Status: {status}')
+    return EXIT_OK if status == 'OK' else EXIT_FAILED
+
+
+def scan_bus(backend):
+    ''' Scan the bus for devices, or report why it could not be scanned and return None. '''
+    try:
+        devices = discover_devices(backend)
+    except IOError as error:
+        print(f'I2C bus is not available: Scan: {error}', file=sys.stderr)
+        return None
+    if devices is None:
+        print('I2C bus is not available.', file=sys.stderr)
+    return devices
+
+
+def run_scan(args) -> int:
+    ''' Scan the bus and list the devices found. '''
+    devices = scan_bus(create_backend(args))
+    if devices is None:
+        return EXIT_NO_HARDWARE
+    print(f'ADS1115: {format_addresses(devices["ads1115"])}')
+    print(f'MCP23017: {format_addresses(devices["mcp23017"])}')
+    print(f'Other: {format_addresses(devices["other"])}')
+    return EXIT_OK
+
+
+def run_fanout(args) -> int:
+    ''' Drive every ADS1115 and MCP23017 at once until the duration elapses, the bus fails or it is interrupted. '''
+    backend = create_backend(args)
+    if args.adcs is None or args.mcps is None:
+        devices = scan_bus(backend)
+        if devices is None:
+            return EXIT_NO_HARDWARE
+        args.adcs = devices['ads1115'] if args.adcs is None else args.adcs
+        args.mcps = devices['mcp23017'] if args.mcps is None else args.mcps
+    if not args.adcs and not args.mcps:
+        print('No ADS1115 or MCP23017 found on the bus.', file=sys.stderr)
+        return EXIT_NO_HARDWARE
+    fan_out = FanOutStress(
+        args.adcs, args.mcps, requests=args.requests, frequency=args.frequency, strategy=args.strategy,
+        backend=backend, gain=args.gain, data_rate=args.data_rate, engine=args.engine
+    )
+    if not fan_out.is_initialized():
+        return report_unavailable('ADC or MCP', *(toggle.mcp for toggle in fan_out.toggles.values()))
+    print(f'ADS1115: {format_addresses(args.adcs)}')
+    print(f'MCP23017: {format_addresses(args.mcps)}')
+    fan_out.start()
+    status = 'OK'
+    started = time.monotonic()
+    next_report = started + args.interval
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(0.1)
+            if fan_out.is_failed():
+                status = 'FAILED'
+                break
+            if time.monotonic() >= next_report:
+                next_report += args.interval
+                duration = fan_out.get_duration()
+                print(
+                    f'{duration:10.1f}s  requests={fan_out.get_reads()}  missed={fan_out.get_missed()}  '
+                    f'rate={fan_out.get_reads() / duration:.1f}/s',
+                    flush=True
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fan_out.stop()
+    report = fan_out.get_report()
+    print_stats_table({
+        (device.upper(), '' if address is None else f'{address:#04x}'): stats for (device, address), stats in report.items()
+    }, 'Device', 'Address')
+    devices = len(fan_out.adcs) + len(fan_out.toggles)
+    print(f'Strategy: {args.strategy.capitalize()}')
+    print(f'Target Rate: {args.requests / args.frequency * devices:.1f}/s over {devices} devices')
+    print(f'Total Missed: {fan_out.get_missed()}')
+    if report[('all', None)]['errors']:
+        status = 'FAILED'
+    print(f'Bus Status: {status}')
+    return EXIT_OK if status == 'OK' else EXIT_FAILED
+
+
+def print_capacity_level(level):
+    ''' Print one level of a capacity search as a row of the curve. '''
+    print(
+        f'{level.rate:>8}{level.achieved_rate:>10.1f}{level.missed:>8}{level.errors:>8}{level.miss_ratio * 100:>9.2f}'
+        f'{level.p50:>9.2f}{level.p99:>9.2f}{level.max:>9.2f}  {"PASS" if level.passed else "FAIL"}',
+        flush=True
+    )
+
+
+def run_capacity(args) -> int:
+    ''' Search for the highest ADC request rate that stays under the miss ratio and p99 thresholds. '''
+    search = CapacitySearch(
+        start_rate=args.start_rate, max_rate=args.max_rate, step=args.step, settle=args.settle, hold=args.hold,
+        max_miss_ratio=args.max_miss_ratio, max_p99=args.max_p99, resolution=args.resolution,
+        backend=create_backend(args), gain=args.gain, channels=args.channels, burst=args.burst, mode=args.mode,
+        data_rate=args.data_rate, engine=args.engine, batch=args.batch
+    )
+    print(f'{"Rate":>8}{"Reads/s":>10}{"Missed":>8}{"Errors":>8}{"Miss %":>9}{"p50":>9}{"p99":>9}{"max":>9}  (ms)')
+    try:
+        search.run(on_level=print_capacity_level)
+    except KeyboardInterrupt:
+        search.stop()
+    if not search.hardware_available:
+        print('ADC hardware is not available.', file=sys.stderr)
+        return EXIT_NO_HARDWARE
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(CapacityLevel._fields)
+            writer.writerows(search.get_curve())
+        print(f'Capacity Curve: {len(search.levels)} levels to {args.csv}')
+    print(f'Capacity: {search.capacity} requests/s')
+    return EXIT_OK if search.capacity else EXIT_FAILED
+
+
+def run_matrix(args) -> int:
+    ''' Run the ADC and MCP workloads at every bus frequency and tabulate them. '''
+    benchmark = BusBenchmark(
+        frequencies=args.frequencies, duration=args.duration, workloads=args.workloads,
+        backend_factory=lambda frequency: create_backend(args, frequency), gain=args.gain, channels=args.channels,
+        mode=args.mode, data_rate=args.data_rate, engine=args.engine, batch=args.batch
+    )
+    try:
+        benchmark.run(on_result=lambda frequency, clock, workload, report: print(
+            f'{format_frequency(frequency)} {workload.upper()}: {report["throughput"]:.1f}/s', flush=True
+        ))
+    except KeyboardInterrupt:
+        benchmark.stop()
+    if not benchmark.hardware_available:
+        print('ADC or MCP hardware is not available.', file=sys.stderr)
+        return EXIT_NO_HARDWARE
+    print_stats_table({
+        (format_frequency(frequency), format_frequency(benchmark.clocks[frequency]), workload.upper()): report
+        for (frequency, workload), report in benchmark.results.items()
+    }, 'Frequency', 'Clock', 'Workload')
+    if any(clock != frequency for frequency, clock in benchmark.clocks.items()):
+        print('Some frequencies ran at another clock, the kernel sets the clock of the bus.')
+    errors = sum(report['errors'] for report in benchmark.results.values())
+    print(f'Bus Status: {"OK" if errors == 0 else "FAILED"}')
+    return EXIT_OK if errors == 0 else EXIT_FAILED
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ''' Create the argument parser for the command-line runner. '''
+    parser = argparse.ArgumentParser(prog='i2c-stress-test', description='Headless I2C stress tests.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='Run a stress test.')
+    tests = run.add_subparsers(dest='test', required=True)
+
+    backend = argparse.ArgumentParser(add_help=False)
+    backend.add_argument('--backend', choices=BACKENDS, help='Bus backend, defaults to I2C_STRESS_BACKEND or hardware.')
+    backend.add_argument(
+        '--bus-frequency', type=positive_int, metavar='HZ',
+        help='I2C clock such as 100000, 400000 or 1000000, defaults to I2C_STRESS_BUS_FREQUENCY or 100000.'
+    )
+    backend.add_argument(
+        '--sim-latency', type=non_negative_float, default=0.3, help='Simulated transaction latency in milliseconds.'
+    )
+    backend.add_argument(
+        '--sim-jitter', type=non_negative_float, default=0.1, help='Simulated latency jitter in milliseconds.'
+    )
+    backend.add_argument(
+        '--sim-nack-rate', type=non_negative_float, default=0, help='Fraction of simulated transactions NACKed.'
+    )
+    backend.add_argument(
+        '--sim-timeout-rate', type=non_negative_float, default=0, help='Fraction of simulated transactions timing out.'
+    )
+    backend.add_argument(
+        '--sim-stall-rate', type=non_negative_float, default=0, help='Fraction of simulated transactions stalled.'
+    )
+    backend.add_argument(
+        '--sim-stall', type=non_negative_float, default=50, help='Simulated clock-stretch stall in milliseconds.'
+    )
+    backend.add_argument(
+        '--sim-arbitration-rate', type=non_negative_float, default=0,
+        help='Fraction of simulated transactions losing arbitration.'
+    )
+    backend.add_argument(
+        '--sim-corrupt-rate', type=non_negative_float, default=0,
+        help='Fraction of simulated transactions returning bad data.'
+    )
+    backend.add_argument(
+        '--sim-stuck-rate', type=non_negative_float, default=0,
+        help='Fraction of simulated transactions leaving SDA held low until the bus is recovered.'
+    )
+    backend.add_argument(
+        '--sim-input-edge-rate', type=non_negative_float, default=0,
+        help='Random changes of each simulated MCP input per second.'
+    )
+    backend.add_argument(
+        '--sim-glitch-rate', type=non_negative_float, default=0,
+        help='Fraction of simulated relay switches that glitch an MCP input with interrupt-on-change enabled.'
+    )
+    backend.add_argument(
+        '--sim-glitch', type=non_negative_float, default=50, help='Simulated input glitch length in microseconds.'
+    )
+    backend.add_argument(
+        '--sim-adcs', type=non_negative_int, default=1, help='Simulated ADS1115s, from address 0x48 up.'
+    )
+    backend.add_argument(
+        '--sim-mcps', type=non_negative_int, default=1, help='Simulated MCP23017s, from address 0x20 up.'
+    )
+    backend.add_argument('--sim-seed', type=int, help='Seed for the simulated faults.')
+
+    adc = tests.add_parser('adc', parents=[backend], help='Stress the ADS1115 with paced reads.')
+    adc.add_argument(
+        '--requests', type=non_negative_int,
+        help='Requests per frequency window, 0 reads unpaced, defaults to 100 or one per conversion in continuous mode.'
+    )
+    adc.add_argument('--frequency', type=positive_float, default=1, help='Length of the frequency window in seconds.')
+    adc.add_argument(
+        '--duration', type=non_negative_float, default=0, help='Run time in seconds, 0 runs until interrupted.'
+    )
+    adc.add_argument(
+        '--gain', type=parse_gain, default=1, help='ADS1115 programmable gain, one of: 2/3, 1, 2, 4, 8, 16.'
+    )
+    adc.add_argument(
+        '--mode', choices=(MODE_SINGLE, MODE_CONTINUOUS), default=MODE_SINGLE,
+        help='Convert on every read, or continuously and read only the conversion register.'
+    )
+    adc.add_argument(
+        '--data-rate', type=int, choices=ADS1115_DATA_RATES, default=128, help='ADS1115 samples per second.'
+    )
+    adc.add_argument(
+        '--alert-pin', type=int, metavar='BCM',
+        help='GPIO wired to ALERT/RDY, continuous reads then wait for each conversion instead of being timed.'
+    )
+    adc.add_argument('--interval', type=positive_float, default=10, help='Seconds between progress reports.')
+    adc.add_argument('--record', metavar='PATH', help='Stream every read into a binary sample log.')
+    adc.add_argument(
+        '--channels', type=parse_channels, default=['P0'],
+        help=f'Comma-separated channels to sweep, from: {",".join(ADS1115_CHANNELS)}.'
+    )
+    adc.add_argument('--burst', type=positive_int, default=1, help='Reads of each channel before switching the MUX.')
+    adc.add_argument(
+        '--engine', choices=(ENGINE_ADAFRUIT, ENGINE_RAW), default=ENGINE_ADAFRUIT,
+        help='Read through the Adafruit driver, or with raw transactions into preallocated buffers.'
+    )
+    adc.add_argument(
+        '--batch', type=positive_int, default=1, help='Back-to-back reads per request under a single bus lock.'
+    )
+    adc.add_argument(
+        '--window', type=positive_float,
+        help='Length of the throughput accounting windows in seconds, defaults to the frequency window.'
+    )
+    adc.add_argument('--retries', type=non_negative_int, default=2, help='Times a failed read is retried.')
+    adc.add_argument(
+        '--backoff', type=non_negative_float, default=1,
+        help='Wait before the first retry in milliseconds, doubling after.'
+    )
+    adc.add_argument(
+        '--recover-after', type=non_negative_int, default=3,
+        help='Failed reads in a row before the bus is recovered, 0 never recovers.'
+    )
+    adc.add_argument(
+        '--fail-after', type=non_negative_int, default=10,
+        help='Failed reads in a row before the bus is failed, 0 never fails it.'
+    )
+    adc.add_argument('--process', action='store_true', help='Read the ADC in a worker process with its own GIL.')
+    adc.add_argument('--cpus', type=parse_cpus, help='Comma-separated CPUs to pin the worker process to.')
+    adc.add_argument('--nice', type=int, help='Nice value of the worker process.')
+    adc.add_argument(
+        '--realtime', type=int, metavar='PRIORITY',
+        help='Run the worker process under SCHED_FIFO at this priority, this needs root or CAP_SYS_NICE.'
+    )
+    adc.set_defaults(handler=run_adc)
+
+    mcp = tests.add_parser('mcp', parents=[backend], help='Run an MCP23017 relay sequence.')
+    mcp.add_argument('--sequence', choices=MCP_SEQUENCES, default='run_cycle', help='Sequence to run.')
+    mcp.add_argument(
+        '--pin-delay', type=non_negative_float, default=0, help='Delay between each relay in milliseconds.'
+    )
+    mcp.add_argument('--cycle-delay', type=non_negative_float, default=1, help='Delay between each mode in seconds.')
+    mcp.add_argument('--atomic', action='store_true', help='Switch every relay of a mode with one register write.')
+    mcp.add_argument('--verify', action='store_true', help='Read the output registers back and fail on a mismatch.')
+    mcp.set_defaults(handler=run_mcp)
+
+    mixed = tests.add_parser('mixed', parents=[backend], help='Read the ADC while an MCP sequence runs.')
+    mixed.add_argument(
+        '--requests', type=non_negative_int, default=100, help='ADC requests per frequency window, 0 reads unpaced.'
+    )
+    mixed.add_argument('--frequency', type=positive_float, default=1, help='Length of the frequency window in seconds.')
+    mixed.add_argument('--sequence', choices=MCP_SEQUENCES, default='run_cycle', help='Sequence to run.')
+    mixed.add_argument(
+        '--pin-delay', type=non_negative_float, default=0, help='Delay between each relay in milliseconds.'
+    )
+    mixed.add_argument('--cycle-delay', type=non_negative_float, default=1, help='Delay between each mode in seconds.')
+    mixed.add_argument('--record', metavar='PATH', help='Stream every ADC read into a binary sample log.')
+    mixed.add_argument('--atomic', action='store_true', help='Switch every relay of a mode with one register write.')
+    mixed.set_defaults(handler=run_mixed)
+
+    toggle = tests.add_parser('toggle', parents=[backend], help='Toggle the MCP23017 output latch as fast as possible.')
+    toggle.add_argument(
+        '--rate', type=non_negative_float, default=0, help='Writes per second, 0 writes as fast as the bus allows.'
+    )
+    toggle.add_argument(
+        '--pins', type=parse_pins, default=list(OUTPUT_PINS),
+        help=f'Comma-separated output pins to toggle from: {",".join(OUTPUT_PINS)}, or none to switch no relay.'
+    )
+    toggle.add_argument('--no-verify', action='store_true', help='Skip reading GPIO and OLAT back after every write.')
+    toggle.add_argument(
+        '--duration', type=non_negative_float, default=0, help='Run time in seconds, 0 runs until interrupted.'
+    )
+    toggle.add_argument('--interval', type=positive_float, default=10, help='Seconds between progress reports.')
+    toggle.add_argument(
+        '--fail-after', type=non_negative_int, default=10,
+        help='Failed writes in a row before the bus is failed, 0 never fails it.'
+    )
+    toggle.set_defaults(handler=run_toggle)
+
+    inputs = tests.add_parser('inputs', parents=[backend], help='Log the changes of the MCP23017 input pins.')
+    inputs.add_argument(
+        '--pins', type=parse_input_pins, default=list(INPUT_PINS),
+        help=f'Comma-separated input pins to monitor from: {",".join(INPUT_PINS)}.'
+    )
+    inputs.add_argument(
+        '--interrupt-pin', type=int, metavar='BCM',
+        help='GPIO wired to INTA or INTB, the bus is then only read when an input changed instead of polling INTF.'
+    )
+    inputs.add_argument(
+        '--poll-interval', type=positive_float, default=50,
+        help='Milliseconds between INTF polls without --interrupt-pin, every poll is a bus read.'
+    )
+    inputs.add_argument(
+        '--settle', type=non_negative_float, default=20,
+        help='Milliseconds after a mode is switched that input changes still count as while switching.'
+    )
+    inputs.add_argument(
+        '--duration', type=non_negative_float, default=0, help='Run time in seconds, 0 runs until interrupted.'
+    )
+    inputs.add_argument('--sequence', choices=MCP_SEQUENCES, help='Sequence to run while the inputs are monitored.')
+    inputs.add_argument(
+        '--pin-delay', type=non_negative_float, default=0, help='Delay between each relay in milliseconds.'
+    )
+    inputs.add_argument('--cycle-delay', type=non_negative_float, default=1, help='Delay between each mode in seconds.')
+    inputs.add_argument('--atomic', action='store_true', help='Switch every relay of a mode with one register write.')
+    inputs.add_argument('--log', metavar='PATH', help='Write the edge log to a CSV file.')
+    inputs.set_defaults(handler=run_inputs)
+
+    scan = tests.add_parser('scan', parents=[backend], help='List the ADS1115s, MCP23017s and other devices on the bus.')
+    scan.set_defaults(handler=run_scan)
+
+    fanout = tests.add_parser('fanout', parents=[backend], help='Drive every ADS1115 and MCP23017 on the bus at once.')
+    fanout.add_argument(
+        '--adcs', type=parse_addresses, help='Comma-separated ADS1115 addresses or none, defaults to the ones found.'
+    )
+    fanout.add_argument(
+        '--mcps', type=parse_addresses, help='Comma-separated MCP23017 addresses or none, defaults to the ones found.'
+    )
+    fanout.add_argument(
+        '--requests', type=positive_int, default=100, help='Requests per frequency window for each device.'
+    )
+    fanout.add_argument(
+        '--frequency', type=positive_float, default=1, help='Length of the frequency window in seconds.'
+    )
+    fanout.add_argument(
+        '--strategy', choices=STRATEGIES, default=STRATEGIES[0],
+        help='Drive each device from its own thread, or all of them round-robin from one thread.'
+    )
+    fanout.add_argument(
+        '--duration', type=non_negative_float, default=0, help='Run time in seconds, 0 runs until interrupted.'
+    )
+    fanout.add_argument('--interval', type=positive_float, default=10, help='Seconds between progress reports.')
+    fanout.add_argument(
+        '--gain', type=parse_gain, default=1, help='ADS1115 programmable gain, one of: 2/3, 1, 2, 4, 8, 16.'
+    )
+    fanout.add_argument(
+        '--data-rate', type=int, choices=ADS1115_DATA_RATES, default=128, help='ADS1115 samples per second.'
+    )
+    fanout.add_argument(
+        '--engine', choices=(ENGINE_ADAFRUIT, ENGINE_RAW), default=ENGINE_ADAFRUIT,
+        help='Read through the Adafruit driver, or with raw transactions into preallocated buffers.'
+    )
+    fanout.set_defaults(handler=run_fanout)
+
+    capacity = tests.add_parser('capacity', parents=[backend], help='Find the highest ADC request rate the bus sustains.')
+    capacity.add_argument(
+        '--start-rate', type=positive_int, default=10, help='First request rate of the ramp per second.'
+    )
+    capacity.add_argument('--max-rate', type=positive_int, default=1000, help='Highest request rate to try per second.')
+    capacity.add_argument(
+        '--step', type=positive_float, default=2, help='Factor the rate is ramped by until a level fails.'
+    )
+    capacity.add_argument(
+        '--settle', type=non_negative_float, default=1, help='Seconds each level runs before it is measured.'
+    )
+    capacity.add_argument('--hold', type=positive_float, default=5, help='Seconds each level is measured for.')
+    capacity.add_argument(
+        '--max-miss-ratio', type=non_negative_float, default=0.01,
+        help='Highest fraction of missed or failed requests that passes.'
+    )
+    capacity.add_argument(
+        '--max-p99', type=positive_float, help='Highest p99 read latency that passes in milliseconds.'
+    )
+    capacity.add_argument(
+        '--resolution', type=positive_float, default=0.02, help='Fraction of the rate the binary search stops within.'
+    )
+    capacity.add_argument('--csv', metavar='PATH', help='Write the capacity curve to a CSV file.')
+    capacity.add_argument(
+        '--gain', type=parse_gain, default=1, help='ADS1115 programmable gain, one of: 2/3, 1, 2, 4, 8, 16.'
+    )
+    capacity.add_argument(
+        '--mode', choices=(MODE_SINGLE, MODE_CONTINUOUS), default=MODE_SINGLE,
+        help='Convert on every read, or continuously and read only the conversion register.'
+    )
+    capacity.add_argument(
+        '--data-rate', type=int, choices=ADS1115_DATA_RATES, default=128, help='ADS1115 samples per second.'
+    )
+    capacity.add_argument(
+        '--channels', type=parse_channels, default=['P0'],
+        help=f'Comma-separated channels to sweep, from: {",".join(ADS1115_CHANNELS)}.'
+    )
+    capacity.add_argument(
+        '--burst', type=positive_int, default=1, help='Reads of each channel before switching the MUX.'
+    )
+    capacity.add_argument(
+        '--engine', choices=(ENGINE_ADAFRUIT, ENGINE_RAW), default=ENGINE_ADAFRUIT,
+        help='Read through the Adafruit driver, or with raw transactions into preallocated buffers.'
+    )
+    capacity.add_argument(
+        '--batch', type=positive_int, default=1, help='Back-to-back reads per request under a single bus lock.'
+    )
+    capacity.set_defaults(handler=run_capacity)
+
+    matrix = tests.add_parser('matrix', parents=[backend], help='Benchmark the ADC and MCP at every bus frequency.')
+    matrix.add_argument(
+        '--frequencies', type=parse_frequencies, default=list(BUS_FREQUENCIES),
+        help='Comma-separated bus frequencies in Hz, defaults to 100000,400000,1000000.'
+    )
+    matrix.add_argument(
+        '--duration', type=positive_float, default=10, help='Seconds each workload runs at every frequency.'
+    )
+    matrix.add_argument(
+        '--workloads', type=parse_workloads, default=list(WORKLOADS),
+        help=f'Comma-separated workloads to run, from: {",".join(WORKLOADS)}.'
+    )
+    matrix.add_argument(
+        '--gain', type=parse_gain, default=1, help='ADS1115 programmable gain, one of: 2/3, 1, 2, 4, 8, 16.'
+    )
+    matrix.add_argument(
+        '--mode', choices=(MODE_SINGLE, MODE_CONTINUOUS), default=MODE_SINGLE,
+        help='Convert on every read, or continuously and read only the conversion register.'
+    )
+    matrix.add_argument(
+        '--data-rate', type=int, choices=ADS1115_DATA_RATES, default=128, help='ADS1115 samples per second.'
+    )
+    matrix.add_argument(
+        '--channels', type=parse_channels, default=['P0'],
+        help=f'Comma-separated channels to sweep, from: {",".join(ADS1115_CHANNELS)}.'
+    )
+    matrix.add_argument(
+        '--engine', choices=(ENGINE_ADAFRUIT, ENGINE_RAW), default=ENGINE_ADAFRUIT,
+        help='Read through the Adafruit driver, or with raw transactions into preallocated buffers.'
+    )
+    matrix.add_argument(
+        '--batch', type=positive_int, default=1, help='Back-to-back reads per request under a single bus lock.'
+    )
+    matrix.set_defaults(handler=run_matrix)
+    return parser
+
+
+def check_args(args):
+    ''' Get why options that are each valid cannot be combined, None if they can. '''
+    mode = getattr(args, 'mode', None)
+    alert_pin = getattr(args, 'alert_pin', None)
+    if mode == MODE_CONTINUOUS and len(args.channels) > 1:
+        return 'continuous mode converts a single channel, --channels must name only one'
+    if alert_pin is not None and mode != MODE_CONTINUOUS:
+        return '--alert-pin is only used with --mode continuous'
+    if alert_pin is not None and args.batch > 1:
+        return '--batch cannot be used with --alert-pin, every read waits for its own conversion'
+    if args.test == 'capacity':
+        if args.start_rate > args.max_rate:
+            return f'--start-rate {args.start_rate} is above --max-rate {args.max_rate}'
+        if args.step <= 1:
+            return f'--step must be above 1 to ramp the rate, got: {args.step:g}'
+    if args.test == 'fanout' and args.adcs == [] and args.mcps == []:
+        return '--adcs and --mcps cannot both be none'
+    return None
+
+
+def main(argv=None) -> int:
+    '''
+    Parse the arguments and run the requested test. Options that are each valid but cannot
+    be combined exit as invalid arguments before the test starts, any error after that is
+    the test failing.
+    '''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    error = check_args(args)
+    if error:
+        parser.error(error)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 ''' This file is used to import all the components of the application. '''
 
 from .adc_dialog import ADCDialog, ADCResults
+from .capacity_dialog import CapacityDialog
 from .mcp_dialog import MCPDialog, MCPResults
\ No newline at end of file
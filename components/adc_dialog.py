@@ -21,17 +21,70 @@ from kivymd.uix.list import (
 )
 from kivymd.uix.progressindicator.progressindicator import MDCircularProgressIndicator
 
+from .render import DirtyRenderer, format_frame_cost
+
+
+def format_latency(latency):
+    ''' Format a latency summary as p50 / p90 / p99 / p99.9 / max in milliseconds. '''
+    values = ' / '.join(f'{latency[key]:.2f}' for key in ('p50', 'p90', 'p99', 'p99.9', 'max'))
+    return f'Latency p50/p90/p99/p99.9/max: {values} ms'
+
+
+def format_rate(rates):
+    ''' Format the achieved read rate against the configured one. '''
+    achieved_rate, configured_rate = rates
+    if not configured_rate:
+        return f'Read Rate: {achieved_rate:.1f} per second, unpaced'
+    return f'Read Rate: {achieved_rate:.1f} / {configured_rate:.1f} per second'
+
+
+def format_missed_windows(windows):
+    ''' Format the missed windows against the closed ones and the current run of missed windows. '''
+    missed, closed, consecutive_missed = windows
+    return f'Missed Windows: {missed} of {closed}, {consecutive_missed} in a row'
+
+
+def format_worst_window(windows):
+    ''' Format the reads of the worst window against the target and when it started. '''
+    worst_reads, target, worst_start = windows
+    if worst_reads is None:
+        return 'Worst Window: -'
+    if not target:
+        return f'Worst Window: {worst_reads} reads at {worst_start:.0f}s'
+    return f'Worst Window: {worst_reads} of {target:g} reads at {worst_start:.0f}s'
+
+
+def format_faults(faults):
+    ''' Format the failed attempts of every fault class. '''
+    nack, timeout, arbitration, bad_data, other = faults[:5]
+    return f'Faults NACK/Timeout/Arbitration/Bad Data/Other: {nack} / {timeout} / {arbitration} / {bad_data} / {other}'
+
+
+def format_retries(retries):
+    ''' Format the retries, the reads they recovered and the bus recoveries. '''
+    retries, recovered, recoveries = retries
+    return f'Retries: {retries}, {recovered} recovered, {recoveries} bus recoveries'
+
 
 class ADCDialog:
     ''' This class handles the ADC test dialog. '''
     def __init__(self, app, **kwargs):
         self.app = app
+        self.renderer = DirtyRenderer()
         
         # Content setup.
         self.requests = MDListItemSupportingText(text='Payload Size: 0', halign='center')
         self.requests_filled = MDListItemSupportingText(text='Requests Received: 0', halign='center')
         self.requests_missed = MDListItemSupportingText(text='Missed Payloads: 0', halign='center')
         self.last_payload = MDListItemSupportingText(text='Last Payload: None', halign='center')
+        self.max_lateness = MDListItemSupportingText(text='Max Lateness: 0.00 ms', halign='center')
+        self.latency = MDListItemSupportingText(text='Latency p50/p90/p99/p99.9/max: -', halign='center')
+        self.rate = MDListItemSupportingText(text='Read Rate: -', halign='center')
+        self.rolling_rate = MDListItemSupportingText(text='Rolling Rate: -', halign='center')
+        self.missed_windows = MDListItemSupportingText(text='Missed Windows: -', halign='center')
+        self.worst_window = MDListItemSupportingText(text='Worst Window: -', halign='center')
+        self.faults = MDListItemSupportingText(text='Faults NACK/Timeout/Arbitration/Bad Data/Other: -', halign='center')
+        self.retries = MDListItemSupportingText(text='Retries: -', halign='center')
         self.progress = MDCircularProgressIndicator(
             size_hint=(None, None), size=('40dp', '40dp'),
             pos_hint={'center_x': .5, 'center_y': .1}
@@ -44,6 +97,14 @@ class ADCDialog:
         self.container.add_widget(MDListItem(self.requests_filled))
         self.container.add_widget(MDListItem(self.requests_missed))
         self.container.add_widget(MDListItem(self.last_payload))
+        self.container.add_widget(MDListItem(self.max_lateness))
+        self.container.add_widget(MDListItem(self.latency))
+        self.container.add_widget(MDListItem(self.rate))
+        self.container.add_widget(MDListItem(self.rolling_rate))
+        self.container.add_widget(MDListItem(self.missed_windows))
+        self.container.add_widget(MDListItem(self.worst_window))
+        self.container.add_widget(MDListItem(self.faults))
+        self.container.add_widget(MDListItem(self.retries))
         self.container.add_widget(MDDivider())
         self.container.add_widget(MDBoxLayout(size_hint_y=None, height='20dp'))
         self.container.add_widget(self.progress)
@@ -75,11 +136,27 @@ class ADCDialog:
         container = MDDialogContentContainer(orientation='vertical')
         return container
 
-    def update_information(self, requests, requests_filled, requests_missed, last_payload):
-        self.requests.text = f'Payload Size: {requests}'
-        self.requests_filled.text = f'Requests Received: {requests_filled}'
-        self.requests_missed.text = f'Missed Payloads: {requests_missed}'
-        self.last_payload.text = f'Last Payload: {last_payload}'
+    def update_information(self, requests, requests_filled, requests_missed, last_payload, max_lateness, latency,
+                           achieved_rate, configured_rate, windows, faults) -> bool:
+        ''' Update the statistics, only re-rendering the ones that changed. Returns True if any did. '''
+        render = self.renderer.text
+        changed = render(self.requests, requests, 'Payload Size: {}'.format)
+        changed |= render(self.requests_filled, requests_filled, 'Requests Received: {}'.format)
+        changed |= render(self.requests_missed, requests_missed, 'Missed Payloads: {}'.format)
+        changed |= render(self.last_payload, last_payload, 'Last Payload: {}'.format)
+        changed |= render(self.max_lateness, round(max_lateness * 1000, 2), 'Max Lateness: {:.2f} ms'.format)
+        changed |= render(self.latency, latency, format_latency)
+        changed |= render(self.rate, (round(achieved_rate, 1), round(configured_rate, 1)), format_rate)
+        changed |= render(self.rolling_rate, round(windows.rolling_rate, 1), 'Rolling Rate: {:.1f} per second'.format)
+        changed |= render(
+            self.missed_windows, (windows.missed, windows.closed, windows.consecutive_missed), format_missed_windows
+        )
+        changed |= render(
+            self.worst_window, (windows.worst_reads, windows.target, windows.worst_start), format_worst_window
+        )
+        changed |= render(self.faults, faults[:5], format_faults)
+        changed |= render(self.retries, (faults.retries, faults.recovered, faults.recoveries), format_retries)
+        return changed
     
     def open(self):
         self.dialog.open()
@@ -97,6 +174,13 @@ class ADCResults:
         self.payload = MDListItemSupportingText(text='Payload Size:', halign='center')
         self.requests_filled = MDListItemSupportingText(text='Requests Received:', halign='center')
         self.missed_requests = MDListItemSupportingText(text='Total Missed:', halign='center')
+        self.latency = MDListItemSupportingText(text='Latency p50/p90/p99/p99.9/max:', halign='center')
+        self.rate = MDListItemSupportingText(text='Read Rate:', halign='center')
+        self.missed_windows = MDListItemSupportingText(text='Missed Windows:', halign='center')
+        self.worst_window = MDListItemSupportingText(text='Worst Window:', halign='center')
+        self.faults = MDListItemSupportingText(text='Faults NACK/Timeout/Arbitration/Bad Data/Other:', halign='center')
+        self.retries = MDListItemSupportingText(text='Retries:', halign='center')
+        self.frame_cost = MDListItemSupportingText(text='UI Frame Cost:', halign='center')
         self.bus_status = MDListItemSupportingText(text='Bus Status:', halign='center')
         self.progress = MDCircularProgressIndicator(
             size_hint=(None, None), size=('40dp', '40dp'),
@@ -109,6 +193,13 @@ class ADCResults:
         self.container.add_widget(MDListItem(self.payload))
         self.container.add_widget(MDListItem(self.requests_filled))
         self.container.add_widget(MDListItem(self.missed_requests))
+        self.container.add_widget(MDListItem(self.latency))
+        self.container.add_widget(MDListItem(self.rate))
+        self.container.add_widget(MDListItem(self.missed_windows))
+        self.container.add_widget(MDListItem(self.worst_window))
+        self.container.add_widget(MDListItem(self.faults))
+        self.container.add_widget(MDListItem(self.retries))
+        self.container.add_widget(MDListItem(self.frame_cost))
         self.container.add_widget(MDListItem(self.bus_status))
         self.container.add_widget(MDDivider())
         self.container.add_widget(MDBoxLayout(size_hint_y=None, height='20dp'))
@@ -141,10 +232,24 @@ class ADCResults:
         container = MDDialogContentContainer(orientation='vertical')
         return container
 
-    def update_status(self, payload, requests_filled, missed_requests, status):
+    def update_status(self, payload, requests_filled, missed_requests, latency, achieved_rate, configured_rate,
+                      windows, faults, frame_cost, status):
         self.payload.text = f'Payload Size: {payload}'
         self.requests_filled.text = f'Requests Received: {requests_filled}'
         self.missed_requests.text = f'Total Missed: {missed_requests}'
+        self.latency.text = format_latency(latency)
+        self.rate.text = format_rate((achieved_rate, configured_rate))
+        self.missed_windows.text = (
+            f'Missed Windows: {windows.missed} of {windows.closed} {windows.length:g}s windows, '
+            f'at most {windows.max_consecutive_missed} in a row'
+        )
+        self.worst_window.text = format_worst_window((windows.worst_reads, windows.target, windows.worst_start))
+        self.faults.text = format_faults(faults)
+        self.retries.text = (
+            f'{format_retries((faults.retries, faults.recovered, faults.recoveries))}, '
+            f'at most {faults.max_consecutive_failures} failed reads in a row'
+        )
+        self.frame_cost.text = format_frame_cost(frame_cost)
         self.bus_status.text = f'Bus Status: {status}'
         if 'ok' in status.lower():
             self.result.icon = 'check-circle-outline'
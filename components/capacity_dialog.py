@@ -0,0 +1,129 @@
+'''
+This module contains the class for the ADC capacity search dialog.
+'''
+
+from kivy.uix.widget import Widget
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.button import MDButton, MDButtonText
+from kivymd.uix.dialog import (
+    MDDialog,
+    MDDialogButtonContainer,
+    MDDialogContentContainer,
+    MDDialogHeadlineText,
+    MDDialogIcon,
+)
+from kivymd.uix.divider import MDDivider
+from kivymd.uix.list import (
+    MDListItem,
+    MDListItemSupportingText,
+)
+from kivymd.uix.progressindicator.progressindicator import MDCircularProgressIndicator
+
+from .render import DirtyRenderer
+
+
+def format_level(level):
+    ''' Format one measured level of the capacity curve. '''
+    return (
+        f'{level.rate}/s: {level.achieved_rate:.1f}/s achieved, {level.miss_ratio * 100:.2f}% missed, '
+        f'p99 {level.p99:.2f} ms, {"pass" if level.passed else "fail"}'
+    )
+
+
+def format_curve(levels):
+    ''' Format the capacity curve one level per line, sorted by rate. '''
+    if not levels:
+        return 'Capacity Curve: -'
+    return 'Capacity Curve:\n' + '\n'.join(format_level(level) for level in sorted(levels, key=lambda level: level.rate))
+
+
+class CapacityDialog:
+    ''' This class handles the ADC capacity search dialog, it shows the live search and then its result. '''
+    def __init__(self, app, **kwargs):
+        self.app = app
+        self.renderer = DirtyRenderer()
+
+        # Content setup.
+        self.current_rate = MDListItemSupportingText(text='Testing: -', halign='center')
+        self.capacity = MDListItemSupportingText(text='Capacity: -', halign='center')
+        self.thresholds = MDListItemSupportingText(text='Thresholds: -', halign='center')
+        self.curve = MDListItemSupportingText(text='Capacity Curve: -', halign='center')
+        self.progress = MDCircularProgressIndicator(
+            size_hint=(None, None), size=('40dp', '40dp'),
+            pos_hint={'center_x': .5, 'center_y': .1}
+        )
+
+        # Container setup.
+        self.container = self._create_container()
+        self.container.add_widget(MDDivider())
+        self.container.add_widget(MDListItem(self.current_rate))
+        self.container.add_widget(MDListItem(self.capacity))
+        self.container.add_widget(MDListItem(self.thresholds))
+        self.container.add_widget(MDListItem(self.curve))
+        self.container.add_widget(MDDivider())
+        self.container.add_widget(MDBoxLayout(size_hint_y=None, height='20dp'))
+        self.container.add_widget(self.progress)
+
+        # Button setup.
+        self.button_container = MDDialogButtonContainer()
+        self.button = MDButton(
+            style='elevated', theme_width='Custom', size_hint_y=None,
+            height='48dp', radius=7, size_hint_x=.5, on_press=lambda x: self.close()
+        )
+        self.button_text = MDButtonText(
+            text='Stop', font_style='Title', role='large',
+            pos_hint={'center_x': .5, 'center_y': .5}
+        )
+        self.button.add_widget(self.button_text)
+        self.button_container.add_widget(Widget(size_hint_x=.25))
+        self.button_container.add_widget(self.button)
+        self.button_container.add_widget(Widget(size_hint_x=.25))
+        self.result = MDDialogIcon(icon='chart-line', theme_icon_color='Custom', icon_color='white')
+
+        # Dialog setup.
+        self.dialog = MDDialog(
+            self.result,
+            MDDialogHeadlineText(text='ADC Capacity Search'),
+            self.container,
+            self.button_container
+        )
+
+    def _create_container(self):
+        container = MDDialogContentContainer(orientation='vertical')
+        return container
+
+    def start(self, max_miss_ratio, max_p99):
+        ''' Reset the dialog for a new search with its thresholds. '''
+        self.renderer = DirtyRenderer()
+        latency = 'any p99' if max_p99 is None else f'p99 {max_p99:g} ms'
+        self.thresholds.text = f'Thresholds: {max_miss_ratio * 100:g}% missed, {latency}'
+        self.progress.opacity = 1
+        self.button_text.text = 'Stop'
+        self.result.icon = 'chart-line'
+        self.result.icon_color = 'white'
+
+    def update_information(self, current_rate, capacity, levels) -> bool:
+        ''' Update the search progress, only re-rendering what changed. Returns True if anything did. '''
+        render = self.renderer.text
+        changed = render(self.current_rate, current_rate, lambda rate: f'Testing: {rate or "-"} requests/s')
+        changed |= render(self.capacity, capacity, 'Capacity: {} requests/s'.format)
+        changed |= render(self.curve, len(levels), lambda count: format_curve(levels))
+        return changed
+
+    def finish(self, capacity):
+        ''' Show the result of a finished search. '''
+        self.current_rate.text = 'Testing: done'
+        self.progress.opacity = 0
+        self.button_text.text = 'Exit'
+        if capacity:
+            self.result.icon = 'check-circle-outline'
+            self.result.icon_color = 'green'
+        else:
+            self.result.icon = 'alert-circle-outline'
+            self.result.icon_color = 'red'
+
+    def open(self):
+        self.dialog.open()
+
+    def close(self):
+        self.dialog.dismiss()
@@ -21,17 +21,32 @@ from kivymd.uix.list import (
     MDListItemSupportingText,
 )
 
+from .render import DirtyRenderer, format_frame_cost
+
+
+def set_relay(label, active):
+    ''' Highlight the label of a relay that is on and dim the label of one that is off. '''
+    label.text_color = 'green' if active else 'white'
+    label.opacity = 1 if active else 0.2
+
+
+def format_timing_error(name, timing):
+    ''' Format the mean and worst timing error of a kind of delay in milliseconds, negative when early. '''
+    return f'{name} Error: mean {timing["mean"]:+.2f} / worst {timing["worst"]:+.2f} ms'
+
 
 class MCPDialog:
     ''' This class handles the MCP test dialog. '''
     def __init__(self, app, **kwargs):
         self.app = app
+        self.renderer = DirtyRenderer()
         
         # Content setup.
         self.function = MDListItemSupportingText(text='Function: None', halign='center')
         self.mode = MDListItemSupportingText(text='Mode: None', halign='center')
         self.pin_delay = MDListItemSupportingText(text='Pin Delay: 0', halign='center')
         self.cycle_delay = MDListItemSupportingText(text='Cycle Delay: 0', halign='center')
+        self.overruns = MDListItemSupportingText(text='Overruns: 0', halign='center')
         self.motor = MDLabel(text='MOTOR', halign='center', theme_text_color='Custom', text_color='white', opacity=0.5)
         self.v1 = MDLabel(text='V1', halign='center', theme_text_color='Custom', text_color='white', opacity=0.5)
         self.v2 = MDLabel(text='V2', halign='center', theme_text_color='Custom', text_color='white', opacity=0.5)
@@ -52,6 +67,7 @@ class MCPDialog:
         self.container.add_widget(MDListItem(self.mode))
         self.container.add_widget(MDListItem(self.pin_delay))
         self.container.add_widget(MDListItem(self.cycle_delay))
+        self.container.add_widget(MDListItem(self.overruns))
         self.container.add_widget(MDDivider())
         self.container.add_widget(Widget(size_hint_x=.25))
         self.container.add_widget(self.value_container)
@@ -84,37 +100,17 @@ class MCPDialog:
         container = MDDialogContentContainer(orientation='vertical')
         return container
 
-    def update_information(self, function, mode, pin_delay, cycle_delay, motor, v1, v2, v5):
-        self.function.text = f'Function: {function}'
-        self.mode.text = f'Mode: {mode}'
-        self.pin_delay.text = f'Pin Delay: {pin_delay}'
-        self.cycle_delay.text = f'Cycle Delay: {cycle_delay}'
-        if motor:
-            self.motor.text_color = 'green'
-            self.motor.opacity = 1
-        else:
-            self.motor.text_color = 'white'
-            self.motor.opacity = 0.2
-        if v1:
-            self.v1.text_color = 'green'
-            self.v1.opacity = 1
-        else:
-            self.v1.text_color = 'white'
-            self.v1.opacity = 0.2
-        if v2:
-            self.v2.text_color = 'green'
-            self.v2.opacity = 1
-        else:
-            self.v2.text_color = 'white'
-            self.v2.opacity = 0.2
-        if v5:
-            self.v5.text_color = 'green'
-            self.v5.opacity = 1
-        else:
-            self.v5.text_color = 'white'
-            self.v5.opacity = 0.2
-
-
+    def update_information(self, function, mode, pin_delay, cycle_delay, overruns, motor, v1, v2, v5) -> bool:
+        ''' Update the statistics and relays, only re-rendering the ones that changed. Returns True if any did. '''
+        render = self.renderer.text
+        changed = render(self.function, function, 'Function: {}'.format)
+        changed |= render(self.mode, mode, 'Mode: {}'.format)
+        changed |= render(self.pin_delay, pin_delay, 'Pin Delay: {}'.format)
+        changed |= render(self.cycle_delay, cycle_delay, 'Cycle Delay: {}'.format)
+        changed |= render(self.overruns, overruns, 'Overruns: {}'.format)
+        for label, active in ((self.motor, motor), (self.v1, v1), (self.v2, v2), (self.v5, v5)):
+            changed |= self.renderer.apply(label, bool(active), set_relay)
+        return changed
     
     def open(self):
         self.dialog.open()
@@ -130,6 +126,11 @@ class MCPResults:
         
         # Content setup.
         self.function = MDListItemSupportingText(text='Function:', halign='center')
+        self.verify_faults = MDListItemSupportingText(text='Verify Faults:', halign='center')
+        self.overruns = MDListItemSupportingText(text='Overruns:', halign='center')
+        self.pin_timing = MDListItemSupportingText(text='Pin Delay Error:', halign='center')
+        self.cycle_timing = MDListItemSupportingText(text='Cycle Delay Error:', halign='center')
+        self.frame_cost = MDListItemSupportingText(text='UI Frame Cost:', halign='center')
         self.bus_status = MDListItemSupportingText(text='Bus Status:', halign='center')
 
  
@@ -137,6 +138,11 @@ class MCPResults:
         self.container = self._create_container()
         self.container.add_widget(MDDivider())
         self.container.add_widget(MDListItem(self.function))
+        self.container.add_widget(MDListItem(self.verify_faults))
+        self.container.add_widget(MDListItem(self.overruns))
+        self.container.add_widget(MDListItem(self.pin_timing))
+        self.container.add_widget(MDListItem(self.cycle_timing))
+        self.container.add_widget(MDListItem(self.frame_cost))
         self.container.add_widget(MDListItem(self.bus_status))
         self.container.add_widget(MDDivider())
         self.container.add_widget(MDBoxLayout(size_hint_y=None, height='20dp'))
@@ -169,8 +175,13 @@ class MCPResults:
         container = MDDialogContentContainer(orientation='vertical')
         return container
 
-    def update_status(self, function, status):
+    def update_status(self, function, verify_faults, overruns, timing, frame_cost, status):
         self.function.text = f'Function: {function}'
+        self.verify_faults.text = f'Verify Faults: {verify_faults}'
+        self.overruns.text = f'Overruns: {overruns}'
+        self.pin_timing.text = format_timing_error('Pin Delay', timing['pin'])
+        self.cycle_timing.text = format_timing_error('Cycle Delay', timing['cycle'])
+        self.frame_cost.text = format_frame_cost(frame_cost)
         self.bus_status.text = f'Bus Status: {status}'
         if 'ok' in status.lower():
             self.result.icon = 'check-circle-outline'
@@ -0,0 +1,42 @@
+'''
+This module contains the helpers that keep the dialogs from re-rendering widgets that did not change.
+'''
+
+
+_UNSET = object()
+
+
+class DirtyRenderer:
+    '''
+    This class applies values to widgets only when they change.
+
+    Values are compared before they are formatted, so an unchanged widget costs
+    one comparison instead of an f-string and a texture re-render.
+    '''
+
+    def __init__(self):
+        self._values = {}
+
+    def apply(self, widget, value, apply) -> bool:
+        ''' Call apply(widget, value) if the value changed since it was last applied, returning True if it did. '''
+        if self._values.get(widget, _UNSET) == value:
+            return False
+        self._values[widget] = value
+        apply(widget, value)
+        return True
+
+    def text(self, widget, value, formatter) -> bool:
+        ''' Set the text of a widget to formatter(value) if the value changed, returning True if it did. '''
+        if self._values.get(widget, _UNSET) == value:
+            return False
+        self._values[widget] = value
+        widget.text = formatter(value)
+        return True
+
+
+def format_frame_cost(frame_cost):
+    ''' Format the cost of the UI refreshes and the share of time spent on them. '''
+    return (
+        f'UI Frame Cost p50/p99/max: {frame_cost["p50"]:.2f} / {frame_cost["p99"]:.2f} / {frame_cost["max"]:.2f} ms, '
+        f'load {frame_cost["load"] * 100:.2f}%, {frame_cost["renders"]} of {frame_cost["frames"]} rendered'
+    )
@@ -2,6 +2,12 @@
 
 # Get the current directory
 app_path="/home/$(whoami)/i2c_stress_test/app.py"
+cli_path="/home/$(whoami)/i2c_stress_test/cli.py"
+
+# Run the headless command-line runner when arguments are given.
+if [ "$#" -gt 0 ]; then
+    exec python3 "${cli_path}" "$@"
+fi
 
 # Export DISPLAY=:0.0
 export DISPLAY=:0.0
@@ -0,0 +1,28 @@
+''' Seeded tests of the ADC read loop on a simulated bus that NACKs. '''
+
+import time
+import unittest
+
+from utility import ADC, MODE_CONTINUOUS, BusProfile, SimulatedBackend
+
+
+class ReadLoopAbortTest(unittest.TestCase):
+    ''' A fault that stops the read loop before any read. '''
+
+    def test_failed_start_fails_the_bus(self):
+        backend = SimulatedBackend(profile=BusProfile(latency=0, jitter=0, seed=1))
+        adc = ADC(backend=backend, autostart=False, mode=MODE_CONTINUOUS)
+        backend.profile.nack_rate = 1.0
+        adc.start()
+        deadline = time.monotonic() + 5
+        while not adc.get_snapshot().faults.bus_failed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        adc.stop()
+        faults = adc.get_snapshot().faults
+        self.assertTrue(faults.bus_failed)
+        self.assertEqual(faults.nack, 1)
+        self.assertTrue(adc.last_error.startswith('nack: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+''' Tests of the shared-memory sample ring between the ADC worker and the parent. '''
+
+import mmap
+import unittest
+
+from utility.adc_process import COUNTER, SampleRing
+from utility.sample_recorder import RECORD
+
+
+def create_ring(capacity) -> SampleRing:
+    ''' Create a ring in anonymous memory. '''
+    return SampleRing(mmap.mmap(-1, SampleRing.size(capacity)), 0, capacity)
+
+
+class SampleRingTest(unittest.TestCase):
+    ''' Samples copied out of the ring are never ones the writer may be overwriting. '''
+
+    def drain(self, ring, position=0):
+        samples = []
+        position, dropped = ring.drain(position, lambda timestamp, *args: samples.append(timestamp))
+        return position, dropped, samples
+
+    def test_drains_in_order(self):
+        ring = create_ring(8)
+        for index in range(5):
+            ring.record(float(index), index, 0.001, 0)
+        self.assertEqual(self.drain(ring), (5, 0, [0.0, 1.0, 2.0, 3.0, 4.0]))
+
+    def test_lapped_samples_are_dropped(self):
+        ring = create_ring(4)
+        for index in range(10):
+            ring.record(float(index), index, 0.001, 0)
+        # 6 to 9 are still in the ring, but the writer may be packing 10 over 6.
+        self.assertEqual(self.drain(ring), (10, 7, [7.0, 8.0, 9.0]))
+
+    def test_slot_being_written_is_dropped(self):
+        ring = create_ring(4)
+        for index in range(4):
+            ring.record(float(index), index, 0.001, 0)
+        # The writer has packed half of sample 4 into the slot of sample 0 but not bumped the counter yet.
+        ring.buffer[COUNTER.size:COUNTER.size + RECORD.size // 2] = b'\xff' * (RECORD.size // 2)
+        self.assertEqual(self.drain(ring), (4, 1, [1.0, 2.0, 3.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
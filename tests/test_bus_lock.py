@@ -0,0 +1,45 @@
+''' Tests of waiting on a busio-style bus lock held by another thread. '''
+
+import threading
+import time
+import unittest
+
+from utility.bus_backend import lock_bus
+
+
+class HeldBus:
+    ''' A bus whose lock another thread holds until it is released. '''
+
+    def __init__(self):
+        self.held = threading.Event()
+        self.held.set()
+        self.attempts = 0
+
+    def try_lock(self) -> bool:
+        self.attempts += 1
+        return not self.held.is_set()
+
+
+class LockBusTest(unittest.TestCase):
+    ''' lock_bus sleeps between attempts instead of spinning. '''
+
+    def test_waits_for_the_holder(self):
+        bus = HeldBus()
+        timer = threading.Timer(0.05, bus.held.clear)
+        timer.start()
+        start = time.monotonic()
+        lock_bus(bus)
+        timer.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        # A spinning wait would retry hundreds of thousands of times in 50 ms.
+        self.assertLess(bus.attempts, 1000)
+
+    def test_free_bus_locks_at_once(self):
+        bus = HeldBus()
+        bus.held.clear()
+        lock_bus(bus)
+        self.assertEqual(bus.attempts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
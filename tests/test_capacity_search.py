@@ -0,0 +1,72 @@
+''' Tests of how the capacity search brackets the highest sustained request rate. '''
+
+import unittest
+
+from utility import BusProfile, CapacityLevel, CapacitySearch, SimulatedBackend
+
+
+class ThresholdSearch(CapacitySearch):
+    ''' A search over a bus that sustains every rate up to a threshold, without running an ADC. '''
+
+    def __init__(self, threshold, **options):
+        super().__init__(**options)
+        self.threshold = threshold
+
+    def measure(self, rate) -> CapacityLevel:
+        passed = rate <= self.threshold
+        return CapacityLevel(rate, float(rate), rate, 0 if passed else rate, 0, 0.0 if passed else 0.5, 1, 2, 3, passed)
+
+
+class CapacitySearchTest(unittest.TestCase):
+    ''' The ramp finds a failing level and the binary search closes in on the threshold. '''
+
+    def test_brackets_the_threshold(self):
+        for threshold in (10, 11, 97, 300, 999):
+            with self.subTest(threshold=threshold):
+                search = ThresholdSearch(threshold, start_rate=10, max_rate=1000, resolution=0.02)
+                capacity = search.run()
+                self.assertLessEqual(capacity, threshold)
+                self.assertGreaterEqual(capacity, threshold - max(1, int(threshold * 0.02)))
+                failed = min(level.rate for level in search.levels if not level.passed)
+                self.assertGreater(failed, threshold)
+
+    def test_ramps_by_step(self):
+        search = ThresholdSearch(300, start_rate=10, max_rate=1000, step=3)
+        search.run()
+        self.assertEqual([level.rate for level in search.levels[:5]], [10, 30, 90, 270, 810])
+
+    def test_max_rate_passing_ends_the_ramp(self):
+        search = ThresholdSearch(5000, start_rate=10, max_rate=100)
+        self.assertEqual(search.run(), 100)
+        self.assertEqual([level.rate for level in search.get_curve()], [10, 20, 40, 80, 100])
+
+    def test_failing_start_rate_searches_below_it(self):
+        search = ThresholdSearch(5, start_rate=10, max_rate=100)
+        self.assertEqual(search.run(), 5)
+
+    def test_nothing_passes(self):
+        search = ThresholdSearch(0, start_rate=10, max_rate=100)
+        self.assertEqual(search.run(), 0)
+        self.assertFalse(any(level.passed for level in search.levels))
+
+    def test_on_level_sees_every_level(self):
+        seen = []
+        search = ThresholdSearch(50, start_rate=10, max_rate=100)
+        search.run(seen.append)
+        self.assertEqual(seen, search.levels)
+
+    def test_invalid_options(self):
+        for options in ({'start_rate': 0}, {'start_rate': 100, 'max_rate': 10}, {'step': 1}, {'hold': 0}):
+            with self.subTest(options=options):
+                with self.assertRaises(ValueError):
+                    CapacitySearch(**options)
+
+    def test_simulated_bus(self):
+        backend = SimulatedBackend(profile=BusProfile(latency=0, jitter=0, seed=1))
+        search = CapacitySearch(start_rate=10, max_rate=20, settle=0.1, hold=0.3, backend=backend)
+        self.assertEqual(search.run(), 20)
+        self.assertTrue(all(level.passed and level.errors == 0 for level in search.levels))
+
+
+if __name__ == '__main__':
+    unittest.main()
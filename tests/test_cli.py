@@ -0,0 +1,81 @@
+''' Seeded tests of the headless runner's exit status on a simulated bus. '''
+
+import contextlib
+import io
+import threading
+import unittest
+
+from cli import EXIT_FAILED, EXIT_NO_HARDWARE, EXIT_OK, EXIT_USAGE, main
+
+
+SIMULATED = ['--backend', 'simulated', '--sim-latency', '0', '--sim-jitter', '0']
+
+
+def run(*argv, seed=1, timeout=30) -> int:
+    ''' Run the CLI quietly on a seeded simulated bus in a thread, failing if it does not exit in time. '''
+    result = {}
+
+    def target():
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                result['status'] = main(list(argv) + SIMULATED + ['--sim-seed', str(seed)])
+            except SystemExit as exit:
+                result['status'] = exit.code
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AssertionError(f'{" ".join(argv)} did not exit within {timeout} seconds')
+    return result['status']
+
+
+class ArgumentTest(unittest.TestCase):
+    ''' Invalid arguments exit with the usage status. '''
+
+    def test_values_out_of_range(self):
+        for argv in (
+            ('run', 'adc', '--frequency', '0'),
+            ('run', 'fanout', '--frequency', '0'),
+            ('run', 'adc', '--batch', '0'),
+            ('run', 'adc', '--requests', '-5'),
+            ('run', 'mixed', '--cycle-delay', '-1'),
+            ('run', 'inputs', '--poll-interval', '0'),
+            ('run', 'matrix', '--workloads', 'adc,io'),
+        ):
+            with self.subTest(argv=argv):
+                self.assertEqual(run(*argv), EXIT_USAGE)
+
+    def test_options_that_cannot_be_combined(self):
+        for argv in (
+            ('run', 'adc', '--alert-pin', '17'),
+            ('run', 'adc', '--mode', 'continuous', '--channels', 'P0,P1'),
+            ('run', 'adc', '--mode', 'continuous', '--alert-pin', '17', '--batch', '4'),
+            ('run', 'capacity', '--start-rate', '500', '--max-rate', '100'),
+            ('run', 'capacity', '--step', '1'),
+            ('run', 'fanout', '--adcs', 'none', '--mcps', 'none'),
+        ):
+            with self.subTest(argv=argv):
+                self.assertEqual(run(*argv), EXIT_USAGE)
+
+    def test_valid_run(self):
+        self.assertEqual(run('run', 'adc', '--duration', '0.5'), EXIT_OK)
+
+
+class FaultTest(unittest.TestCase):
+    ''' Bus faults end the run with the matching status instead of a traceback or a hang. '''
+
+    def test_mcp_init_nack(self):
+        for test in ('mcp', 'mixed', 'toggle', 'inputs', 'fanout'):
+            with self.subTest(test=test):
+                self.assertEqual(run('run', test, '--sim-nack-rate', '1'), EXIT_NO_HARDWARE)
+
+    def test_mixed_sequence_failure(self):
+        for seed in (2, 3, 4, 6):
+            with self.subTest(seed=seed):
+                status = run('run', 'mixed', '--sim-nack-rate', '0.02', '--cycle-delay', '0.1', seed=seed)
+                self.assertEqual(status, EXIT_FAILED)
+
+
+if __name__ == '__main__':
+    unittest.main()
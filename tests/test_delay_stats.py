@@ -0,0 +1,31 @@
+''' Tests of the timing error of MCP delays. '''
+
+import unittest
+
+from utility.mcp_config import DelayStats
+
+
+class DelayStatsTest(unittest.TestCase):
+    ''' Steps that overslept and steps that woke early. '''
+
+    def test_no_steps(self):
+        self.assertEqual(DelayStats().report(), {'count': 0, 'mean': 0.0, 'worst': 0.0})
+
+    def test_early_wakeups_are_reported(self):
+        stats = DelayStats()
+        stats.record(0.010, 0.009)
+        stats.record(0.010, 0.0095)
+        report = stats.report()
+        self.assertEqual(report['count'], 2)
+        self.assertAlmostEqual(report['mean'], -0.75)
+        self.assertAlmostEqual(report['worst'], -1.0)
+
+    def test_worst_is_furthest_from_the_request(self):
+        stats = DelayStats()
+        for actual in (0.0105, 0.007, 0.012):
+            stats.record(0.010, actual)
+        self.assertAlmostEqual(stats.report()['worst'], -3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
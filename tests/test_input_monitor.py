@@ -0,0 +1,70 @@
+''' Tests of matching input changes to relay switching on a simulated MCP. '''
+
+import unittest
+
+from utility import MCP, BusProfile, InputMonitor, SimulatedBackend
+from utility.bus_backend import MCP23017_ADDRESS, MCP23017_INTFA
+from utility.mcp_config import PINS
+
+
+def create_backend() -> SimulatedBackend:
+    ''' Create a simulated bus with no latency and no random input changes. '''
+    return SimulatedBackend(profile=BusProfile(latency=0, jitter=0, seed=1))
+
+
+class SwitchWindowTest(unittest.TestCase):
+    ''' The switch windows a change between two reads of the inputs is matched against. '''
+
+    def setUp(self):
+        self.mcp = MCP(backend=create_backend())
+        self.mcp.switches.clear()
+        self.mcp.switches.extend([[1.0, 1.1], [2.0, 2.5]])
+
+    def test_overlapping_windows(self):
+        for start, end in ((0.9, 1.0), (1.05, 1.06), (1.1, 1.5), (2.4, 3.0), (0.0, 5.0)):
+            with self.subTest(start=start, end=end):
+                self.assertTrue(self.mcp.switched_between(start, end))
+
+    def test_windows_outside_the_interval(self):
+        for start, end in ((0.0, 0.9), (1.2, 1.9), (2.6, 3.0)):
+            with self.subTest(start=start, end=end):
+                self.assertFalse(self.mcp.switched_between(start, end))
+
+    def test_open_window(self):
+        self.mcp.switches.append([3.0, None])
+        self.assertTrue(self.mcp.switched_between(10.0, 11.0))
+        self.assertFalse(self.mcp.switched_between(2.6, 2.9))
+
+    def test_every_mode_opens_a_window(self):
+        for atomic in (False, True):
+            with self.subTest(atomic=atomic):
+                self.mcp.switches.clear()
+                self.mcp.set_atomic(atomic)
+                self.mcp.set_mode('run')
+                self.assertEqual(len(self.mcp.switches), 1)
+                start, end = self.mcp.switches[0]
+                self.assertLessEqual(start, end)
+                self.assertTrue(self.mcp.switched_between(start, end))
+                self.assertFalse(self.mcp.is_switching())
+
+
+class PendingChangeTest(unittest.TestCase):
+    ''' Switching the relays one pin at a time leaves an unserviced input change pending. '''
+
+    def test_set_pin_keeps_the_interrupt(self):
+        backend = create_backend()
+        mcp = MCP(backend=backend)
+        monitor = InputMonitor(pins=['tls'], mcp=mcp, poll_interval=60)
+        monitor.start()
+        try:
+            device = backend.devices[MCP23017_ADDRESS]
+            port, bit = divmod(PINS['tls'], 8)
+            device._set_input(port, 1 << bit, True)
+            mcp.set_mode('run')
+            self.assertTrue(device.registers[MCP23017_INTFA + port] & 1 << bit)
+        finally:
+            monitor.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
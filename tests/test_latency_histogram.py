@@ -0,0 +1,63 @@
+''' Tests of the bucket and percentile math of the latency histogram. '''
+
+import unittest
+
+from utility.adc_config import LatencyHistogram
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    ''' Percentiles stay within the sub-bucket resolution at every magnitude. '''
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for microseconds in range(1, 101):
+            histogram.record_ns(microseconds * 1000)
+        self.assertEqual(histogram.percentile(50), 50 / 1_000_000)
+        self.assertEqual(histogram.percentile(99), 99 / 1_000_000)
+        self.assertEqual(histogram.summary()['max'], 0.1)
+
+    def test_relative_error_is_bounded(self):
+        histogram = LatencyHistogram()
+        for microseconds in range(1, 1_000_001, 7):
+            histogram.record_ns(microseconds * 1000)
+        for percentile in LatencyHistogram.PERCENTILES:
+            expected = percentile / 100
+            self.assertAlmostEqual(histogram.percentile(percentile), expected, delta=expected / 64)
+
+    def test_bucket_round_trip(self):
+        histogram = LatencyHistogram()
+        for value in (0, 1, 127, 128, 129, 255, 256, 1000, 65535, 65536, 10 ** 9):
+            index = histogram._index_of(value)
+            self.assertGreaterEqual(histogram._value_at(index), value)
+            self.assertLessEqual(histogram._value_at(index) - value, max(value // 64, 0))
+            if index:
+                self.assertLess(histogram._value_at(index - 1), value)
+
+    def test_out_of_range_values_are_clamped(self):
+        histogram = LatencyHistogram(highest_trackable=1.0)
+        histogram.record_ns(-5)
+        histogram.record(10.0)
+        self.assertEqual(histogram.total, 2)
+        self.assertEqual(histogram.percentile(50), 0.0)
+        self.assertEqual(histogram.max_value, 1_000_000)
+
+    def test_since_and_add(self):
+        histogram = LatencyHistogram()
+        histogram.record(0.001)
+        earlier = histogram.copy()
+        histogram.record(0.002)
+        histogram.record(0.003)
+        later = histogram.since(earlier)
+        self.assertEqual(later.total, 2)
+        self.assertEqual(earlier.total, 1)
+        self.assertAlmostEqual(later.percentile(50), 0.002, delta=0.002 / 64)
+        earlier.add(later)
+        self.assertEqual(earlier.total, 3)
+        self.assertEqual(list(earlier.counts), list(histogram.counts))
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().summary(), {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'p99.9': 0.0, 'max': 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
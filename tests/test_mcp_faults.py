@@ -0,0 +1,100 @@
+''' Seeded tests of the MCP and the mixed stress test on a simulated bus that NACKs. '''
+
+import time
+import unittest
+
+from utility import MCP, BusProfile, MixedStress, SimulatedBackend
+
+
+def create_backend(nack_rate=0.0, seed=1) -> SimulatedBackend:
+    ''' Create a simulated bus with no latency, so the tests only wait on the delays they set. '''
+    return SimulatedBackend(profile=BusProfile(latency=0, jitter=0, nack_rate=nack_rate, seed=seed))
+
+
+class MCPInitTest(unittest.TestCase):
+    ''' An MCP that does not answer while it is set up. '''
+
+    def test_nack_leaves_it_uninitialized(self):
+        mcp = MCP(backend=create_backend(nack_rate=1.0))
+        self.assertFalse(mcp.is_initialized())
+        self.assertTrue(mcp.last_error.startswith('Initialization: '))
+
+    def test_answering_mcp_is_initialized(self):
+        mcp = MCP(backend=create_backend())
+        self.assertTrue(mcp.is_initialized())
+        self.assertIsNone(mcp.last_error)
+        self.assertEqual(mcp.get_mode(), 'rest')
+
+
+class MCPStopTest(unittest.TestCase):
+    ''' Stopping an MCP while the bus is failing. '''
+
+    def test_rest_keeps_the_error(self):
+        for atomic in (False, True):
+            mcp = MCP(backend=create_backend())
+            mcp.set_atomic(atomic)
+            mcp.backend.profile.nack_rate = 1.0
+            mcp.stop_cycle()
+            self.assertTrue(mcp.last_error.startswith('rest: '))
+
+    def test_sequence_failure_ends_the_sequence(self):
+        mcp = MCP(backend=create_backend())
+        mcp.set_cycle_delay(0.01)
+        mcp.run_sequence('run_cycle')
+        mcp.backend.profile.nack_rate = 1.0
+        deadline = time.monotonic() + 5
+        while mcp.get_mode() not in ('Complete', None) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(mcp.get_mode())
+        self.assertIsNotNone(mcp.last_error)
+        mcp.stop_cycle()
+
+
+class SharedMCPTest(unittest.TestCase):
+    ''' A second MCP at the address of one running a sequence. '''
+
+    def test_running_sequence_is_left_alone(self):
+        backend = create_backend()
+        mcp = MCP(backend=backend)
+        mcp.set_cycle_delay(0.05)
+        mcp.run_sequence('run_cycle')
+        deadline = time.monotonic() + 5
+        while mcp.get_mode() == 'rest' and time.monotonic() < deadline:
+            time.sleep(0.001)
+        other = MCP(backend=backend)
+        self.assertIs(other.sequencer, mcp.sequencer)
+        self.assertIsNone(other.get_mode())
+        mcp.sequencer.wait()
+        self.assertEqual(mcp.get_mode(), 'Complete')
+        mcp.stop_cycle()
+
+
+class MixedStressTest(unittest.TestCase):
+    ''' The ADC read loop running alongside a sequence that fails. '''
+
+    def test_failed_sequence_completes(self):
+        mixed = MixedStress(requests=100, cycle_delay=0.01, backend=create_backend())
+        mixed.start()
+        mixed.mcp.backend.profile.nack_rate = 1.0
+        deadline = time.monotonic() + 5
+        while not mixed.is_complete() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mixed.stop()
+        self.assertTrue(mixed.is_complete())
+        self.assertTrue(mixed.is_failed())
+
+    def test_stop_stops_the_adc_when_the_mcp_raises(self):
+        mixed = MixedStress(requests=100, cycle_delay=0.01, backend=create_backend())
+
+        def stop_cycle():
+            raise IOError('stop failed')
+
+        mixed.mcp.stop_cycle = stop_cycle
+        mixed.start()
+        with self.assertRaises(IOError):
+            mixed.stop()
+        self.assertFalse(mixed.adc._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
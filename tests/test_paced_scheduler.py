@@ -0,0 +1,68 @@
+''' Tests of the ADC request pacing against a fake monotonic clock. '''
+
+import unittest
+
+from utility.adc_config import PacedScheduler
+
+
+class FakeClock:
+    ''' A monotonic clock that only moves when waited on or advanced, standing in for the stop event too. '''
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def wait(self, seconds) -> bool:
+        self.now += seconds
+        return False
+
+
+class PacedSchedulerTest(unittest.TestCase):
+    ''' Requests are released at exact slots from the start of the run. '''
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = PacedScheduler(100, 1, clock=self.clock)
+        self.scheduler.start()
+
+    def test_slots_do_not_drift(self):
+        for index in range(1000):
+            self.assertTrue(self.scheduler.wait_next(self.clock))
+            self.assertAlmostEqual(self.clock.now, 100.0 + index * 0.01, places=9)
+        self.assertEqual(self.scheduler.issued, 1000)
+        self.assertEqual(self.scheduler.get_missed(), 0)
+        self.assertAlmostEqual(self.scheduler.max_lateness, 0.0, places=9)
+
+    def test_late_request_does_not_push_back_the_next(self):
+        self.scheduler.wait_next(self.clock)
+        self.clock.now += 0.004
+        self.scheduler.wait_next(self.clock)
+        self.assertAlmostEqual(self.clock.now, 100.01, places=9)
+        self.clock.now += 0.003
+        self.scheduler.wait_next(self.clock)
+        self.assertAlmostEqual(self.clock.now, 100.02, places=9)
+
+    def test_slots_that_end_unissued_are_missed(self):
+        self.scheduler.wait_next(self.clock)
+        # Busy through the slots at 0.01 and 0.02, then 5 ms into the slot at 0.03.
+        self.clock.now += 0.035
+        self.assertEqual(self.scheduler.get_missed(), 2)
+        self.scheduler.wait_next(self.clock)
+        self.assertEqual(self.scheduler.missed, 2)
+        self.assertEqual(self.scheduler.issued, 2)
+        self.assertAlmostEqual(self.scheduler.last_lateness, 0.005, places=9)
+
+    def test_stop_event_ends_the_wait(self):
+        self.scheduler.wait_next(self.clock)
+
+        class Stopped:
+            def wait(self, seconds):
+                return True
+
+        self.assertFalse(self.scheduler.wait_next(Stopped()))
+
+
+if __name__ == '__main__':
+    unittest.main()
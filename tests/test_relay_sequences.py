@@ -0,0 +1,90 @@
+''' Tests of loading relay sequences and compiling them into timing plans. '''
+
+import unittest
+
+from utility.relay_sequences import GAP_CYCLE, GAP_PIN, PlanStep, compile_sequence, load_definitions, parse_definitions
+
+
+DATA = {
+    'pins': {'a': 0, 'b': 1, 'c': 2, 'sense': 8},
+    'outputs': ['a', 'b', 'c'],
+    'inputs': ['sense'],
+    'modes': {'on': {'a': True, 'b': True}, 'half': {'a': True, 'b': False}, 'rest': {'a': False, 'b': False}},
+    'sequences': {
+        'cycle': {'name': 'Cycle', 'steps': [{'repeat': 2, 'steps': ['on', 'rest']}, {'mode': 'half', 'hold': 3}]}
+    }
+}
+
+
+class ParseDefinitionsTest(unittest.TestCase):
+    ''' Definitions are expanded and checked as they are loaded. '''
+
+    def test_repeats_and_holds(self):
+        definitions = parse_definitions(DATA)
+        sequence = definitions.sequences['cycle']
+        self.assertEqual(sequence.name, 'Cycle')
+        self.assertEqual(sequence.steps, (('on', None), ('rest', None), ('on', None), ('rest', None), ('half', 3)))
+        self.assertEqual(definitions.mode_mask('on'), 0b11)
+        self.assertEqual(definitions.mode_pins_mask(), 0b11)
+        self.assertEqual(definitions.outputs_mask(), 0b111)
+
+    def test_invalid_definitions(self):
+        for change in (
+            {'pins': dict(DATA['pins'], a=16)},
+            {'outputs': ['a', 'missing']},
+            {'modes': dict(DATA['modes'], bad={'sense': True})},
+            {'modes': {'on': DATA['modes']['on']}, 'sequences': {}},
+            {'sequences': {'cycle': {'steps': ['unknown']}}},
+        ):
+            with self.subTest(change=change):
+                with self.assertRaises(ValueError):
+                    parse_definitions(dict(DATA, **change))
+
+    def test_shipped_definitions(self):
+        definitions = load_definitions()
+        self.assertIn('run_cycle', definitions.sequences)
+        self.assertEqual(len(definitions.sequences['run_cycle'].steps), 15)
+
+
+class CompileSequenceTest(unittest.TestCase):
+    ''' Plans place every write at its offset with the masks of its mode. '''
+
+    def setUp(self):
+        self.definitions = parse_definitions(DATA)
+        self.steps = [('on', None), ('half', 3)]
+
+    def test_atomic(self):
+        plan = compile_sequence(self.definitions, self.steps, pin_delay=0.5, cycle_delay=2, atomic=True)
+        self.assertEqual(plan, (
+            PlanStep(0.0, 0b11, 0b11, 'on', None, None), PlanStep(0.0, 0, 0, 'on', None, None),
+            PlanStep(2.0, 0b11, 0b01, 'half', GAP_CYCLE, 2), PlanStep(2.0, 0, 0, 'half', None, None),
+            PlanStep(5.0, 0b11, 0b00, 'rest', GAP_CYCLE, 3), PlanStep(5.0, 0, 0, 'rest', None, None),
+        ))
+
+    def test_one_pin_at_a_time(self):
+        plan = compile_sequence(self.definitions, self.steps, pin_delay=0.5, cycle_delay=1)
+        self.assertEqual(plan, (
+            PlanStep(0.0, 0b01, 0b01, 'on', None, None),
+            PlanStep(0.5, 0b10, 0b10, 'on', GAP_PIN, 0.5),
+            PlanStep(1.0, 0, 0, 'on', GAP_PIN, 0.5),
+            PlanStep(1.0, 0b01, 0b01, 'half', GAP_CYCLE, 1),
+            PlanStep(1.5, 0b10, 0b00, 'half', GAP_PIN, 0.5),
+            PlanStep(2.0, 0, 0, 'half', GAP_PIN, 0.5),
+            PlanStep(4.0, 0b01, 0b00, 'rest', GAP_CYCLE, 3),
+            PlanStep(4.5, 0b10, 0b00, 'rest', GAP_PIN, 0.5),
+            PlanStep(5.0, 0, 0, 'rest', GAP_PIN, 0.5),
+        ))
+
+    def test_slow_switching_pushes_the_next_mode_back(self):
+        plan = compile_sequence(self.definitions, [('on', None)], pin_delay=2, cycle_delay=1)
+        rest = [step for step in plan if step.mode == 'rest']
+        self.assertEqual(rest[0].offset, 4.0)
+
+    def test_every_plan_ends_at_rest(self):
+        plan = compile_sequence(self.definitions, [], atomic=True)
+        self.assertEqual([step.mode for step in plan], ['rest', 'rest'])
+        self.assertEqual(plan[0].values, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+''' Round-trip tests of the binary sample log. '''
+
+import os
+import tempfile
+import unittest
+
+from utility import sample_recorder
+from utility.sample_recorder import SampleRecorder, iter_records, read_log
+
+
+class SampleRecorderTest(unittest.TestCase):
+    ''' Every recorded sample reads back unchanged, across chunk boundaries. '''
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'logs', 'adc.bin')
+
+    def record(self, count):
+        recorder = SampleRecorder(self.path, chunk_records=1)
+        channels = ('P0', 'P1', 'P0-P1')
+        samples = [
+            (float(index), None if index % 5 == 0 else index - 100, index / 1024, index % 6, channels[index % 3])
+            for index in range(count)
+        ]
+        for sample in samples:
+            recorder.record(*sample)
+        recorder.close()
+        recorder.close()
+        self.assertEqual(recorder.records, count)
+        return samples
+
+    def test_round_trip(self):
+        # Chunks are aligned to whole records and pages, 1024 records each here, so this maps ten of them.
+        count = 10000
+        samples = self.record(count)
+        self.assertEqual(list(iter_records(self.path)), samples)
+        self.assertEqual(os.path.getsize(self.path), sample_recorder.HEADER_SIZE + count * sample_recorder.RECORD.size)
+
+    def test_empty_log(self):
+        self.record(0)
+        self.assertEqual(list(iter_records(self.path)), [])
+
+    def test_rejects_other_files(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as file:
+            file.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            list(iter_records(self.path))
+
+    @unittest.skipIf(sample_recorder.numpy is None, 'NumPy is not installed')
+    def test_read_log(self):
+        samples = self.record(1000)
+        log = read_log(self.path)
+        self.assertEqual(len(log), 1000)
+        self.assertEqual(log['timestamp'][10], samples[10][0])
+        self.assertEqual(log['value'][10], sample_recorder.MISSING_VALUE)
+        self.assertEqual(log['value'][11], samples[11][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+''' Tests of stopping the sequencer while commands are submitted. '''
+
+import threading
+import time
+import unittest
+
+from utility.sequencer import Sequencer
+
+
+class StopTest(unittest.TestCase):
+    ''' A stop drops what was queued before it and nothing submitted after it. '''
+
+    def test_submit_during_stop_runs_after_it(self):
+        sequencer = Sequencer()
+        ran = threading.Event()
+
+        def slow_to_stop():
+            sequencer.stop_event.wait()
+            time.sleep(0.1)
+
+        sequencer.submit(slow_to_stop)
+        stopper = threading.Thread(target=sequencer.stop)
+        stopper.start()
+        self.assertTrue(sequencer.stop_event.wait(5))
+        sequencer.submit(ran.set)
+        stopper.join()
+        self.assertTrue(ran.wait(5))
+        sequencer.shutdown()
+
+    def test_stop_drops_queued_commands(self):
+        sequencer = Sequencer()
+        ran = threading.Event()
+        sequencer.submit(sequencer.stop_event.wait)
+        sequencer.submit(ran.set)
+        sequencer.stop()
+        sequencer.wait()
+        self.assertFalse(ran.is_set())
+        sequencer.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+''' Tests of the windowed throughput accounting of ADC reads. '''
+
+import unittest
+
+from utility import ADC, BusProfile, SimulatedBackend
+from utility.adc_config import WindowedThroughput
+
+
+class WindowedThroughputTest(unittest.TestCase):
+    ''' Windows are closed against their target as time passes them. '''
+
+    def test_missed_windows(self):
+        windows = WindowedThroughput(1.0, 10)
+        windows.start(0.0)
+        for second, reads in enumerate((10, 4, 0, 12)):
+            windows.record(second + 0.5, reads)
+        windows.advance(4.0)
+        summary = windows.summary()
+        self.assertEqual(summary.closed, 4)
+        self.assertEqual(summary.missed, 2)
+        self.assertEqual(summary.consecutive_missed, 0)
+        self.assertEqual(summary.max_consecutive_missed, 2)
+        self.assertEqual((summary.worst_reads, summary.worst_start), (0, 2.0))
+        self.assertEqual(summary.rolling_rate, 26 / 4)
+
+    def test_empty_windows_are_closed(self):
+        windows = WindowedThroughput(0.5, 1)
+        windows.start(10.0)
+        windows.record(13.2, 1)
+        self.assertEqual(windows.summary().missed, 6)
+        self.assertEqual(windows.summary().consecutive_missed, 6)
+
+    def test_rolling_rate_covers_the_last_windows(self):
+        windows = WindowedThroughput(1.0, 5, rolling=2)
+        windows.start(0.0)
+        for second, reads in enumerate((100, 4, 6)):
+            windows.record(second, reads)
+        windows.advance(3.0)
+        self.assertEqual(windows.get_rolling_rate(), 5.0)
+
+    def test_no_target_misses_nothing(self):
+        windows = WindowedThroughput(1.0, 0)
+        windows.start(0.0)
+        windows.advance(5.0)
+        self.assertEqual(windows.summary().closed, 5)
+        self.assertEqual(windows.summary().missed, 0)
+
+    def test_not_started(self):
+        windows = WindowedThroughput(1.0, 10)
+        windows.advance(100.0)
+        self.assertEqual(windows.summary().closed, 0)
+        self.assertIsNone(windows.summary().worst_reads)
+
+
+class ADCWindowTargetTest(unittest.TestCase):
+    ''' The ADC only sets a window target when something defines the rate it should read at. '''
+
+    def create_adc(self, **options):
+        return ADC(backend=SimulatedBackend(profile=BusProfile(seed=1)), autostart=False, **options)
+
+    def test_paced_target(self):
+        adc = self.create_adc(requests=50, frequency=2, batch=2)
+        self.assertEqual(adc.get_configured_rate(), 50.0)
+        self.assertEqual((adc.windows.length, adc.windows.target), (2, 100.0))
+
+    def test_continuous_target(self):
+        adc = self.create_adc(mode='continuous', data_rate=250)
+        self.assertEqual(adc.windows.target, 250.0)
+
+    def test_unpaced_has_no_target(self):
+        adc = self.create_adc(requests=0)
+        self.assertEqual(adc.get_configured_rate(), 0.0)
+        self.assertEqual(adc.windows.target, 0.0)
+
+    def test_zero_frequency_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.create_adc(requests=100, frequency=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,20 @@
 ''' This package contains the utility functions for the project. '''
 
-from .adc_config import ADC
-from .mcp_config import MCP
\ No newline at end of file
+from .adc_config import ADC, ADCSnapshot, ENGINE_ADAFRUIT, ENGINE_RAW, MODE_CONTINUOUS, MODE_SINGLE, WindowSummary
+from .adc_process import ADCProcess
+from .capacity_search import CapacityLevel, CapacitySearch
+from .bus_backend import (
+    ADS1115_ADDRESSES, ADS1115_CHANNELS, ADS1115_DATA_RATES, ADS1115_GAINS, BACKENDS, BUS_FREQUENCIES, MCP23017_ADDRESSES,
+    BusProfile, SimulatedBackend, get_backend
+)
+from .bus_benchmark import WORKLOADS, BusBenchmark
+from .bus_faults import FAULT_CLASSES, FaultSummary, RetryPolicy
+from .bus_manager import bus_manager
+from .fan_out import STRATEGIES, FanOutStress, discover_devices
+from .input_monitor import InputEdge, InputMonitor
+from .mcp_config import INPUT_PINS, MCP, OUTPUT_PINS, SEQUENCES
+from .mixed_stress import MixedStress
+from .relay_sequences import compile_sequence, load_definitions
+from .sample_recorder import SampleRecorder, iter_records, read_log
+from .toggle_stress import ToggleSnapshot, ToggleStress
+from .ui_refresh import AdaptiveRefresh
\ No newline at end of file
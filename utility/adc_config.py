@@ -10,78 +10,727 @@ Usage Example:
 
 from adc_config import ADC
 
-# Create an instance of the ADC class.
-adc = ADC()
+# Create an instance of the ADC class, paced at 100 requests every second.
+adc = ADC(requests=100, frequency=1)
 '''
 
+from array import array
+from collections import deque, namedtuple
 import threading
 import time
 
-try:
-    import board
-    import busio
-    import adafruit_ads1x15.ads1115 as ADS
-    from adafruit_ads1x15.analog_in import AnalogIn
-except (ImportError, NotImplementedError):
-    busio = None
-    board = None
-    ADS = None
-    AnalogIn = None
+from .bus_backend import ADS1115_ADDRESS, ADS1115_CHANNELS, ADS1115_DATA_RATES, ADS1115Continuous, RawADS1115, get_backend
+from .bus_faults import FAULT_ERRORS, FaultCounters, FaultSummary, RetryPolicy, classify
+from .bus_manager import bus_manager
+
+
+# Error codes passed to the sample listeners, a classified fault passes its code from FAULT_ERRORS.
+ERROR_NONE = 0
+ERROR_IO = 1
+
+# Conversion modes of the ADC.
+MODE_SINGLE = 'single'
+MODE_CONTINUOUS = 'continuous'
+
+# Engines the ADC can read the ADS1115 with.
+ENGINE_ADAFRUIT = 'adafruit'
+ENGINE_RAW = 'raw'
+
+
+class PacedScheduler:
+    '''
+    This class paces requests at an exact rate against the monotonic clock.
+
+    Every request owns a slot of frequency / requests seconds. A request is
+    released at the start of its slot and is only counted as missed once the
+    slot has ended without it being issued. Release times are computed from
+    the start of the run, so a late request never pushes back the next one.
+    '''
+
+    def __init__(self, requests, frequency, clock=time.monotonic):
+        self.requests = requests
+        self.frequency = frequency
+        self.interval = frequency / requests
+        self.clock = clock
+        self.start_time = None
+        self.index = 0
+        self.issued = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+
+    def start(self):
+        ''' Start the schedule from the current time. '''
+        self.start_time = self.clock()
+        self.index = 0
+        self.issued = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+
+    def wait_next(self, stop_event) -> bool:
+        ''' Wait for the next slot to open, returning False if the stop event was set. '''
+        while True:
+            release = self.start_time + self.index * self.interval
+            now = self.clock()
+            if now < release:
+                if stop_event.wait(release - now):
+                    return False
+                continue
+            lateness = now - release
+            if lateness >= self.interval:
+                # Every slot that ended while we were busy is a missed request.
+                skipped = int(lateness // self.interval)
+                self.missed += skipped
+                self.index += skipped
+                continue
+            self.last_lateness = lateness
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.index += 1
+            self.issued += 1
+            return True
+
+    def get_missed(self) -> int:
+        ''' Get the amount of requests whose slot has ended without being issued. '''
+        if self.start_time is None:
+            return 0
+        elapsed_slots = int((self.clock() - self.start_time) // self.interval)
+        return self.missed + max(elapsed_slots - self.index, 0)
+
+    def get_mean_lateness(self) -> float:
+        ''' Get the mean lateness of the issued requests in seconds. '''
+        if self.issued == 0:
+            return 0.0
+        return self.total_lateness / self.issued
+
+
+class LatencyHistogram:
+    '''
+    This class records latencies into a fixed-memory, log-bucketed histogram.
+
+    Values are kept in microseconds. Every power of two is split into the same
+    number of linear sub-buckets, so the relative error of a reported value is
+    bounded by the sub-bucket resolution no matter how large the value is.
+    '''
+
+    PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+    def __init__(self, significant_bits=7, highest_trackable=3600.0):
+        self.sub_bucket_count = 1 << significant_bits
+        self.sub_bucket_half = self.sub_bucket_count // 2
+        self.highest_trackable = int(highest_trackable * 1_000_000)
+        self.counts = array('Q', bytes(8 * (self._index_of(self.highest_trackable) + 1)))
+        self.total = 0
+        self.max_value = 0
+
+    def _index_of(self, value) -> int:
+        ''' Get the bucket index of a value in microseconds. '''
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_half.bit_length()
+        return shift * self.sub_bucket_half + (value >> shift)
+
+    def _value_at(self, index) -> int:
+        ''' Get the highest value in microseconds that lands in a bucket. '''
+        if index < self.sub_bucket_count:
+            return index
+        shift = index // self.sub_bucket_half - 1
+        sub_bucket = index - shift * self.sub_bucket_half
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds):
+        ''' Record a latency in seconds. '''
+        self.record_ns(int(seconds * 1_000_000_000))
+
+    def record_ns(self, nanoseconds):
+        ''' Record a latency in nanoseconds. '''
+        value = min(max(nanoseconds // 1000, 0), self.highest_trackable)
+        self.counts[self._index_of(value)] += 1
+        self.total += 1
+        if value > self.max_value:
+            self.max_value = value
+
+    def percentile(self, percentile) -> float:
+        ''' Get the latency in seconds at or below which the given percentage of records fall. '''
+        if self.total == 0:
+            return 0.0
+        target = max(int(self.total * percentile / 100.0 + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value_at(index), self.max_value) / 1_000_000
+        return self.max_value / 1_000_000
+
+    def summary(self) -> dict:
+        ''' Get the p50, p90, p99, p99.9 and max latencies in milliseconds. '''
+        summary = {f'p{percentile:g}': self.percentile(percentile) * 1000 for percentile in self.PERCENTILES}
+        summary['max'] = self.max_value / 1000
+        return summary
+
+    def copy(self):
+        ''' Get a copy of the histogram that later records do not change. '''
+        histogram = LatencyHistogram.__new__(LatencyHistogram)
+        histogram.__dict__.update(self.__dict__)
+        histogram.counts = array('Q', self.counts)
+        return histogram
+
+    def since(self, earlier):
+        ''' Get a histogram of the values recorded after an earlier copy of this one was taken. '''
+        histogram = self.copy()
+        histogram.counts = array('Q', (count - before for count, before in zip(self.counts, earlier.counts)))
+        histogram.total = self.total - earlier.total
+        highest = max((index for index, count in enumerate(histogram.counts) if count), default=None)
+        histogram.max_value = 0 if highest is None else min(self._value_at(highest), self.max_value)
+        return histogram
+
+    def add(self, other):
+        ''' Add the values recorded by another histogram of the same resolution to this one. '''
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+
+    def reset(self):
+        ''' Clear all recorded values. '''
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.total = 0
+        self.max_value = 0
+
+
+class WindowSummary(namedtuple('WindowSummary', (
+    'length', 'target', 'closed', 'missed', 'consecutive_missed', 'max_consecutive_missed', 'worst_reads',
+    'worst_start', 'rolling_rate'
+))):
+    '''
+    This class is an immutable view of the windowed throughput of a run.
+
+    worst_reads is None until a window has closed, worst_start is the offset of
+    the worst window from the start of the run in seconds.
+    '''
+
+    __slots__ = ()
+
+
+class WindowedThroughput:
+    '''
+    This class accounts reads in fixed windows of a run instead of cumulatively.
+
+    The run is cut into windows of length seconds from its start. When a window
+    ends, the reads it achieved are compared against the target and a window
+    short of it is missed. Runs of missed windows and the worst window are kept,
+    and the rolling rate covers the last rolling windows, so a stall hours into
+    a run is reported on its own instead of being averaged away. A target of 0
+    means the reads are not paced, so no window can be missed.
+    '''
+
+    def __init__(self, length, target, rolling=10):
+        self.length = length
+        self.target = target
+        self.start_time = None
+        self.index = 0
+        self.current = 0
+        self.closed = 0
+        self.missed = 0
+        self.consecutive_missed = 0
+        self.max_consecutive_missed = 0
+        self.worst_reads = None
+        self.worst_index = 0
+        self._recent = deque(maxlen=rolling)
+
+    def start(self, now):
+        ''' Start the first window at a monotonic time. '''
+        self.start_time = now
+        self.index = 0
+        self.current = 0
+
+    def advance(self, now):
+        ''' Close every window that ended before a monotonic time, including the empty ones. '''
+        if self.start_time is None:
+            return
+        while now >= self.start_time + (self.index + 1) * self.length:
+            self._close(self.current)
+            self.current = 0
+            self.index += 1
+
+    def record(self, now, reads):
+        ''' Count reads issued at a monotonic time against the window they fall in. '''
+        self.advance(now)
+        self.current += reads
+
+    def _close(self, reads):
+        ''' Account a window that has ended. '''
+        self.closed += 1
+        self._recent.append(reads)
+        if self.target and reads < self.target:
+            self.missed += 1
+            self.consecutive_missed += 1
+            self.max_consecutive_missed = max(self.max_consecutive_missed, self.consecutive_missed)
+        else:
+            self.consecutive_missed = 0
+        if self.worst_reads is None or reads < self.worst_reads:
+            self.worst_reads = reads
+            self.worst_index = self.index
+
+    def get_rolling_rate(self) -> float:
+        ''' Get the reads per second over the last closed windows. '''
+        if not self._recent:
+            return 0.0
+        return sum(self._recent) / (len(self._recent) * self.length)
+
+    def summary(self) -> WindowSummary:
+        ''' Get an immutable summary of the closed windows. '''
+        return WindowSummary(
+            length=self.length,
+            target=self.target,
+            closed=self.closed,
+            missed=self.missed,
+            consecutive_missed=self.consecutive_missed,
+            max_consecutive_missed=self.max_consecutive_missed,
+            worst_reads=self.worst_reads,
+            worst_start=self.worst_index * self.length,
+            rolling_rate=self.get_rolling_rate()
+        )
+
+
+class ADCSnapshot(namedtuple('ADCSnapshot', (
+    'timestamp', 'requests_filled', 'reads', 'errors', 'missed_requests', 'ready_timeouts', 'payload',
+    'duration', 'max_lateness', 'achieved_rate', 'configured_rate', 'latency', 'windows', 'faults'
+))):
+    '''
+    This class is an immutable view of an ADC run at one point in time.
+
+    The reading thread builds a new one and swaps it in with a single reference
+    assignment, so a reader always gets numbers that existed together and the
+    reading thread never waits on a reader.
+    '''
+
+    __slots__ = ()
+
+    def latency_summary(self) -> dict:
+        ''' Get the p50, p90, p99, p99.9 and max read latencies in milliseconds. '''
+        return self.latency.summary()
+
+
+class ReadStats:
+    ''' This class holds the reads, errors and latency of one slice of an ADC run. '''
+
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def record(self, latency_ns, error):
+        ''' Record a single read. '''
+        self.reads += 1
+        if error != ERROR_NONE:
+            self.errors += 1
+        self.latency.record_ns(latency_ns)
+
+    def report(self, duration) -> dict:
+        ''' Get the throughput over a duration, the error rate and the latency percentiles. '''
+        report = {
+            'reads': self.reads,
+            'errors': self.errors,
+            'error_rate': self.errors / self.reads if self.reads else 0.0,
+            'throughput': self.reads / duration if duration else 0.0
+        }
+        report.update(self.latency.summary())
+        return report
 
 
 class ADC:
     '''
     This class is used to interface with the ADS1115 Analog-to-Digital Converter.
+
+    By default it reads P0. Given several channels it sweeps them round-robin,
+    reading each burst times in a row before the MUX is switched to the next.
+
+    In continuous mode the ADS1115 converts one channel at the data rate and
+    every read only fetches the conversion register. Without requests the
+    reads are timed to the data rate, or follow the ALERT/RDY pin when
+    alert_pin is set, so there is one read for every conversion.
+
+    The adafruit engine reads through AnalogIn, the raw engine does the same
+    transactions itself into preallocated buffers, so comparing the two
+    separates the library overhead from the bus. With batch set every request
+    is that many back-to-back reads under a single bus lock, which is let go
+    while a failed read backs off so other devices are not starved meanwhile.
+
+    A failed read is classified and retried under the retry policy, which also
+    decides when the bus is recovered and when it is given up on. errors
+    counts the reads that failed after every retry. A fault that stops the
+    reads altogether fails the bus and is kept in last_error.
+
+    Successful reads are also accounted in windows of window seconds, the
+    frequency window by default, against the configured rate. A window short
+    of its target is missed, unpaced single-shot reads have no target.
+
+    The reading thread publishes an ADCSnapshot every SNAPSHOT_INTERVAL seconds
+    and when it stops, get_snapshot returns the latest one.
+
+    It reads the ADS1115 at address, every address gets its own devices on the shared bus.
     '''
 
-    def __init__(self, gain=1, requests=0, delay=0):
+    SNAPSHOT_INTERVAL = 0.05
+
+    def __init__(self, gain=1, requests=0, frequency=1, backend=None, autostart=True, channels=('P0',), burst=1,
+                 mode=MODE_SINGLE, data_rate=128, alert_pin=None, engine=ENGINE_ADAFRUIT, batch=1, window=None,
+                 retry=None, address=ADS1115_ADDRESS):
+        for channel in channels:
+            if channel not in ADS1115_CHANNELS:
+                raise ValueError(f'Unknown channel: {channel}, expected one of: {", ".join(ADS1115_CHANNELS)}')
+        if burst < 1:
+            raise ValueError(f'Burst must be at least 1, got: {burst}')
+        if mode not in (MODE_SINGLE, MODE_CONTINUOUS):
+            raise ValueError(f'Unknown mode: {mode}, expected one of: {MODE_SINGLE}, {MODE_CONTINUOUS}')
+        if data_rate not in ADS1115_DATA_RATES:
+            raise ValueError(f'Data rate must be one of: {list(ADS1115_DATA_RATES)}')
+        if mode == MODE_CONTINUOUS and len(channels) != 1:
+            raise ValueError('Continuous mode converts a single channel.')
+        if alert_pin is not None and mode != MODE_CONTINUOUS:
+            raise ValueError('The ALERT/RDY pin is only used in continuous mode.')
+        if engine not in (ENGINE_ADAFRUIT, ENGINE_RAW):
+            raise ValueError(f'Unknown engine: {engine}, expected one of: {ENGINE_ADAFRUIT}, {ENGINE_RAW}')
+        if batch < 1:
+            raise ValueError(f'Batch must be at least 1, got: {batch}')
+        if batch > 1 and alert_pin is not None:
+            raise ValueError('Every read waits for its own conversion with the ALERT/RDY pin, so it cannot be batched.')
+        if requests > 0 and frequency <= 0:
+            raise ValueError(f'Frequency must be longer than 0 seconds, got: {frequency}')
+        if window is not None and window <= 0:
+            raise ValueError(f'Window must be longer than 0 seconds, got: {window}')
         self.payload = None
         self.requests_filled = 0
         self.start_time = None
         self.end_time = None
         self._thread = None
         self._stop_event = threading.Event()
+        self._batch_locked = False
         self._hardware_initialized = False
-        if busio is None or board is None or ADS is None or AnalogIn is None:
+        self.gain = gain
+        self.mode = mode
+        self.data_rate = data_rate
+        self.alert_pin = alert_pin
+        self.engine = engine
+        self.batch = batch
+        self.reads = 0
+        self.errors = 0
+        self.ready_timeouts = 0
+        self.last_error = None
+        self.retry = retry or RetryPolicy()
+        self.faults = FaultCounters(self.retry)
+        if requests > 0 and alert_pin is None:
+            self.scheduler = PacedScheduler(requests, frequency)
+        elif mode == MODE_CONTINUOUS and alert_pin is None:
+            self.scheduler = PacedScheduler(data_rate, 1)
+        else:
+            self.scheduler = None
+        self.latency = LatencyHistogram()
+        if window is None:
+            window = self.scheduler.frequency if self.scheduler is not None else 1.0
+        self.windows = WindowedThroughput(window, self.get_configured_rate() * window)
+        self.channels = list(channels)
+        self.channel_stats = {channel: ReadStats() for channel in self.channels}
+        self.mux_switches = 0
+        self.switch_stats = ReadStats()
+        self._last_channel = None
+        self._schedule = [channel for channel in self.channels for _ in range(burst)]
+        self._position = 0
+        self._listeners = []
+        self._snapshot = None
+        self._publish(time.monotonic())
+        self.address = address
+        self.backend = backend or get_backend()
+        if not self.backend.is_available():
             return
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._adc = ADS.ADS1115(i2c)
-        self._channel = AnalogIn(self._adc, ADS.P0)
+        self._bus = bus_manager.get_bus(self.backend)
+        self._adc = self._bus.get_device(
+            ('ads1115', self.address), lambda: self.backend.create_adc(self._bus, address=self.address)
+        )
         self._adc.gain = gain
+        self._adc.data_rate = data_rate
+        self._continuous = None
+        self._alert = None
+        self._raw = None
+        if engine == ENGINE_RAW:
+            self._raw = self._bus.get_device(('ads1115', self.address, 'raw'), lambda: RawADS1115(self._bus, self.address))
+            self._raw.set_channels(self.channels, gain, data_rate)
+        if mode == MODE_CONTINUOUS:
+            self._continuous = self._bus.get_device(
+                ('ads1115', self.address, 'continuous'), lambda: ADS1115Continuous(self._bus, self.address)
+            )
+        if alert_pin is not None:
+            self._alert = self._bus.get_device(
+                ('ads1115', self.address, 'alert', alert_pin),
+                lambda: self.backend.create_alert_pin(self._bus, alert_pin, self.address)
+            )
+        self._channels = {
+            channel: self._bus.get_device(
+                ('ads1115', self.address, channel),
+                lambda channel=channel: self.backend.create_channel(self._adc, channel)
+            )
+            for channel in self.channels
+        }
         self._hardware_initialized = True
+        if autostart:
+            self.start()
+
+    def start(self):
+        ''' Start the ADC reading thread. '''
+        if not self._hardware_initialized or self._thread is not None:
+            return
         self._thread = threading.Thread(target=self._read_adc_continuous)
         self._thread.start()
 
+    def add_sample_listener(self, listener):
+        '''
+        Call a listener from the reading thread after every read with the monotonic
+        timestamp, the payload, the latency in seconds, the error code and the channel.
+        '''
+        self._listeners.append(listener)
+
     def _read_adc_continuous(self):
-        ''' Continuously read ADC until stop event is set. '''
-        self.start_time = time.time()
+        ''' Continuously read ADC until stop event is set, paced by the scheduler if one is set. '''
+        self.start_time = time.monotonic()
         self.requests_filled = 0
-        while not self._stop_event.is_set():
-            self.read_adc()
-            self.requests_filled += 1
-            self.end_time = time.time()
-
-    def read_adc(self) -> str:
-        ''' Send request to ADC. '''
-        if not self._hardware_initialized:
+        try:
+            if self._continuous is not None:
+                self._continuous.start(self.channels[0], self.gain, self.data_rate, ready=self._alert is not None)
+                if self._raw is not None:
+                    self._raw.point_at_conversion()
+                # Start the slots half a conversion after the first one lands, so timed reads sit between conversions.
+                if self._stop_event.wait(1.5 / self.data_rate):
+                    return
+            if self.scheduler is not None:
+                self.scheduler.start()
+                self.windows.start(self.scheduler.start_time)
+            else:
+                self.windows.start(time.monotonic())
+            next_snapshot = time.monotonic()
+            while not self._stop_event.is_set():
+                if self.scheduler is not None and not self.scheduler.wait_next(self._stop_event):
+                    break
+                # Reads are accounted to the window they were issued in, not the one they completed in.
+                issued = time.monotonic()
+                succeeded = self.reads - self.errors
+                if self._alert is not None and not self._alert.wait(2 / self.data_rate):
+                    self.payload = None
+                    self.ready_timeouts += 1
+                    self.faults.record_failure()
+                elif self.batch > 1:
+                    with self._bus:
+                        self._batch_locked = True
+                        try:
+                            for _ in range(self.batch):
+                                self.read_adc()
+                        finally:
+                            self._batch_locked = False
+                    self.requests_filled += 1
+                else:
+                    self.read_adc()
+                    self.requests_filled += 1
+                self.windows.record(issued, self.reads - self.errors - succeeded)
+                now = time.monotonic()
+                self.end_time = now
+                if now >= next_snapshot:
+                    self._publish(now)
+                    next_snapshot = now + self.SNAPSHOT_INTERVAL
+        except IOError as error:
+            # Only starting the conversions gets here, read_adc handles its own faults, so the run cannot go on.
             self.payload = None
+            fault_class = classify(error)
+            self.faults.record_abort(fault_class)
+            self.last_error = f'{fault_class}: {error}'
+        finally:
+            if self._continuous is not None:
+                try:
+                    self._continuous.stop()
+                except IOError:
+                    pass
+            self._publish(time.monotonic())
+
+    def _publish(self, now):
+        ''' Publish a snapshot of the run, replacing the previous one in a single assignment. '''
+        duration = now - self.start_time if self.start_time is not None else 0.0
+        self.windows.advance(now)
+        self._snapshot = ADCSnapshot(
+            timestamp=now,
+            requests_filled=self.requests_filled,
+            reads=self.reads,
+            errors=self.errors,
+            missed_requests=self.get_missed_requests(),
+            ready_timeouts=self.ready_timeouts,
+            payload=self.payload,
+            duration=duration,
+            max_lateness=self.get_max_lateness(),
+            achieved_rate=self.reads / duration if duration > 0 else 0.0,
+            configured_rate=self.get_configured_rate(),
+            latency=self.latency.copy(),
+            windows=self.windows.summary(),
+            faults=self.faults.summary()
+        )
+
+    def get_snapshot(self) -> ADCSnapshot:
+        ''' Get the latest snapshot published by the reading thread. '''
+        return self._snapshot
+
+    def _read(self, channel) -> int:
+        ''' Read a channel once with the selected engine and mode. '''
+        if self._raw is not None:
+            return self._raw.read_conversion() if self._continuous is not None else self._raw.read_single(channel)
+        if self._continuous is not None:
+            return self._continuous.read()
+        return self._channels[channel].value
+
+    def _recover(self):
+        ''' Recover the bus, restarting continuous conversions in case the ADS1115 was reset with it. '''
+        self.faults.record_recovery()
         try:
-            self.payload = self._channel.value
-        except IOError:
+            self._bus.recover()
+            if self._continuous is not None:
+                self._continuous.start(self.channels[0], self.gain, self.data_rate, ready=self._alert is not None)
+                if self._raw is not None:
+                    self._raw.point_at_conversion()
+        except IOError as error:
+            self.faults.record_fault(classify(error))
+
+    def _backoff(self, retry):
+        ''' Wait before a retry, letting go of the bus lock of a batch for the wait. '''
+        if not self._batch_locked:
+            self._stop_event.wait(self.retry.delay(retry))
+            return
+        self._bus.unlock()
+        try:
+            self._stop_event.wait(self.retry.delay(retry))
+        finally:
+            self._bus.try_lock()
+
+    def read_adc(self):
+        ''' Send request to ADC, retrying a failed read under the retry policy. '''
+        if not self._hardware_initialized:
             self.payload = None
+            return
+        channel = self._schedule[self._position]
+        self._position = (self._position + 1) % len(self._schedule)
+        switched = channel != self._last_channel and self._last_channel is not None
+        self._last_channel = channel
+        error = ERROR_NONE
+        retry = 0
+        started = time.perf_counter_ns()
+        while True:
+            try:
+                self.payload = self._read(channel)
+                self.faults.record_success(retry > 0)
+                break
+            except IOError as fault:
+                fault_class = classify(fault)
+                self.faults.record_fault(fault_class)
+                if retry >= self.retry.retries or self._stop_event.is_set():
+                    self.payload = None
+                    self.errors += 1
+                    error = FAULT_ERRORS[fault_class]
+                    self.faults.record_failure()
+                    break
+                retry += 1
+                self.faults.record_retry()
+                self._backoff(retry)
+        elapsed = time.perf_counter_ns() - started
+        self.reads += 1
+        self.latency.record_ns(elapsed)
+        self.channel_stats[channel].record(elapsed, error)
+        if switched:
+            self.mux_switches += 1
+            self.switch_stats.record(elapsed, error)
+        if self._listeners:
+            timestamp = time.monotonic()
+            for listener in self._listeners:
+                listener(timestamp, self.payload, elapsed / 1_000_000_000, error, channel)
+        if error != ERROR_NONE and self.faults.should_recover():
+            self._recover()
+
+    def is_initialized(self) -> bool:
+        ''' Check if the ADC hardware was initialized. '''
+        return self._hardware_initialized
 
     def get_requests_filled(self) -> int:
         ''' Get the amount of requests filled. '''
         return self.requests_filled
- 
-    def get_payload(self) -> str:
-        ''' Get the payload from the ADC. '''
-        return str(self.payload)
+
+    def get_missed_requests(self) -> int:
+        ''' Get the amount of requests whose deadline passed before they were issued. '''
+        if self.scheduler is None:
+            return 0
+        return self.scheduler.get_missed()
+
+    def get_max_lateness(self) -> float:
+        ''' Get the largest delay between a request's release and its issue in seconds. '''
+        if self.scheduler is None:
+            return 0.0
+        return self.scheduler.max_lateness
+
+    def get_latency_percentiles(self) -> dict:
+        ''' Get the p50, p90, p99, p99.9 and max read latencies in milliseconds. '''
+        return self.latency.summary()
+
+    def get_configured_rate(self) -> float:
+        '''
+        Get the rate the ADC was asked to read at in reads per second, one read per conversion
+        in continuous mode, or 0 when single-shot reads are not paced.
+        '''
+        if self.scheduler is not None:
+            return self.scheduler.requests / self.scheduler.frequency * self.batch
+        if self.mode == MODE_CONTINUOUS:
+            return float(self.data_rate)
+        return 0.0
+
+    def get_reads(self) -> int:
+        ''' Get the amount of reads, every filled request is batch reads. '''
+        return self.reads
+
+    def get_achieved_rate(self) -> float:
+        ''' Get the rate the ADC has actually read at in reads per second. '''
+        if self.start_time is None:
+            return 0.0
+        elapsed = (self.end_time if self._stop_event.is_set() else time.monotonic()) - self.start_time
+        return self.reads / elapsed if elapsed > 0 else 0.0
+
+    def get_ready_timeouts(self) -> int:
+        ''' Get the amount of conversions the ALERT/RDY pin did not signal in time. '''
+        return self.ready_timeouts
+
+    def get_mux_switches(self) -> int:
+        ''' Get the amount of reads that had to switch the MUX to another channel first. '''
+        return self.mux_switches
+
+    def get_channel_report(self) -> dict:
+        '''
+        Get the throughput, error rate and latency percentiles of every swept channel,
+        and of the reads that had to switch the MUX first under 'switch'.
+        '''
+        duration = self.get_duration()
+        report = {channel: stats.report(duration) for channel, stats in self.channel_stats.items()}
+        if self.mux_switches:
+            report['switch'] = self.switch_stats.report(duration)
+        return report
+
+    def get_payload(self) -> int:
+        ''' Get the last payload from the ADC, None if the last read failed. '''
+        return self.payload
+
+    def get_faults(self) -> FaultSummary:
+        ''' Get the fault counts of every class, the retries, the recoveries and whether the bus failed. '''
+        return self.faults.summary()
 
     def stop(self):
         ''' Stop the ADC reading thread. '''
         self._stop_event.set()
-        self.end_time = time.time()
+        self.end_time = time.monotonic()
         if self._thread is not None:
             self._thread.join()
 
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            ADC Process
+====================================
+--------------
+Usage Example:
+--------------
+
+from adc_process import ADCProcess
+
+# Read the ADC 100 times a second in a worker process pinned to CPU 3.
+adc = ADCProcess(requests=100, frequency=1, cpus=[3], nice=-10)
+snapshot = adc.get_snapshot()
+adc.stop()
+'''
+
+from array import array
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .adc_config import ADCSnapshot, LatencyHistogram, WindowSummary
+from .bus_backend import ADS1115_CHANNELS, get_backend
+from .bus_faults import FaultSummary
+from .sample_recorder import CHANNEL_CODES, MISSING_VALUE, RECORD
+
+
+# States the worker reports and commands the parent sends through the control block.
+STATE_STARTING = 0
+STATE_READY = 1
+STATE_UNAVAILABLE = 2
+STATE_DONE = 3
+COMMAND_NONE = 0
+COMMAND_START = 1
+COMMAND_STOP = 2
+
+# The worker only writes the state and the parent only writes the command.
+CONTROL = struct.Struct('<I')
+STATE_OFFSET = 0
+COMMAND_OFFSET = CONTROL.size
+SEQUENCE = struct.Struct('<Q')
+SNAPSHOT = struct.Struct('<dqqqqqqddddQQddqqqqqddqqqqqqqqqqq?')
+COUNTER = struct.Struct('<Q')
+REPORT_LENGTH = struct.Struct('<I')
+REPORT_SIZE = 65536
+
+COUNTS_SIZE = len(LatencyHistogram().counts) * 8
+SNAPSHOT_OFFSET = 2 * CONTROL.size
+FIELDS_OFFSET = SNAPSHOT_OFFSET + SEQUENCE.size
+COUNTS_OFFSET = FIELDS_OFFSET + SNAPSHOT.size
+REPORT_OFFSET = COUNTS_OFFSET + COUNTS_SIZE
+RING_OFFSET = REPORT_OFFSET + REPORT_LENGTH.size + REPORT_SIZE
+
+# A worker keeps the snapshot sequence odd for microseconds, one keeping it odd this long in seconds died mid-write.
+SNAPSHOT_TIMEOUT = 0.5
+
+
+class SampleRing:
+    '''
+    This class is a single-writer ring buffer of samples in shared memory.
+
+    The worker packs every sample into the next slot and then bumps the write
+    counter. The reader copies everything written since it last looked, and any
+    sample the writer lapped before it was copied is counted as dropped instead
+    of being read torn. The writer may already be packing the sample after the
+    counter, so the oldest slot counts as lapped as soon as the ring is full.
+    '''
+
+    def __init__(self, buffer, offset, capacity):
+        self.buffer = buffer
+        self.offset = offset
+        self.capacity = capacity
+        self.written = 0
+
+    @staticmethod
+    def size(capacity) -> int:
+        ''' Get the bytes a ring of a capacity takes. '''
+        return COUNTER.size + capacity * RECORD.size
+
+    def record(self, timestamp, value, latency, error, channel='P0'):
+        ''' Append a sample, this matches the ADC sample listener signature. '''
+        slot = self.offset + COUNTER.size + self.written % self.capacity * RECORD.size
+        RECORD.pack_into(
+            self.buffer, slot, timestamp, latency, MISSING_VALUE if value is None else value, error, CHANNEL_CODES[channel]
+        )
+        self.written += 1
+        COUNTER.pack_into(self.buffer, self.offset, self.written)
+
+    def drain(self, position, listener) -> tuple:
+        ''' Pass every sample written since a position to a listener, returning the new position and the dropped count. '''
+        written = COUNTER.unpack_from(self.buffer, self.offset)[0]
+        dropped = max(written - position - self.capacity, 0)
+        position += dropped
+        if position == written:
+            return position, dropped
+        start = position % self.capacity
+        end = start + written - position
+        base = self.offset + COUNTER.size
+        if end <= self.capacity:
+            data = self.buffer[base + start * RECORD.size:base + end * RECORD.size]
+        else:
+            data = (self.buffer[base + start * RECORD.size:base + self.capacity * RECORD.size] +
+                    self.buffer[base:base + (end - self.capacity) * RECORD.size])
+        # Anything the writer reached again while it was being copied may be torn, including
+        # the slot of the sample after the counter, which it may be packing right now.
+        lapped = max(COUNTER.unpack_from(self.buffer, self.offset)[0] + 1 - self.capacity - position, 0)
+        dropped += lapped
+        for index, (timestamp, latency, value, error, channel) in enumerate(RECORD.iter_unpack(data)):
+            if index >= lapped:
+                listener(timestamp, None if value == MISSING_VALUE else value, latency, error, ADS1115_CHANNELS[channel])
+        return written, dropped
+
+
+def publish_snapshot(buffer, snapshot):
+    ''' Write a snapshot into shared memory under a seqlock, the sequence is odd while it is being written. '''
+    sequence = SEQUENCE.unpack_from(buffer, SNAPSHOT_OFFSET)[0] + 1
+    SEQUENCE.pack_into(buffer, SNAPSHOT_OFFSET, sequence)
+    SNAPSHOT.pack_into(
+        buffer, FIELDS_OFFSET, snapshot.timestamp, snapshot.requests_filled, snapshot.reads, snapshot.errors,
+        snapshot.missed_requests, snapshot.ready_timeouts,
+        MISSING_VALUE if snapshot.payload is None else snapshot.payload, snapshot.duration, snapshot.max_lateness,
+        snapshot.achieved_rate, snapshot.configured_rate, snapshot.latency.total, snapshot.latency.max_value,
+        *snapshot.windows._replace(worst_reads=-1 if snapshot.windows.worst_reads is None else snapshot.windows.worst_reads),
+        *snapshot.faults
+    )
+    buffer[COUNTS_OFFSET:COUNTS_OFFSET + COUNTS_SIZE] = memoryview(snapshot.latency.counts).cast('B')
+    SEQUENCE.pack_into(buffer, SNAPSHOT_OFFSET, sequence + 1)
+
+
+def read_snapshot(buffer, last_sequence=None, timeout=SNAPSHOT_TIMEOUT):
+    '''
+    Read a consistent snapshot from shared memory, or None if it has not changed since last_sequence
+    or the worker left it half written for longer than timeout seconds.
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        sequence = SEQUENCE.unpack_from(buffer, SNAPSHOT_OFFSET)[0]
+        if sequence & 1:
+            if time.monotonic() >= deadline:
+                return last_sequence, None
+            time.sleep(0)
+            continue
+        if sequence == last_sequence:
+            return sequence, None
+        fields = SNAPSHOT.unpack_from(buffer, FIELDS_OFFSET)
+        counts = array('Q')
+        counts.frombytes(buffer[COUNTS_OFFSET:COUNTS_OFFSET + COUNTS_SIZE])
+        if SEQUENCE.unpack_from(buffer, SNAPSHOT_OFFSET)[0] == sequence:
+            break
+    (timestamp, requests_filled, reads, errors, missed_requests, ready_timeouts, payload, duration,
+     max_lateness, achieved_rate, configured_rate, total, max_value) = fields[:13]
+    windows = WindowSummary(*fields[13:22])
+    faults = FaultSummary(*fields[22:])
+    latency = LatencyHistogram()
+    latency.counts = counts
+    latency.total = total
+    latency.max_value = max_value
+    return sequence, ADCSnapshot(
+        timestamp=timestamp,
+        requests_filled=requests_filled,
+        reads=reads,
+        errors=errors,
+        missed_requests=missed_requests,
+        ready_timeouts=ready_timeouts,
+        payload=None if payload == MISSING_VALUE else payload,
+        duration=duration,
+        max_lateness=max_lateness,
+        achieved_rate=achieved_rate,
+        configured_rate=configured_rate,
+        latency=latency,
+        windows=windows._replace(worst_reads=None if windows.worst_reads < 0 else windows.worst_reads),
+        faults=faults
+    )
+
+
+class ADCProcess:
+    '''
+    This class runs an ADC in a dedicated worker process.
+
+    The worker has its own interpreter, so neither the UI nor anything else in
+    this process can hold the GIL while a read is being timed. It can be pinned
+    to CPUs and given a nice value or a SCHED_FIFO priority. Snapshots come back
+    through a seqlock in shared memory and samples through a ring buffer, which
+    a thread drains into the sample listeners. Options not listed here are
+    passed on to ADC in the worker. Only the ADC runs in the worker, the MCP
+    sequencer stays in this process as its deadlines are milliseconds apart.
+    '''
+
+    POLL_INTERVAL = 0.02
+    START_TIMEOUT = 30
+
+    def __init__(self, gain=1, requests=0, frequency=1, backend=None, autostart=True, cpus=None, nice=None,
+                 realtime_priority=None, ring_size=65536, **options):
+        self.backend = backend or get_backend()
+        self.channels = list(options.get('channels', ('P0',)))
+        self.dropped_samples = 0
+        self.last_error = None
+        self.start_time = None
+        self.end_time = None
+        self._report = {}
+        self._listeners = []
+        self._position = 0
+        self._sequence = None
+        self._snapshot = None
+        self._drain_thread = None
+        self._stop_event = threading.Event()
+        size = RING_OFFSET + SampleRing.size(ring_size)
+        descriptor, self.path = tempfile.mkstemp(
+            prefix='i2c-stress-adc-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None
+        )
+        os.ftruncate(descriptor, size)
+        self._buffer = mmap.mmap(descriptor, size)
+        os.close(descriptor)
+        self._ring = SampleRing(self._buffer, RING_OFFSET, ring_size)
+        config = {
+            'backend': self.backend.name,
+            'profile': vars(self.backend.profile) if hasattr(self.backend, 'profile') else None,
+            'frequency': self.backend.frequency,
+            'adc': dict(options, gain=gain, requests=requests, frequency=frequency, retry=None),
+            'retry': vars(options['retry']) if options.get('retry') is not None else None,
+            'cpus': list(cpus) if cpus else None,
+            'nice': nice,
+            'realtime_priority': realtime_priority,
+            'ring_size': ring_size
+        }
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'utility.adc_worker', self.path, json.dumps(config)], cwd=root
+        )
+        try:
+            self._hardware_initialized = self._wait_state() == STATE_READY
+        finally:
+            # Both sides have the file mapped now, or the worker is gone, so nothing is left behind in /dev/shm.
+            os.unlink(self.path)
+        self._sequence, self._snapshot = read_snapshot(self._buffer)
+        if self._hardware_initialized and autostart:
+            self.start()
+
+    def _wait_state(self) -> int:
+        ''' Wait until the worker is ready or has found no hardware. '''
+        deadline = time.monotonic() + self.START_TIMEOUT
+        while time.monotonic() < deadline:
+            state = CONTROL.unpack_from(self._buffer, STATE_OFFSET)[0]
+            if state != STATE_STARTING:
+                return state
+            if self._process.poll() is not None:
+                raise RuntimeError(f'The ADC worker process exited with status {self._process.returncode}.')
+            time.sleep(self.POLL_INTERVAL)
+        self._process.kill()
+        raise RuntimeError('The ADC worker process did not start in time.')
+
+    def _command(self, command):
+        ''' Send a command to the worker. '''
+        CONTROL.pack_into(self._buffer, COMMAND_OFFSET, command)
+
+    def start(self):
+        ''' Start the reads in the worker and the thread draining its samples. '''
+        if not self._hardware_initialized or self._drain_thread is not None:
+            return
+        self.start_time = time.monotonic()
+        self._command(COMMAND_START)
+        self._drain_thread = threading.Thread(target=self._drain_continuous, daemon=True)
+        self._drain_thread.start()
+
+    def add_sample_listener(self, listener):
+        ''' Call a listener from the drain thread for every sample read by the worker. '''
+        self._listeners.append(listener)
+
+    def _call_listeners(self, *sample):
+        ''' Pass a sample to every listener. '''
+        for listener in self._listeners:
+            listener(*sample)
+
+    def _drain(self):
+        ''' Pass the samples written since the last drain to the listeners. '''
+        self._position, dropped = self._ring.drain(self._position, self._call_listeners)
+        self.dropped_samples += dropped
+
+    def _drain_continuous(self):
+        ''' Drain the sample ring until the worker is stopped. '''
+        while not self._stop_event.wait(self.POLL_INTERVAL):
+            self._drain()
+
+    def is_initialized(self) -> bool:
+        ''' Check if the worker initialized the ADC hardware. '''
+        return self._hardware_initialized
+
+    def get_snapshot(self) -> ADCSnapshot:
+        ''' Get the latest snapshot published by the worker, the same object until a newer one is published. '''
+        if self._buffer.closed:
+            return self._snapshot
+        sequence, snapshot = read_snapshot(self._buffer, self._sequence)
+        if snapshot is not None:
+            self._sequence, self._snapshot = sequence, snapshot
+        return self._snapshot
+
+    def get_dropped_samples(self) -> int:
+        ''' Get the amount of samples the listeners missed because the ring buffer overflowed. '''
+        return self.dropped_samples
+
+    def get_channel_report(self) -> dict:
+        ''' Get the per-channel report the worker sent when it stopped. '''
+        return self._report.get('channels', {})
+
+    def get_mux_switches(self) -> int:
+        ''' Get the amount of MUX switches the worker counted when it stopped. '''
+        return self._report.get('mux_switches', 0)
+
+    def stop(self):
+        ''' Stop the worker, wait for its final snapshot and drain the last samples. '''
+        if self._buffer.closed:
+            return
+        self.end_time = time.monotonic()
+        self._command(COMMAND_STOP)
+        try:
+            self._process.wait(self.START_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._stop_event.set()
+        if self._drain_thread is not None:
+            self._drain_thread.join()
+        self._drain()
+        self.get_snapshot()
+        if CONTROL.unpack_from(self._buffer, STATE_OFFSET)[0] == STATE_DONE:
+            length = REPORT_LENGTH.unpack_from(self._buffer, REPORT_OFFSET)[0]
+            start = REPORT_OFFSET + REPORT_LENGTH.size
+            self._report = json.loads(self._buffer[start:start + length])
+            self.last_error = self._report.get('last_error')
+        self._buffer.close()
+
+    def get_duration(self) -> float:
+        ''' Get the duration of the ADC test. '''
+        return self._snapshot.duration
+
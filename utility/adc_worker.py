@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            ADC Worker
+====================================
+--------------
+Usage Example:
+--------------
+
+# Started by ADCProcess, not by hand. It attaches to the shared memory file,
+# runs the ADC and publishes its snapshots and samples until told to stop.
+python3 -m utility.adc_worker /dev/shm/i2c-stress-adc-XXXX '{"backend": "hardware", ...}'
+'''
+
+import json
+import mmap
+import os
+import sys
+import time
+
+from .adc_config import ADC
+from .adc_process import (
+    COMMAND_NONE, COMMAND_OFFSET, COMMAND_START, COMMAND_STOP, CONTROL, REPORT_LENGTH, REPORT_OFFSET, REPORT_SIZE,
+    RING_OFFSET, STATE_DONE, STATE_OFFSET, STATE_READY, STATE_UNAVAILABLE, ADCProcess, SampleRing, publish_snapshot
+)
+from .bus_backend import BusProfile, get_backend
+from .bus_faults import RetryPolicy
+
+
+def apply_scheduling(cpus=None, nice=None, realtime_priority=None):
+    ''' Pin the current process to CPUs and raise its priority, printing what could not be applied. '''
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except (AttributeError, OSError) as error:
+            print(f'Could not pin the ADC worker to CPUs {cpus}: {error}', file=sys.stderr)
+    if realtime_priority:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+        except (AttributeError, OSError) as error:
+            print(f'Could not give the ADC worker SCHED_FIFO priority {realtime_priority}: {error}', file=sys.stderr)
+    elif nice is not None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        except (AttributeError, OSError) as error:
+            print(f'Could not set the ADC worker nice value to {nice}: {error}', file=sys.stderr)
+
+
+def get_command(buffer) -> int:
+    ''' Get the last command sent by the parent. '''
+    return CONTROL.unpack_from(buffer, COMMAND_OFFSET)[0]
+
+
+def run(buffer, config, parent):
+    ''' Run the ADC until the parent stops it or exits, publishing its snapshots into shared memory. '''
+    apply_scheduling(config['cpus'], config['nice'], config['realtime_priority'])
+    options = {}
+    if config['profile'] is not None:
+        options['profile'] = BusProfile(**config['profile'])
+    if config['frequency'] is not None:
+        options['frequency'] = config['frequency']
+    backend = get_backend(config['backend'], **options)
+    if config['retry'] is not None:
+        config['adc']['retry'] = RetryPolicy(**config['retry'])
+    adc = ADC(backend=backend, autostart=False, **config['adc'])
+    publish_snapshot(buffer, adc.get_snapshot())
+    if not adc.is_initialized():
+        CONTROL.pack_into(buffer, STATE_OFFSET, STATE_UNAVAILABLE)
+        return
+    adc.add_sample_listener(SampleRing(buffer, RING_OFFSET, config['ring_size']).record)
+    CONTROL.pack_into(buffer, STATE_OFFSET, STATE_READY)
+    while get_command(buffer) == COMMAND_NONE and os.getppid() == parent:
+        time.sleep(ADCProcess.POLL_INTERVAL)
+    if get_command(buffer) == COMMAND_START:
+        adc.start()
+        published = None
+        while get_command(buffer) != COMMAND_STOP and os.getppid() == parent:
+            time.sleep(ADC.SNAPSHOT_INTERVAL)
+            snapshot = adc.get_snapshot()
+            if snapshot is not published:
+                publish_snapshot(buffer, snapshot)
+                published = snapshot
+    adc.stop()
+    publish_snapshot(buffer, adc.get_snapshot())
+    report = json.dumps({
+        'channels': adc.get_channel_report(), 'mux_switches': adc.get_mux_switches(), 'last_error': adc.last_error
+    }).encode()
+    if len(report) <= REPORT_SIZE:
+        start = REPORT_OFFSET + REPORT_LENGTH.size
+        REPORT_LENGTH.pack_into(buffer, REPORT_OFFSET, len(report))
+        buffer[start:start + len(report)] = report
+    CONTROL.pack_into(buffer, STATE_OFFSET, STATE_DONE)
+
+
+def main(argv=None) -> int:
+    ''' Attach to the shared memory file of an ADCProcess and run its ADC. '''
+    path, config = argv or sys.argv[1:]
+    with open(path, 'r+b') as file:
+        buffer = mmap.mmap(file.fileno(), 0)
+    try:
+        run(buffer, json.loads(config), os.getppid())
+    finally:
+        buffer.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
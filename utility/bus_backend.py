@@ -0,0 +1,1015 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            Bus Backend
+====================================
+--------------
+Usage Example:
+--------------
+
+from bus_backend import get_backend
+
+# Use the real I2C bus, or set I2C_STRESS_BACKEND=simulated to use the
+# in-process ADS1115 and MCP23017 simulation.
+backend = get_backend()
+bus = backend.create_bus()
+adc = backend.create_adc(bus, gain=1)
+'''
+
+import errno
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import board
+    import busio
+except (ImportError, NotImplementedError):
+    board = None
+    busio = None
+
+try:
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+except (ImportError, NotImplementedError):
+    ADS = None
+    AnalogIn = None
+
+try:
+    from adafruit_mcp230xx.mcp23017 import MCP23017
+    from digitalio import Direction
+except (ImportError, NotImplementedError):
+    MCP23017 = None
+
+    class Direction:
+        ''' Stand-in for digitalio.Direction when digitalio is not available. '''
+        INPUT = 'INPUT'
+        OUTPUT = 'OUTPUT'
+
+try:
+    import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):
+    GPIO = None
+
+
+ADS1115_ADDRESS = 0x48
+MCP23017_ADDRESS = 0x20
+# Addresses each device can be strapped to, the ADS1115 through ADDR and the MCP23017 through A0-A2.
+ADS1115_ADDRESSES = tuple(range(0x48, 0x4C))
+MCP23017_ADDRESSES = tuple(range(0x20, 0x28))
+
+# ADS1115 registers and configuration bits.
+ADS1115_CONVERSION = 0x00
+ADS1115_CONFIG = 0x01
+ADS1115_LO_THRESH = 0x02
+ADS1115_HI_THRESH = 0x03
+ADS1115_OS = 0x8000
+ADS1115_MODE_SINGLE = 0x0100
+ADS1115_MODE_CONTINUOUS = 0x0000
+ADS1115_COMP_QUE_ONE = 0x0000
+ADS1115_COMP_QUE_DISABLE = 0x0003
+ADS1115_GAINS = {2/3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+ADS1115_DATA_RATES = {8: 0x0000, 16: 0x0020, 32: 0x0040, 64: 0x0060, 128: 0x0080, 250: 0x00A0, 475: 0x00C0, 860: 0x00E0}
+ADS1115_FULL_SCALE = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+# Channels in the order of their MUX setting, the differential pairs come first.
+ADS1115_CHANNELS = ('P0-P1', 'P0-P3', 'P1-P3', 'P2-P3', 'P0', 'P1', 'P2', 'P3')
+
+# Standard and fast mode are supported by every device on the bus, fast mode plus by the ADS1115 and MCP23017.
+BUS_FREQUENCIES = (100_000, 400_000, 1_000_000)
+DEFAULT_BUS_FREQUENCY = 100_000
+# On Linux the clock of the Raspberry Pi bus is set by the kernel from the device tree, not by busio.
+LINUX_I2C_CLOCK = '/sys/class/i2c-adapter/i2c-1/of_node/clock-frequency'
+
+# MCP23017 registers with IOCON.BANK = 0, port B is always port A + 1.
+MCP23017_IODIRA = 0x00
+MCP23017_GPINTENA = 0x04
+MCP23017_DEFVALA = 0x06
+MCP23017_INTCONA = 0x08
+MCP23017_IOCON = 0x0A
+MCP23017_INTFA = 0x0E
+MCP23017_INTCAPA = 0x10
+MCP23017_GPIOA = 0x12
+MCP23017_OLATA = 0x14
+MCP23017_REGISTER_COUNT = 0x16
+# IOCON.MIRROR ties INTA and INTB together, so one GPIO sees the interrupts of both ports.
+MCP23017_IOCON_MIRROR = 0x40
+
+
+# Longest sleep between attempts to lock a bus held by another thread.
+LOCK_MAX_BACKOFF = 0.001
+
+
+def lock_bus(bus):
+    ''' Wait until a busio-style bus is locked, yielding to the holder instead of spinning on the GIL. '''
+    delay = 0
+    while not bus.try_lock():
+        time.sleep(delay)
+        delay = min(delay * 2 or 0.00001, LOCK_MAX_BACKOFF)
+
+
+class RegisterDevice:
+    '''
+    This class reads and writes the registers of a device on a busio-style I2C bus.
+
+    It follows the same locking protocol as adafruit_bus_device, so it can share
+    a bus with the Adafruit drivers.
+    '''
+
+    def __init__(self, bus, address):
+        self.bus = bus
+        self.address = address
+
+    def _lock(self):
+        ''' Wait until the bus is locked. '''
+        lock_bus(self.bus)
+
+    def write(self, register, data=b''):
+        ''' Write data starting at a register. '''
+        self._lock()
+        try:
+            self.bus.writeto(self.address, bytes([register]) + bytes(data))
+        finally:
+            self.bus.unlock()
+
+    def read_into(self, register, buffer):
+        ''' Read registers into a buffer starting at a register. '''
+        self._lock()
+        try:
+            self.bus.writeto_then_readfrom(self.address, bytes([register]), buffer)
+        finally:
+            self.bus.unlock()
+
+    def read(self, register, count) -> bytearray:
+        ''' Read a number of bytes starting at a register. '''
+        buffer = bytearray(count)
+        self.read_into(register, buffer)
+        return buffer
+
+
+class ADS1115Continuous:
+    '''
+    This class runs an ADS1115 in continuous-conversion mode and reads only its conversion register.
+
+    The config register is written once when conversions start, so every read
+    after that is a single register read instead of the config write, wait and
+    read of a single-shot conversion. With ready set, the comparator is turned
+    into a conversion-ready signal and ALERT/RDY pulses low after every conversion.
+    '''
+
+    def __init__(self, bus, address=ADS1115_ADDRESS):
+        self.device = RegisterDevice(bus, address)
+        self.config = None
+
+    def start(self, channel='P0', gain=1, data_rate=860, ready=False):
+        ''' Start converting a channel continuously. '''
+        if ready:
+            # A high threshold with the MSB set and a low threshold with it clear selects conversion-ready mode.
+            self.device.write(ADS1115_LO_THRESH, b'\x00\x00')
+            self.device.write(ADS1115_HI_THRESH, b'\x80\x00')
+        config = ADS1115_CHANNELS.index(channel) << 12
+        config |= ADS1115_GAINS[gain]
+        config |= ADS1115_MODE_CONTINUOUS
+        config |= ADS1115_DATA_RATES[data_rate]
+        config |= ADS1115_COMP_QUE_ONE if ready else ADS1115_COMP_QUE_DISABLE
+        self.device.write(ADS1115_CONFIG, config.to_bytes(2, 'big'))
+        self.config = config
+
+    def read(self) -> int:
+        ''' Read the latest conversion as a signed value. '''
+        return int.from_bytes(self.device.read(ADS1115_CONVERSION, 2), 'big', signed=True)
+
+    def stop(self):
+        ''' Return to single-shot mode, which powers the converter down between conversions. '''
+        if self.config is None:
+            return
+        config = self.config & ~0x0003 | ADS1115_MODE_SINGLE | ADS1115_COMP_QUE_DISABLE
+        self.device.write(ADS1115_CONFIG, config.to_bytes(2, 'big'))
+        self.config = None
+
+
+class RawADS1115:
+    '''
+    This class reads an ADS1115 with raw bus transactions into preallocated buffers.
+
+    The config of every channel is packed once, so a single-shot read is a
+    config write, OS polls and a conversion read with no per-read allocation.
+    In continuous mode the register pointer is left on the conversion register
+    and every read is one readfrom_into with no pointer write at all.
+    '''
+
+    def __init__(self, bus, address=ADS1115_ADDRESS):
+        self.bus = bus
+        self.address = address
+        self._configs = {}
+        self._config_pointer = bytearray([ADS1115_CONFIG])
+        self._conversion_pointer = bytearray([ADS1115_CONVERSION])
+        self._buffer = bytearray(2)
+        self._pointed = False
+
+    def _lock(self):
+        ''' Wait until the bus is locked. '''
+        lock_bus(self.bus)
+
+    def set_channels(self, channels, gain=1, data_rate=128):
+        ''' Pack the single-shot config writes of the channels to be read. '''
+        for channel in channels:
+            config = ADS1115_OS | ADS1115_CHANNELS.index(channel) << 12 | ADS1115_GAINS[gain]
+            config |= ADS1115_MODE_SINGLE | ADS1115_DATA_RATES[data_rate] | ADS1115_COMP_QUE_DISABLE
+            self._configs[channel] = bytearray([ADS1115_CONFIG]) + config.to_bytes(2, 'big')
+
+    def point_at_conversion(self):
+        ''' Leave the register pointer on the conversion register for read_conversion. '''
+        self._lock()
+        try:
+            self._pointed = False
+            self.bus.writeto(self.address, self._conversion_pointer)
+            self._pointed = True
+        finally:
+            self.bus.unlock()
+
+    def read_single(self, channel) -> int:
+        ''' Start a single-shot conversion of a channel, wait for it and read the signed result. '''
+        self._lock()
+        try:
+            self._pointed = False
+            self.bus.writeto(self.address, self._configs[channel])
+            self.bus.writeto_then_readfrom(self.address, self._config_pointer, self._buffer)
+            while not self._buffer[0] & 0x80:
+                self.bus.writeto_then_readfrom(self.address, self._config_pointer, self._buffer)
+            # Apart from OS the config reads back as written, anything else was corrupted on the bus.
+            if (self._buffer[0] ^ self._configs[channel][1]) & 0x7F or self._buffer[1] != self._configs[channel][2]:
+                raise OSError(errno.EBADMSG, f'ADS1115 config read back as {bytes(self._buffer).hex()}')
+            self.bus.writeto_then_readfrom(self.address, self._conversion_pointer, self._buffer)
+        finally:
+            self.bus.unlock()
+        return int.from_bytes(self._buffer, 'big', signed=True)
+
+    def read_conversion(self) -> int:
+        ''' Read the latest continuous conversion with a single read transaction. '''
+        self._lock()
+        try:
+            if not self._pointed:
+                self.bus.writeto(self.address, self._conversion_pointer)
+                self._pointed = True
+            self.bus.readfrom_into(self.address, self._buffer)
+        except OSError:
+            # The pointer write may not have landed, so set it again before the next read.
+            self._pointed = False
+            raise
+        finally:
+            self.bus.unlock()
+        return int.from_bytes(self._buffer, 'big', signed=True)
+
+
+class AlertPin:
+    ''' This class waits for the ADS1115 ALERT/RDY pin on a Raspberry Pi GPIO, numbered as BCM. '''
+
+    def __init__(self, pin):
+        if GPIO is None:
+            raise RuntimeError('RPi.GPIO is required to wait on the ALERT/RDY pin.')
+        self.pin = pin
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+    def wait(self, timeout) -> bool:
+        ''' Wait for the falling edge of a conversion-ready pulse, returning False on a timeout. '''
+        return GPIO.wait_for_edge(self.pin, GPIO.FALLING, timeout=max(round(timeout * 1000), 1)) is not None
+
+
+class InterruptPin(AlertPin):
+    ''' This class waits for the active-low INTA/INTB pin of an MCP23017 on a Raspberry Pi GPIO, numbered as BCM. '''
+
+    def wait(self, timeout) -> bool:
+        ''' Wait until an interrupt is pending, returning at once if one is still waiting to be cleared. '''
+        if GPIO.input(self.pin) == GPIO.LOW:
+            return True
+        return super().wait(timeout)
+
+
+def get_default_frequency():
+    ''' Get the bus frequency from the I2C_STRESS_BUS_FREQUENCY environment variable, None if it is not set. '''
+    frequency = os.environ.get('I2C_STRESS_BUS_FREQUENCY')
+    return int(frequency) if frequency else None
+
+
+def read_linux_clock(path=LINUX_I2C_CLOCK):
+    ''' Read the clock the kernel runs an I2C adapter at from its device tree node, None if it cannot be read. '''
+    try:
+        with open(path, 'rb') as file:
+            return int.from_bytes(file.read(4), 'big')
+    except OSError:
+        return None
+
+
+def clock_out_bus(scl, sda, pulses=9, half_period=0.000005) -> bool:
+    '''
+    Free a bus whose SDA is held low by a device stuck mid-byte, using the BCM pins as GPIOs.
+    SCL is pulsed until SDA is released, at most a byte and an ACK, then a STOP is sent.
+    Returns True if SDA is high afterwards.
+    '''
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(sda, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    GPIO.setup(scl, GPIO.OUT, initial=GPIO.HIGH)
+    try:
+        for _ in range(pulses):
+            if GPIO.input(sda):
+                break
+            GPIO.output(scl, GPIO.LOW)
+            time.sleep(half_period)
+            GPIO.output(scl, GPIO.HIGH)
+            time.sleep(half_period)
+        # A STOP is SDA rising while SCL is high.
+        GPIO.output(scl, GPIO.LOW)
+        GPIO.setup(sda, GPIO.OUT, initial=GPIO.LOW)
+        time.sleep(half_period)
+        GPIO.output(scl, GPIO.HIGH)
+        time.sleep(half_period)
+        GPIO.setup(sda, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        time.sleep(half_period)
+        return bool(GPIO.input(sda))
+    finally:
+        GPIO.cleanup((scl, sda))
+
+
+class HardwareBackend:
+    '''
+    This class creates the bus and devices on the real I2C hardware.
+
+    The bus is opened at frequency, or I2C_STRESS_BUS_FREQUENCY, in Hz. On
+    Linux busio ignores the frequency and the kernel runs the bus at the clock
+    set in the device tree, so the clock actually used is read back from there.
+    '''
+
+    name = 'hardware'
+
+    def __init__(self, frequency=None):
+        self.frequency = frequency or get_default_frequency()
+
+    def get_clock(self) -> int:
+        ''' Get the clock the bus actually runs at in Hz. '''
+        return read_linux_clock() or self.frequency or DEFAULT_BUS_FREQUENCY
+
+    def is_available(self) -> bool:
+        ''' Check if the hardware libraries could be imported. '''
+        return None not in (board, busio, ADS, AnalogIn, MCP23017)
+
+    def bus_key(self) -> tuple:
+        ''' Get the key identifying the physical bus. '''
+        return (self.name, str(board.SCL), str(board.SDA))
+
+    def create_bus(self):
+        ''' Create the I2C bus, warning if the kernel runs it at another clock than the one asked for. '''
+        if self.frequency is None:
+            return busio.I2C(board.SCL, board.SDA)
+        clock = read_linux_clock()
+        if clock is not None and clock != self.frequency:
+            print(
+                f'The I2C bus runs at {clock} Hz, not {self.frequency} Hz, the kernel sets its clock. '
+                f'Set dtparam=i2c_arm_baudrate={self.frequency} in /boot/config.txt and reboot to change it.',
+                file=sys.stderr
+            )
+        return busio.I2C(board.SCL, board.SDA, frequency=self.frequency)
+
+    def recover_bus(self, bus):
+        '''
+        Close the bus, clock out any device holding SDA low, send a STOP and open the bus again.
+        The SCL and SDA pins are handed back to the I2C controller with pinctrl or raspi-gpio,
+        without RPi.GPIO or either tool the bus is only reopened.
+        '''
+        bus.deinit()
+        tool = shutil.which('pinctrl') or shutil.which('raspi-gpio')
+        if GPIO is not None and tool is not None:
+            clock_out_bus(board.SCL.id, board.SDA.id)
+            for pin in (board.SCL.id, board.SDA.id):
+                subprocess.run([tool, 'set', str(pin), 'a0'], check=False)
+        return self.create_bus()
+
+    def create_adc(self, bus, gain=1, address=ADS1115_ADDRESS):
+        ''' Create an ADS1115 on the bus. '''
+        adc = ADS.ADS1115(bus, address=address)
+        adc.gain = gain
+        return adc
+
+    def create_channel(self, adc, channel='P0'):
+        ''' Create an analog input for a single-ended channel like 'P0' or a differential pair like 'P0-P1'. '''
+        return AnalogIn(adc, *(getattr(ADS, pin) for pin in channel.split('-')))
+
+    def create_mcp(self, bus, address=MCP23017_ADDRESS):
+        ''' Create an MCP23017 on the bus. '''
+        return MCP23017(bus, address=address)
+
+    def create_alert_pin(self, bus, pin, address=ADS1115_ADDRESS) -> AlertPin:
+        ''' Create the GPIO input wired to the ALERT/RDY pin of the ADS1115 at an address. '''
+        return AlertPin(pin)
+
+    def create_interrupt_pin(self, bus, pin, address=MCP23017_ADDRESS) -> InterruptPin:
+        ''' Create the GPIO input wired to the mirrored INTA/INTB pins of the MCP23017 at an address. '''
+        return InterruptPin(pin)
+
+
+class BusProfile:
+    '''
+    This class describes the timing and faults of the simulated bus.
+
+    Every transaction takes latency plus a uniform random jitter. A fraction of
+    transactions are NACKed, time out, lose arbitration or return bad data,
+    which raises an IOError just like the Linux I2C driver, and a fraction are
+    held by a clock-stretch stall. A fraction leave a device holding SDA low,
+    after which every transaction times out until the bus is recovered.
+
+    The inputs of the MCP23017 change at random input_edge_rate times a second
+    each, and a fraction glitch_rate of the output latch writes that switch a
+    relay glitch an input with a pulse of glitch_duration seconds.
+
+    An ADS1115 is attached at every address of adc_addresses and an MCP23017
+    at every address of mcp_addresses.
+    '''
+
+    def __init__(self, latency=0.0003, jitter=0.0001, nack_rate=0.0, timeout_rate=0.0,
+                 stall_rate=0.0, stall_duration=0.05, seed=None, arbitration_rate=0.0, corrupt_rate=0.0,
+                 stuck_rate=0.0, input_edge_rate=0.0, glitch_rate=0.0, glitch_duration=0.00005,
+                 adc_addresses=(ADS1115_ADDRESS,), mcp_addresses=(MCP23017_ADDRESS,)):
+        self.latency = latency
+        self.jitter = jitter
+        self.nack_rate = nack_rate
+        self.timeout_rate = timeout_rate
+        self.arbitration_rate = arbitration_rate
+        self.corrupt_rate = corrupt_rate
+        self.stuck_rate = stuck_rate
+        self.stall_rate = stall_rate
+        self.stall_duration = stall_duration
+        self.seed = seed
+        self.input_edge_rate = input_edge_rate
+        self.glitch_rate = glitch_rate
+        self.glitch_duration = glitch_duration
+        self.adc_addresses = tuple(adc_addresses)
+        self.mcp_addresses = tuple(mcp_addresses)
+
+
+class SimulatedADS1115Device:
+    ''' This class simulates the registers and conversions of an ADS1115. '''
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.pointer = ADS1115_CONVERSION
+        self.registers = [0x0000, 0x8583, 0x8000, 0x7FFF]
+        self.conversion_done = self.started
+        self.conversion = 0
+
+    def voltage(self, channel, now) -> float:
+        ''' Get the simulated voltage on a single-ended input. '''
+        phase = 2 * math.pi * 0.5 * (now - self.started)
+        return 1.65 + 0.5 * math.sin(phase + channel * math.pi / 2)
+
+    def sample(self, config, now) -> int:
+        ''' Convert the input selected by a configuration at a point in time. '''
+        mux = (config >> 12) & 0x07
+        if mux >= 4:
+            volts = self.voltage(mux - 4, now)
+        else:
+            positive, negative = ((0, 1), (0, 3), (1, 3), (2, 3))[mux]
+            volts = self.voltage(positive, now) - self.voltage(negative, now)
+        full_scale = ADS1115_FULL_SCALE[(config >> 9) & 0x07]
+        return max(min(round(volts / full_scale * 32768), 32767), -32768)
+
+    def period(self) -> float:
+        ''' Get the conversion period of the configured data rate. '''
+        rate = list(ADS1115_DATA_RATES)[(self.registers[ADS1115_CONFIG] >> 5) & 0x07]
+        return 1 / rate
+
+    def next_ready(self, now):
+        ''' Get when ALERT/RDY next pulses after a point in time, or None if it is not in conversion-ready mode. '''
+        config = self.registers[ADS1115_CONFIG]
+        if (config & 0x0003 == ADS1115_COMP_QUE_DISABLE or not self.registers[ADS1115_HI_THRESH] & 0x8000
+                or self.registers[ADS1115_LO_THRESH] & 0x8000):
+            return None
+        if config & ADS1115_MODE_SINGLE or now < self.conversion_done:
+            return self.conversion_done if now < self.conversion_done else None
+        period = self.period()
+        return self.conversion_done + (math.floor((now - self.conversion_done) / period) + 1) * period
+
+    def write(self, data):
+        ''' Handle a write transaction. '''
+        if not data:
+            return
+        self.pointer = data[0] & 0x03
+        if len(data) < 3:
+            return
+        value = (data[1] << 8) | data[2]
+        if self.pointer == ADS1115_CONFIG:
+            self.registers[ADS1115_CONFIG] = value & ~ADS1115_OS
+            self.conversion_done = self.clock() + self.period()
+        elif self.pointer != ADS1115_CONVERSION:
+            self.registers[self.pointer] = value
+
+    def read(self, count) -> bytes:
+        ''' Handle a read transaction. '''
+        now = self.clock()
+        config = self.registers[ADS1115_CONFIG]
+        if self.pointer == ADS1115_CONVERSION:
+            if config & ADS1115_MODE_SINGLE:
+                if now >= self.conversion_done:
+                    self.conversion = self.sample(config, self.conversion_done)
+            else:
+                period = self.period()
+                completed = math.floor((now - self.conversion_done) / period) * period
+                if completed >= 0:
+                    self.conversion = self.sample(config, self.conversion_done + completed)
+            value = self.conversion & 0xFFFF
+        elif self.pointer == ADS1115_CONFIG:
+            value = config | (ADS1115_OS if now >= self.conversion_done else 0)
+        else:
+            value = self.registers[self.pointer]
+        return bytes([value >> 8, value & 0xFF] * ((count + 1) // 2))[:count]
+
+
+class SimulatedMCP23017Device:
+    '''
+    This class simulates the registers of an MCP23017 with IOCON.BANK = 0.
+
+    Inputs with interrupt-on-change enabled in GPINTEN raise an interrupt when
+    they change, or differ from DEFVAL when set in INTCON. The first one sets
+    INTF and captures the port in INTCAP, later changes are not captured until
+    INTCAP or GPIO of the port is read. Input changes are events at monotonic
+    times, applied whenever the device is touched.
+    '''
+
+    def __init__(self, profile=None, clock=time.monotonic):
+        self.profile = profile or BusProfile()
+        self.clock = clock
+        self.pointer = 0
+        self.registers = [0x00] * MCP23017_REGISTER_COUNT
+        self.registers[MCP23017_IODIRA] = 0xFF
+        self.registers[MCP23017_IODIRA + 1] = 0xFF
+        self.inputs = [0x00, 0x00]
+        self.condition = threading.Condition()
+        self._random = random.Random(self.profile.seed)
+        self._events = []
+        self._next_edge = None
+
+    def gpio(self, port) -> int:
+        ''' Get the pin levels of a port, outputs follow the latch and inputs the pins. '''
+        iodir = self.registers[MCP23017_IODIRA + port]
+        latch = self.registers[MCP23017_OLATA + port]
+        return (latch & ~iodir | self.inputs[port] & iodir) & 0xFF
+
+    def _interrupt_pins(self) -> list:
+        ''' Get the (port, bit) of every input with interrupt-on-change enabled. '''
+        return [
+            (port, 1 << bit) for port in (0, 1) for bit in range(8)
+            if self.registers[MCP23017_GPINTENA + port] & self.registers[MCP23017_IODIRA + port] & (1 << bit)
+        ]
+
+    def _set_input(self, port, bit, value):
+        ''' Drive an input, raising an interrupt if it is enabled and none is pending on the port. '''
+        before = self.gpio(port)
+        self.inputs[port] = self.inputs[port] | bit if value else self.inputs[port] & ~bit
+        after = self.gpio(port)
+        if not self.registers[MCP23017_GPINTENA + port] & bit or self.registers[MCP23017_INTFA + port]:
+            return
+        if self.registers[MCP23017_INTCONA + port] & bit:
+            triggered = (after ^ self.registers[MCP23017_DEFVALA + port]) & bit
+        else:
+            triggered = (after ^ before) & bit
+        if triggered:
+            self.registers[MCP23017_INTFA + port] = bit
+            self.registers[MCP23017_INTCAPA + port] = after
+
+    def advance(self, now):
+        ''' Apply every input change due by now, drawing the random edges as they come due. '''
+        rate = self.profile.input_edge_rate
+        while True:
+            if rate and self._next_edge is None:
+                self._next_edge = now + self._random.expovariate(rate * max(len(self._interrupt_pins()), 1))
+            if rate and self._next_edge <= now and (not self._events or self._next_edge < self._events[0][0]):
+                pins = self._interrupt_pins()
+                if pins:
+                    port, bit = self._random.choice(pins)
+                    self._set_input(port, bit, not self.inputs[port] & bit)
+                self._next_edge += self._random.expovariate(rate * max(len(pins), 1))
+                continue
+            if self._events and self._events[0][0] <= now:
+                _, port, bit, value = self._events.pop(0)
+                self._set_input(port, bit, value)
+                continue
+            return
+
+    def next_change(self):
+        ''' Get the monotonic time of the next input change, None if there is none to come. '''
+        times = [self._events[0][0]] if self._events else []
+        if self._next_edge is not None:
+            times.append(self._next_edge)
+        return min(times, default=None)
+
+    def interrupt_pending(self) -> bool:
+        ''' Check if INTF is set on either port, which with IOCON.MIRROR drives both interrupt pins. '''
+        return bool(self.registers[MCP23017_INTFA] or self.registers[MCP23017_INTFA + 1])
+
+    def _glitch(self, now):
+        ''' Pulse an input with interrupt-on-change enabled, like a relay coupling into it as it switches. '''
+        pins = self._interrupt_pins()
+        if not pins:
+            return
+        port, bit = self._random.choice(pins)
+        level = bool(self.inputs[port] & bit)
+        start = now + self._random.random() * self.profile.glitch_duration
+        self._events += [(start, port, bit, not level), (start + self.profile.glitch_duration, port, bit, level)]
+        self._events.sort()
+        self.condition.notify_all()
+
+    def write(self, data):
+        ''' Handle a write transaction, the address pointer increments after every byte. '''
+        if not data:
+            return
+        with self.condition:
+            now = self.clock()
+            self.advance(now)
+            outputs = [self.gpio(0), self.gpio(1)]
+            self.pointer = data[0] % MCP23017_REGISTER_COUNT
+            for value in data[1:]:
+                register = self.pointer
+                if register in (MCP23017_GPIOA, MCP23017_GPIOA + 1):
+                    register += MCP23017_OLATA - MCP23017_GPIOA
+                if register == MCP23017_IOCON + 1:
+                    register = MCP23017_IOCON
+                if register not in (MCP23017_INTFA, MCP23017_INTFA + 1, MCP23017_INTCAPA, MCP23017_INTCAPA + 1):
+                    self.registers[register] = value & 0xFF
+                self.pointer = (self.pointer + 1) % MCP23017_REGISTER_COUNT
+            switched = outputs != [self.gpio(0), self.gpio(1)]
+            if switched and self.profile.glitch_rate and self._random.random() < self.profile.glitch_rate:
+                self._glitch(now)
+
+    def read(self, count) -> bytes:
+        ''' Handle a read transaction, the address pointer increments after every byte. '''
+        data = bytearray()
+        with self.condition:
+            self.advance(self.clock())
+            for _ in range(count):
+                register = self.pointer
+                if register == MCP23017_IOCON + 1:
+                    register = MCP23017_IOCON
+                if register in (MCP23017_GPIOA, MCP23017_GPIOA + 1):
+                    data.append(self.gpio(register - MCP23017_GPIOA))
+                else:
+                    data.append(self.registers[register])
+                # Reading the captured or current levels of a port clears its interrupt.
+                if register in (MCP23017_INTCAPA, MCP23017_INTCAPA + 1):
+                    self.registers[MCP23017_INTFA + register - MCP23017_INTCAPA] = 0
+                elif register in (MCP23017_GPIOA, MCP23017_GPIOA + 1):
+                    self.registers[MCP23017_INTFA + register - MCP23017_GPIOA] = 0
+                self.pointer = (self.pointer + 1) % MCP23017_REGISTER_COUNT
+        return bytes(data)
+
+
+class SimulatedI2C:
+    '''
+    This class simulates a busio.I2C bus with devices attached in-process.
+
+    Each transaction is delayed and faulted according to the bus profile. The
+    latency of the profile is the one at the 100 kHz default clock, it scales
+    down in proportion at a faster frequency.
+    '''
+
+    def __init__(self, profile=None, frequency=None):
+        self.profile = profile or BusProfile()
+        self.frequency = frequency or DEFAULT_BUS_FREQUENCY
+        self.scale = DEFAULT_BUS_FREQUENCY / self.frequency
+        self.devices = {}
+        self.transactions = 0
+        self.stuck = False
+        self._random = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+
+    def attach(self, address, device):
+        ''' Attach a simulated device at an address. '''
+        self.devices[address] = device
+
+    def try_lock(self) -> bool:
+        ''' Try to lock the bus. '''
+        return self._lock.acquire(False)
+
+    def unlock(self):
+        ''' Unlock the bus. '''
+        self._lock.release()
+
+    def deinit(self):
+        ''' Release the bus, nothing to do for the simulation. '''
+
+    def scan(self) -> list:
+        ''' Get the addresses of the attached devices. '''
+        self._transact(None)
+        return sorted(self.devices)
+
+    def _transact(self, address):
+        ''' Spend the time of one transaction and inject any faults. '''
+        profile = self.profile
+        self.transactions += 1
+        delay = (profile.latency + profile.jitter * self._random.random()) * self.scale
+        if profile.stall_rate and self._random.random() < profile.stall_rate:
+            delay += profile.stall_duration
+        if delay > 0:
+            time.sleep(delay)
+        if profile.stuck_rate and self._random.random() < profile.stuck_rate:
+            self.stuck = True
+        if self.stuck:
+            raise OSError(errno.ETIMEDOUT, os.strerror(errno.ETIMEDOUT))
+        if profile.nack_rate and self._random.random() < profile.nack_rate:
+            raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+        if profile.timeout_rate and self._random.random() < profile.timeout_rate:
+            raise OSError(errno.ETIMEDOUT, os.strerror(errno.ETIMEDOUT))
+        if profile.arbitration_rate and self._random.random() < profile.arbitration_rate:
+            raise OSError(errno.EAGAIN, os.strerror(errno.EAGAIN))
+        if profile.corrupt_rate and self._random.random() < profile.corrupt_rate:
+            raise OSError(errno.EBADMSG, os.strerror(errno.EBADMSG))
+        if address is not None and address not in self.devices:
+            raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+        return self.devices.get(address)
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        ''' Write a buffer to a device. '''
+        device = self._transact(address)
+        device.write(bytes(buffer[start:end]))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        ''' Read from a device into a buffer. '''
+        device = self._transact(address)
+        end = len(buffer) if end is None else end
+        buffer[start:end] = device.read(end - start)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        ''' Write a buffer to a device then read from it into another, without a stop in between. '''
+        device = self._transact(address)
+        device.write(bytes(buffer_out[out_start:out_end]))
+        in_end = len(buffer_in) if in_end is None else in_end
+        buffer_in[in_start:in_end] = device.read(in_end - in_start)
+
+
+class SimulatedAlertPin:
+    '''
+    This class simulates the GPIO wired to the ALERT/RDY pin of a simulated ADS1115.
+
+    Like a real edge wait, only pulses that come after the wait started are seen,
+    so a reader that falls behind skips conversions instead of catching up.
+    '''
+
+    def __init__(self, device, clock=time.monotonic):
+        self.device = device
+        self.clock = clock
+
+    def wait(self, timeout) -> bool:
+        ''' Wait for the falling edge of a conversion-ready pulse, returning False on a timeout. '''
+        now = self.clock()
+        ready = self.device.next_ready(now)
+        if ready is None or ready - now > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(ready - now)
+        return True
+
+
+class SimulatedInterruptPin:
+    ''' This class simulates the GPIO wired to the mirrored interrupt pins of a simulated MCP23017. '''
+
+    def __init__(self, device):
+        self.device = device
+
+    def wait(self, timeout) -> bool:
+        ''' Wait until an interrupt is pending, returning False on a timeout. '''
+        device = self.device
+        with device.condition:
+            deadline = device.clock() + timeout
+            while True:
+                now = device.clock()
+                device.advance(now)
+                if device.interrupt_pending():
+                    return True
+                if now >= deadline:
+                    return False
+                change = device.next_change()
+                device.condition.wait(min(deadline, change if change is not None else deadline) - now)
+
+
+class SimulatedADS1115:
+    ''' This class drives a simulated ADS1115 with the same interface as the Adafruit driver. '''
+
+    def __init__(self, bus, address=ADS1115_ADDRESS):
+        self.device = RegisterDevice(bus, address)
+        self._gain = 1
+        self.data_rate = 128
+        self.mode = ADS1115_MODE_SINGLE
+        self._last_pin_read = None
+
+    @property
+    def gain(self):
+        ''' The programmable gain. '''
+        return self._gain
+
+    @gain.setter
+    def gain(self, gain):
+        if gain not in ADS1115_GAINS:
+            raise ValueError(f'Gain must be one of: {list(ADS1115_GAINS)}')
+        self._gain = gain
+
+    def read(self, pin, is_differential=False) -> int:
+        ''' Perform a conversion and return the signed result. '''
+        pin = pin if is_differential else pin + 0x04
+        if self.mode == ADS1115_MODE_CONTINUOUS and self._last_pin_read == pin:
+            return self._conversion_value()
+        self._last_pin_read = pin
+        config = ADS1115_OS if self.mode == ADS1115_MODE_SINGLE else 0
+        config |= (pin & 0x07) << 12
+        config |= ADS1115_GAINS[self.gain]
+        config |= self.mode
+        config |= ADS1115_DATA_RATES[self.data_rate]
+        config |= ADS1115_COMP_QUE_DISABLE
+        self.device.write(ADS1115_CONFIG, config.to_bytes(2, 'big'))
+        if self.mode == ADS1115_MODE_SINGLE:
+            while not int.from_bytes(self.device.read(ADS1115_CONFIG, 2), 'big') & ADS1115_OS:
+                pass
+        else:
+            time.sleep(2 / self.data_rate)
+        return self._conversion_value()
+
+    def _conversion_value(self) -> int:
+        ''' Read the conversion register as a signed value. '''
+        return int.from_bytes(self.device.read(ADS1115_CONVERSION, 2), 'big', signed=True)
+
+
+class SimulatedAnalogIn:
+    ''' This class reads a channel of a simulated ADS1115 like adafruit_ads1x15.analog_in.AnalogIn. '''
+
+    def __init__(self, ads, positive_pin, negative_pin=None):
+        self._ads = ads
+        self._pin_setting = positive_pin
+        self.is_differential = negative_pin is not None
+        if self.is_differential:
+            self._pin_setting = {(0, 1): 0, (0, 3): 1, (1, 3): 2, (2, 3): 3}[(positive_pin, negative_pin)]
+
+    @property
+    def value(self) -> int:
+        ''' The signed conversion result of the channel. '''
+        return self._ads.read(self._pin_setting, is_differential=self.is_differential)
+
+
+class SimulatedDigitalInOut:
+    ''' This class drives a pin of a simulated MCP23017 like the Adafruit DigitalInOut. '''
+
+    def __init__(self, pin, mcp):
+        self._pin = pin
+        self._mcp = mcp
+
+    @property
+    def direction(self):
+        ''' The direction of the pin. '''
+        return Direction.INPUT if self._mcp.iodir & (1 << self._pin) else Direction.OUTPUT
+
+    @direction.setter
+    def direction(self, direction):
+        if direction == Direction.INPUT:
+            self._mcp.iodir = self._mcp.iodir | (1 << self._pin)
+        else:
+            self._mcp.iodir = self._mcp.iodir & ~(1 << self._pin)
+
+    @property
+    def value(self) -> bool:
+        ''' The level of the pin. '''
+        return bool(self._mcp.gpio & (1 << self._pin))
+
+    @value.setter
+    def value(self, value):
+        if value:
+            self._mcp.gpio = self._mcp.gpio | (1 << self._pin)
+        else:
+            self._mcp.gpio = self._mcp.gpio & ~(1 << self._pin)
+
+
+class SimulatedMCP23017:
+    ''' This class drives a simulated MCP23017 with the same interface as the Adafruit driver. '''
+
+    def __init__(self, bus, address=MCP23017_ADDRESS):
+        self.device = RegisterDevice(bus, address)
+
+    def _read_u16le(self, register) -> int:
+        return int.from_bytes(self.device.read(register, 2), 'little')
+
+    def _write_u16le(self, register, value):
+        self.device.write(register, (value & 0xFFFF).to_bytes(2, 'little'))
+
+    @property
+    def gpio(self) -> int:
+        ''' The levels of all 16 pins. '''
+        return self._read_u16le(MCP23017_GPIOA)
+
+    @gpio.setter
+    def gpio(self, value):
+        self._write_u16le(MCP23017_GPIOA, value)
+
+    @property
+    def iodir(self) -> int:
+        ''' The direction of all 16 pins, a set bit is an input. '''
+        return self._read_u16le(MCP23017_IODIRA)
+
+    @iodir.setter
+    def iodir(self, value):
+        self._write_u16le(MCP23017_IODIRA, value)
+
+    def get_pin(self, pin) -> SimulatedDigitalInOut:
+        ''' Get a pin by its number, 0-7 are port A and 8-15 are port B. '''
+        if not 0 <= pin <= 15:
+            raise ValueError('Pin number must be 0-15.')
+        return SimulatedDigitalInOut(pin, self)
+
+
+class SimulatedBackend:
+    '''
+    This class creates an in-process simulated bus with the ADS1115s and MCP23017s of the profile attached.
+
+    The bus runs at frequency, or I2C_STRESS_BUS_FREQUENCY, in Hz.
+    '''
+
+    name = 'simulated'
+
+    def __init__(self, profile=None, frequency=None):
+        self.profile = profile or BusProfile()
+        self.frequency = frequency or get_default_frequency()
+        self.devices = {}
+
+    def get_clock(self) -> int:
+        ''' Get the clock the simulated bus runs at in Hz. '''
+        return self.frequency or DEFAULT_BUS_FREQUENCY
+
+    def is_available(self) -> bool:
+        ''' The simulation is always available. '''
+        return True
+
+    def bus_key(self) -> tuple:
+        ''' Get the key identifying the simulated bus, every backend instance simulates its own. '''
+        return (self.name, id(self))
+
+    def create_bus(self) -> SimulatedI2C:
+        ''' Create the simulated bus. '''
+        bus = SimulatedI2C(self.profile, self.frequency)
+        self.devices = {address: SimulatedADS1115Device() for address in self.profile.adc_addresses}
+        self.devices.update({address: SimulatedMCP23017Device(self.profile) for address in self.profile.mcp_addresses})
+        for address, device in self.devices.items():
+            bus.attach(address, device)
+        return bus
+
+    def recover_bus(self, bus) -> SimulatedI2C:
+        ''' Clock out the simulated device holding SDA low, the bus stays open. '''
+        bus.stuck = False
+        return bus
+
+    def create_adc(self, bus, gain=1, address=ADS1115_ADDRESS) -> SimulatedADS1115:
+        ''' Create a simulated ADS1115 on the bus. '''
+        adc = SimulatedADS1115(bus, address=address)
+        adc.gain = gain
+        return adc
+
+    def create_channel(self, adc, channel='P0') -> SimulatedAnalogIn:
+        ''' Create an analog input for a single-ended channel like 'P0' or a differential pair like 'P0-P1'. '''
+        return SimulatedAnalogIn(adc, *(int(pin[1]) for pin in channel.split('-')))
+
+    def create_mcp(self, bus, address=MCP23017_ADDRESS) -> SimulatedMCP23017:
+        ''' Create a simulated MCP23017 on the bus. '''
+        return SimulatedMCP23017(bus, address=address)
+
+    def create_alert_pin(self, bus, pin, address=ADS1115_ADDRESS) -> SimulatedAlertPin:
+        ''' Create the simulated GPIO wired to the ALERT/RDY pin of the ADS1115 at an address. '''
+        return SimulatedAlertPin(self.devices[address])
+
+    def create_interrupt_pin(self, bus, pin, address=MCP23017_ADDRESS) -> SimulatedInterruptPin:
+        ''' Create the simulated GPIO wired to the mirrored interrupt pins of the MCP23017 at an address. '''
+        return SimulatedInterruptPin(self.devices[address])
+
+
+BACKENDS = {
+    HardwareBackend.name: HardwareBackend,
+    SimulatedBackend.name: SimulatedBackend
+}
+
+
+_default_backends = {}
+
+
+def get_backend(name=None, **kwargs):
+    '''
+    Get a backend by name, defaulting to the I2C_STRESS_BACKEND environment variable or the hardware.
+    Backends without options are shared by the whole process, so they also share their bus.
+    '''
+    name = name or os.environ.get('I2C_STRESS_BACKEND', HardwareBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown backend: {name}, expected one of: {", ".join(BACKENDS)}')
+    if kwargs:
+        return BACKENDS[name](**kwargs)
+    if name not in _default_backends:
+        _default_backends[name] = BACKENDS[name]()
+    return _default_backends[name]
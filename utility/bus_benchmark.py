@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+           Bus Benchmark
+====================================
+--------------
+Usage Example:
+--------------
+
+from bus_benchmark import BusBenchmark
+
+# Run the ADC and MCP workloads for 10 seconds each at 100 kHz, 400 kHz and 1 MHz.
+benchmark = BusBenchmark(frequencies=(100_000, 400_000, 1_000_000), duration=10)
+benchmark.run()
+benchmark.results[(400_000, 'adc')]['throughput']
+'''
+
+import threading
+import time
+
+from .adc_config import ADC, ERROR_IO, ERROR_NONE, ReadStats
+from .bus_backend import BUS_FREQUENCIES, get_backend
+from .bus_manager import bus_manager
+from .mcp_config import MCP
+
+
+WORKLOADS = ('adc', 'mcp')
+
+
+class BusBenchmark:
+    '''
+    This class runs the ADC and MCP workloads at every bus frequency and tabulates them.
+
+    The ADC workload reads as fast as the bus allows for duration seconds. The
+    MCP workload rewrites the output latch with its current value and reads the
+    GPIO and OLAT registers back, so the relays never move. Every frequency gets
+    a fresh bus, created with backend_factory(frequency), which is closed again
+    before the next one. Options not listed here are passed on to ADC.
+    '''
+
+    def __init__(self, frequencies=BUS_FREQUENCIES, duration=10.0, backend_factory=None, workloads=WORKLOADS,
+                 **options):
+        for workload in workloads:
+            if workload not in WORKLOADS:
+                raise ValueError(f'Unknown workload: {workload}, expected one of: {", ".join(WORKLOADS)}')
+        self.frequencies = list(frequencies)
+        self.duration = duration
+        self.backend_factory = backend_factory or (lambda frequency: get_backend(frequency=frequency))
+        self.workloads = list(workloads)
+        self.options = options
+        self.results = {}
+        self.clocks = {}
+        self.hardware_available = True
+        self.stop_event = threading.Event()
+
+    def run_adc(self, backend) -> dict:
+        ''' Read the ADC flat out for the duration, returning None without hardware. '''
+        adc = ADC(backend=backend, autostart=False, **self.options)
+        if not adc.is_initialized():
+            return None
+        adc.start()
+        try:
+            self.stop_event.wait(self.duration)
+        finally:
+            adc.stop()
+        snapshot = adc.get_snapshot()
+        stats = ReadStats()
+        stats.reads = snapshot.reads
+        stats.errors = snapshot.errors
+        stats.latency = snapshot.latency
+        return stats.report(snapshot.duration)
+
+    def run_mcp(self, backend) -> dict:
+        ''' Write and read back the MCP output latch flat out for the duration, returning None without hardware. '''
+        mcp = MCP(backend=backend)
+        if not mcp.is_initialized():
+            return None
+        stats = ReadStats()
+        started = time.monotonic()
+        deadline = started + self.duration
+        while time.monotonic() < deadline and not self.stop_event.is_set():
+            begin = time.perf_counter_ns()
+            try:
+                # An empty mask rewrites the latch unchanged.
+                mcp.write_outputs(0, 0)
+                verified = mcp.verify_outputs()
+            except IOError:
+                verified = False
+            stats.record(time.perf_counter_ns() - begin, ERROR_NONE if verified else ERROR_IO)
+        return stats.report(time.monotonic() - started)
+
+    def run(self, on_result=None) -> dict:
+        '''
+        Run every workload at every frequency until done or stop() is called, calling
+        on_result(frequency, clock, workload, report) after each. Returns the results
+        keyed by (frequency, workload).
+        '''
+        self.stop_event.clear()
+        self.results = {}
+        for frequency in self.frequencies:
+            backend = self.backend_factory(frequency)
+            if not backend.is_available():
+                self.hardware_available = False
+                return self.results
+            try:
+                self.clocks[frequency] = backend.get_clock()
+                for workload in self.workloads:
+                    if self.stop_event.is_set():
+                        return self.results
+                    report = getattr(self, f'run_{workload}')(backend)
+                    if report is None:
+                        self.hardware_available = False
+                        return self.results
+                    self.results[(frequency, workload)] = report
+                    if on_result is not None:
+                        on_result(frequency, self.clocks[frequency], workload, report)
+            finally:
+                bus_manager.release(backend)
+        return self.results
+
+    def stop(self):
+        ''' Stop the benchmark after the workload being run. '''
+        self.stop_event.set()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            Bus Faults
+====================================
+--------------
+Usage Example:
+--------------
+
+from bus_faults import FaultCounters, RetryPolicy, classify
+
+# Retry a failed read twice with 1 ms then 2 ms of backoff, recover the bus after
+# 3 failed reads in a row and call it dead after 10.
+policy = RetryPolicy(retries=2, backoff=0.001, recover_after=3, fail_after=10)
+counters = FaultCounters(policy)
+try:
+    read()
+except OSError as error:
+    counters.record_fault(classify(error))
+'''
+
+from collections import namedtuple
+import errno
+
+
+# Fault classes of a failed transaction.
+FAULT_NACK = 'nack'
+FAULT_TIMEOUT = 'timeout'
+FAULT_ARBITRATION = 'arbitration'
+FAULT_BAD_DATA = 'bad_data'
+FAULT_OTHER = 'other'
+FAULT_CLASSES = (FAULT_NACK, FAULT_TIMEOUT, FAULT_ARBITRATION, FAULT_BAD_DATA, FAULT_OTHER)
+
+# Error codes passed to the sample listeners for every fault class, 1 is the ERROR_IO code of unclassified faults.
+FAULT_ERRORS = {FAULT_OTHER: 1, FAULT_NACK: 2, FAULT_TIMEOUT: 3, FAULT_ARBITRATION: 4, FAULT_BAD_DATA: 5}
+
+# The Linux I2C drivers report a NACK as EREMOTEIO, or ENXIO for the address,
+# a lost arbitration as EAGAIN and an SMBus PEC or protocol error as EBADMSG or EPROTO.
+FAULT_ERRNOS = {
+    errno.EREMOTEIO: FAULT_NACK,
+    errno.ENXIO: FAULT_NACK,
+    errno.ETIMEDOUT: FAULT_TIMEOUT,
+    errno.EAGAIN: FAULT_ARBITRATION,
+    errno.EBADMSG: FAULT_BAD_DATA,
+    errno.EPROTO: FAULT_BAD_DATA
+}
+
+
+def classify(error) -> str:
+    ''' Get the fault class of an error raised by a bus transaction. '''
+    if isinstance(error, TimeoutError):
+        return FAULT_TIMEOUT
+    return FAULT_ERRNOS.get(getattr(error, 'errno', None), FAULT_OTHER)
+
+
+class RetryPolicy:
+    '''
+    This class describes how failed reads are retried and when the bus is given up on.
+
+    A failed read is retried up to retries times, waiting backoff seconds
+    before the first retry and backoff_factor times longer before each next
+    one, up to max_backoff. After recover_after failed reads in a row the bus
+    is recovered, and after fail_after it is considered dead. Either is off
+    when set to 0.
+    '''
+
+    def __init__(self, retries=2, backoff=0.001, backoff_factor=2.0, max_backoff=0.05, recover_after=3,
+                 fail_after=10):
+        if retries < 0:
+            raise ValueError(f'Retries must be at least 0, got: {retries}')
+        if backoff < 0 or max_backoff < 0:
+            raise ValueError('Backoff must be at least 0 seconds.')
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.recover_after = recover_after
+        self.fail_after = fail_after
+
+    def delay(self, retry) -> float:
+        ''' Get the seconds to wait before a retry, counted from 1. '''
+        return min(self.backoff * self.backoff_factor ** (retry - 1), self.max_backoff)
+
+
+class FaultSummary(namedtuple('FaultSummary', FAULT_CLASSES + (
+    'retries', 'recovered', 'recoveries', 'failed_reads', 'consecutive_failures', 'max_consecutive_failures',
+    'bus_failed'
+))):
+    '''
+    This class is an immutable view of the faults of a run.
+
+    Every fault class counts failed attempts, retries counts the attempts
+    repeated, recovered the reads that succeeded on a retry and failed_reads
+    the reads that failed after every retry.
+    '''
+
+    __slots__ = ()
+
+
+class FaultCounters:
+    ''' This class counts the faults of every class and tracks the runs of failed reads against a retry policy. '''
+
+    def __init__(self, policy=None):
+        self.policy = policy or RetryPolicy()
+        self.faults = dict.fromkeys(FAULT_CLASSES, 0)
+        self.retries = 0
+        self.recovered = 0
+        self.recoveries = 0
+        self.failed_reads = 0
+        self.consecutive_failures = 0
+        self.max_consecutive_failures = 0
+        self.bus_failed = False
+
+    def record_fault(self, fault_class):
+        ''' Count a failed attempt. '''
+        self.faults[fault_class] += 1
+
+    def record_retry(self):
+        ''' Count an attempt being repeated. '''
+        self.retries += 1
+
+    def record_success(self, retried):
+        ''' Count a read that succeeded, after a retry if retried. '''
+        if retried:
+            self.recovered += 1
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        ''' Count a read that failed after every retry, marking the bus failed once the policy gives up on it. '''
+        self.failed_reads += 1
+        self.consecutive_failures += 1
+        self.max_consecutive_failures = max(self.max_consecutive_failures, self.consecutive_failures)
+        if self.policy.fail_after and self.consecutive_failures >= self.policy.fail_after:
+            self.bus_failed = True
+
+    def record_abort(self, fault_class):
+        ''' Count a fault that stopped the reads altogether rather than failing one of them, failing the bus. '''
+        self.faults[fault_class] += 1
+        self.bus_failed = True
+
+    def should_recover(self) -> bool:
+        ''' Check if the bus should be recovered after the last failed read. '''
+        recover_after = self.policy.recover_after
+        return bool(recover_after) and self.consecutive_failures > 0 and self.consecutive_failures % recover_after == 0
+
+    def record_recovery(self):
+        ''' Count a bus recovery. '''
+        self.recoveries += 1
+
+    def summary(self) -> FaultSummary:
+        ''' Get an immutable summary of the faults. '''
+        return FaultSummary(
+            *(self.faults[fault_class] for fault_class in FAULT_CLASSES),
+            retries=self.retries,
+            recovered=self.recovered,
+            recoveries=self.recoveries,
+            failed_reads=self.failed_reads,
+            consecutive_failures=self.consecutive_failures,
+            max_consecutive_failures=self.max_consecutive_failures,
+            bus_failed=self.bus_failed
+        )
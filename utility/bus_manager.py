@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            Bus Manager
+====================================
+--------------
+Usage Example:
+--------------
+
+from bus_manager import bus_manager
+
+# Every caller asking for the same backend and pins gets the same bus.
+bus = bus_manager.get_bus(backend)
+adc = bus.get_device(('ads1115', 0x48), lambda: backend.create_adc(bus))
+'''
+
+import threading
+
+from .bus_backend import lock_bus
+
+
+class SharedBus:
+    '''
+    This class shares one busio-style bus between every device on the same pins.
+
+    try_lock blocks on a re-entrant lock instead of failing, so ADC and MCP
+    transactions from different threads are serialised instead of racing on
+    the bus. Devices created through get_device are kept for later runs.
+    '''
+
+    def __init__(self, bus, backend):
+        self.bus = bus
+        self.backend = backend
+        self.devices = {}
+        self.transactions = 0
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def try_lock(self) -> bool:
+        ''' Lock the bus, waiting for any other thread to unlock it first. '''
+        self._lock.acquire()
+        if self._depth == 0:
+            lock_bus(self.bus)
+        self._depth += 1
+        return True
+
+    def unlock(self):
+        ''' Unlock the bus. '''
+        self._depth -= 1
+        if self._depth == 0:
+            self.bus.unlock()
+        self._lock.release()
+
+    def __enter__(self):
+        self.try_lock()
+        return self
+
+    def __exit__(self, *args):
+        self.unlock()
+
+    def recover(self):
+        '''
+        Recover a stuck bus through the backend, which may replace the underlying bus.
+        Devices hold this shared bus rather than the underlying one, so they keep working.
+        '''
+        with self._lock:
+            if self._depth:
+                self.bus.unlock()
+            self.bus = self.backend.recover_bus(self.bus)
+            if self._depth:
+                lock_bus(self.bus)
+
+    def get_device(self, key, factory):
+        ''' Get the device stored under a key, creating it with the factory on first use. '''
+        with self._lock:
+            if key not in self.devices:
+                self.devices[key] = factory()
+            return self.devices[key]
+
+    def scan(self) -> list:
+        ''' Get the addresses of the devices responding on the bus. '''
+        self.transactions += 1
+        return self.bus.scan()
+
+    def writeto(self, address, buffer, **kwargs):
+        ''' Write a buffer to a device. '''
+        self.transactions += 1
+        self.bus.writeto(address, buffer, **kwargs)
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        ''' Read from a device into a buffer. '''
+        self.transactions += 1
+        self.bus.readfrom_into(address, buffer, **kwargs)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        ''' Write a buffer to a device then read from it into another. '''
+        self.transactions += 1
+        self.bus.writeto_then_readfrom(address, buffer_out, buffer_in, **kwargs)
+
+    def deinit(self):
+        ''' Leave the bus open, it is owned by the bus manager. '''
+
+
+class BusManager:
+    ''' This class hands out one shared bus per backend and pin pair for the whole process. '''
+
+    def __init__(self):
+        self._buses = {}
+        self._lock = threading.Lock()
+
+    def get_bus(self, backend) -> SharedBus:
+        ''' Get the shared bus for a backend, creating it on first use. '''
+        key = backend.bus_key()
+        with self._lock:
+            if key not in self._buses:
+                self._buses[key] = SharedBus(backend.create_bus(), backend)
+            return self._buses[key]
+
+    def release(self, backend):
+        ''' Close the shared bus for a backend and forget its devices. '''
+        with self._lock:
+            shared = self._buses.pop(backend.bus_key(), None)
+        if shared is not None:
+            with shared:
+                shared.bus.deinit()
+
+
+bus_manager = BusManager()
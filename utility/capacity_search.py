@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+          Capacity Search
+====================================
+--------------
+Usage Example:
+--------------
+
+from capacity_search import CapacitySearch
+
+# Find the highest ADC request rate with under 1% missed and a p99 under 20 ms.
+search = CapacitySearch(start_rate=10, max_rate=1000, max_miss_ratio=0.01, max_p99=20)
+search.run()
+search.capacity
+search.levels
+'''
+
+from collections import namedtuple
+import threading
+
+from .adc_config import ADC
+
+
+class CapacityLevel(namedtuple('CapacityLevel', (
+    'rate', 'achieved_rate', 'requests', 'missed', 'errors', 'miss_ratio', 'p50', 'p99', 'max', 'passed'
+))):
+    '''
+    This class is the result of holding the ADC at one request rate.
+
+    Everything is measured over the hold period only. Failed reads count as
+    missed requests, latencies are in milliseconds.
+    '''
+
+    __slots__ = ()
+
+
+class CapacitySearch:
+    '''
+    This class finds the highest request rate the ADC sustains on the bus.
+
+    The rate is ramped by step times from start_rate until a level fails, then
+    binary searched between the last level that passed and the first that
+    failed, down to resolution of the rate. Every level runs a fresh ADC paced
+    at that many requests a second, is given settle seconds to reach a steady
+    state and is then measured for hold seconds. A level passes when the share
+    of missed or failed requests stays at or under max_miss_ratio and, if
+    max_p99 is set, the p99 latency stays at or under it in milliseconds.
+    Options not listed here are passed on to ADC.
+    '''
+
+    def __init__(self, start_rate=10, max_rate=1000, step=2.0, settle=1.0, hold=5.0, max_miss_ratio=0.01,
+                 max_p99=None, resolution=0.02, backend=None, **options):
+        if start_rate < 1 or max_rate < start_rate:
+            raise ValueError(f'Rates must satisfy 1 <= start_rate <= max_rate, got: {start_rate} and {max_rate}')
+        if step <= 1:
+            raise ValueError(f'Step must be greater than 1, got: {step}')
+        if hold <= 0:
+            raise ValueError(f'Hold must be longer than 0 seconds, got: {hold}')
+        if options.get('alert_pin') is not None:
+            raise ValueError('Reads that follow the ALERT/RDY pin are not paced, so their rate cannot be searched.')
+        self.start_rate = int(start_rate)
+        self.max_rate = int(max_rate)
+        self.step = step
+        self.settle = settle
+        self.hold = hold
+        self.max_miss_ratio = max_miss_ratio
+        self.max_p99 = max_p99
+        self.resolution = resolution
+        self.backend = backend
+        self.options = options
+        self.levels = []
+        self.capacity = 0
+        self.current_rate = None
+        self.hardware_available = True
+        self.stop_event = threading.Event()
+
+    def measure(self, rate) -> CapacityLevel:
+        ''' Hold the ADC at a request rate and measure it, returning None if stopped or without hardware. '''
+        adc = ADC(requests=rate, frequency=1, backend=self.backend, autostart=False, **self.options)
+        if not adc.is_initialized():
+            self.hardware_available = False
+            return None
+        self.backend = adc.backend
+        adc.start()
+        try:
+            if self.stop_event.wait(self.settle):
+                return None
+            before = adc.get_snapshot()
+            if self.stop_event.wait(self.hold):
+                return None
+        finally:
+            adc.stop()
+        # The reading thread publishes a last snapshot when it stops, so this one covers the whole hold.
+        after = adc.get_snapshot()
+        elapsed = after.timestamp - before.timestamp
+        requests = after.requests_filled - before.requests_filled
+        missed = after.missed_requests - before.missed_requests
+        errors = after.errors - before.errors
+        slots = requests + missed
+        miss_ratio = (missed + errors) / slots if slots else 1.0
+        latency = after.latency.since(before.latency).summary()
+        passed = miss_ratio <= self.max_miss_ratio and (self.max_p99 is None or latency['p99'] <= self.max_p99)
+        return CapacityLevel(
+            rate=rate,
+            achieved_rate=requests / elapsed if elapsed > 0 else 0.0,
+            requests=requests,
+            missed=missed,
+            errors=errors,
+            miss_ratio=miss_ratio,
+            p50=latency['p50'],
+            p99=latency['p99'],
+            max=latency['max'],
+            passed=passed
+        )
+
+    def _try(self, rate, on_level):
+        ''' Measure a rate and record the level, returning None if the search should end. '''
+        self.current_rate = rate
+        level = self.measure(rate)
+        if level is None:
+            return None
+        self.levels.append(level)
+        if level.passed:
+            self.capacity = max(self.capacity, rate)
+        if on_level is not None:
+            on_level(level)
+        return level
+
+    def run(self, on_level=None) -> int:
+        '''
+        Run the search until it converges or stop() is called, calling on_level with every
+        measured CapacityLevel. Returns the highest rate that passed, 0 if none did.
+        '''
+        self.stop_event.clear()
+        self.levels = []
+        self.capacity = 0
+        passed, failed = 0, None
+        rate = self.start_rate
+        # Ramp until a level fails or the maximum rate passes.
+        while True:
+            level = self._try(rate, on_level)
+            if level is None:
+                return self.finish()
+            if not level.passed:
+                failed = rate
+                break
+            passed = rate
+            if rate == self.max_rate:
+                return self.finish()
+            rate = min(max(int(rate * self.step), rate + 1), self.max_rate)
+        # Binary search between the last level that passed and the first that failed.
+        while failed - passed > max(1, int(passed * self.resolution)):
+            rate = (passed + failed) // 2
+            level = self._try(rate, on_level)
+            if level is None:
+                return self.finish()
+            if level.passed:
+                passed = rate
+            else:
+                failed = rate
+        return self.finish()
+
+    def finish(self) -> int:
+        ''' End the search, returning the highest rate that passed. '''
+        self.current_rate = None
+        return self.capacity
+
+    def stop(self):
+        ''' Stop the search after the level being measured. '''
+        self.stop_event.set()
+
+    def get_curve(self) -> list:
+        ''' Get the measured levels sorted by rate, the capacity curve. '''
+        return sorted(self.levels, key=lambda level: level.rate)
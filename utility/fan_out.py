@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+              Fan Out
+====================================
+--------------
+Usage Example:
+--------------
+
+from fan_out import FanOutStress, discover_devices
+
+# Find every ADS1115 and MCP23017 on the bus, then drive all of them at 100 requests a second each,
+# interleaved on a single thread.
+devices = discover_devices(backend)
+fan_out = FanOutStress(devices['ads1115'], devices['mcp23017'], requests=100, strategy='interleaved', backend=backend)
+fan_out.start()
+...
+fan_out.stop()
+fan_out.get_report()
+'''
+
+import threading
+import time
+
+from .adc_config import ADC, LatencyHistogram, PacedScheduler
+from .bus_backend import ADS1115_ADDRESSES, MCP23017_ADDRESSES
+from .bus_manager import bus_manager
+from .toggle_stress import ToggleStress
+
+
+# Ways the devices can be driven concurrently.
+STRATEGY_THREADS = 'threads'
+STRATEGY_INTERLEAVED = 'interleaved'
+STRATEGIES = (STRATEGY_THREADS, STRATEGY_INTERLEAVED)
+
+# Key of the report row summing every device.
+AGGREGATE = 'all'
+
+
+def discover_devices(backend) -> dict:
+    '''
+    Scan the bus and sort the responding addresses into ADS1115s, MCP23017s and other devices.
+    Returns None when the bus is not available.
+    '''
+    if not backend.is_available():
+        return None
+    bus = bus_manager.get_bus(backend)
+    with bus:
+        addresses = bus.scan()
+    return {
+        'ads1115': [address for address in addresses if address in ADS1115_ADDRESSES],
+        'mcp23017': [address for address in addresses if address in MCP23017_ADDRESSES],
+        'other': [address for address in addresses if address not in ADS1115_ADDRESSES + MCP23017_ADDRESSES]
+    }
+
+
+def _report(reads, errors, latency, duration) -> dict:
+    ''' Get the throughput over a duration, the error rate and the latency percentiles of one device or all of them. '''
+    report = {
+        'reads': reads,
+        'errors': errors,
+        'error_rate': errors / reads if reads else 0.0,
+        'throughput': reads / duration if duration else 0.0
+    }
+    report.update(latency.summary())
+    return report
+
+
+class FanOutStress:
+    '''
+    This class drives several ADS1115s and MCP23017s on the same bus at once.
+
+    Every ADS1115 is read and every MCP23017 latch is rewritten and read back,
+    without switching a relay, requests times every frequency seconds each.
+    With the threads strategy every device gets its own paced thread, so they
+    contend for the bus lock. With the interleaved strategy one thread paced at
+    the combined rate serves the devices round-robin, so the bus sees the same
+    load without any lock contention. Comparing the two separates the cost of
+    the extra devices from the cost of the threads.
+    '''
+
+    def __init__(self, adc_addresses=(), mcp_addresses=(), requests=100, frequency=1, strategy=STRATEGY_THREADS,
+                 backend=None, **options):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy}, expected one of: {", ".join(STRATEGIES)}')
+        if requests < 1:
+            raise ValueError(f'Requests must be at least 1, got: {requests}')
+        if not adc_addresses and not mcp_addresses:
+            raise ValueError('At least one ADS1115 or MCP23017 address is required.')
+        self.strategy = strategy
+        self.requests = requests
+        self.frequency = frequency
+        self.start_time = None
+        self.end_time = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        threads = strategy == STRATEGY_THREADS
+        self.adcs = {
+            address: ADC(
+                requests=requests if threads else 0, frequency=frequency, backend=backend, autostart=False,
+                address=address, **options
+            )
+            for address in adc_addresses
+        }
+        self.toggles = {
+            address: ToggleStress(rate=requests / frequency if threads else 0, pins=(), backend=backend, address=address)
+            for address in mcp_addresses
+        }
+        devices = len(self.adcs) + len(self.toggles)
+        self.scheduler = None if threads else PacedScheduler(requests * devices, frequency)
+
+    def is_initialized(self) -> bool:
+        ''' Check if every device was initialized. '''
+        return all(adc.is_initialized() for adc in self.adcs.values()) and \
+            all(toggle.is_initialized() for toggle in self.toggles.values())
+
+    def start(self):
+        ''' Start driving every device. '''
+        if not self.is_initialized() or self.start_time is not None:
+            return
+        self.start_time = time.monotonic()
+        if self.scheduler is None:
+            for device in list(self.adcs.values()) + list(self.toggles.values()):
+                device.start()
+            return
+        self._thread = threading.Thread(target=self._interleave_continuous)
+        self._thread.start()
+
+    def _interleave_continuous(self):
+        ''' Serve the devices round-robin, one per slot of the scheduler, until the stop event is set. '''
+        devices = [adc.read_adc for adc in self.adcs.values()] + [toggle.toggle for toggle in self.toggles.values()]
+        self.scheduler.start()
+        position = 0
+        try:
+            while not self._stop_event.is_set() and not self.is_failed():
+                if not self.scheduler.wait_next(self._stop_event):
+                    break
+                devices[position]()
+                position = (position + 1) % len(devices)
+        finally:
+            for toggle in self.toggles.values():
+                toggle.release()
+
+    def is_failed(self) -> bool:
+        ''' Check if the bus was failed on any device. '''
+        return any(adc.faults.bus_failed for adc in self.adcs.values()) or \
+            any(toggle.faults.bus_failed for toggle in self.toggles.values())
+
+    def get_missed(self) -> int:
+        ''' Get the amount of requests whose slot ended before they were issued, over every device. '''
+        if self.scheduler is not None:
+            return self.scheduler.get_missed()
+        return sum(adc.get_missed_requests() for adc in self.adcs.values()) + \
+            sum(toggle.get_snapshot().missed for toggle in self.toggles.values())
+
+    def get_reads(self) -> int:
+        ''' Get the amount of ADC reads and MCP writes over every device. '''
+        return sum(adc.reads for adc in self.adcs.values()) + sum(toggle.writes for toggle in self.toggles.values())
+
+    def get_duration(self) -> float:
+        ''' Get the duration of the run. '''
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def get_report(self) -> dict:
+        '''
+        Get the throughput, error rate and latency percentiles of every device, keyed by its
+        type and address, and of every device together under AGGREGATE.
+        MCP23017 writes that fail their read back count as errors.
+        '''
+        duration = self.get_duration()
+        report = {}
+        total = LatencyHistogram()
+        reads = errors = 0
+        for address, adc in self.adcs.items():
+            report[('ads1115', address)] = _report(adc.reads, adc.errors, adc.latency, duration)
+            reads, errors = reads + adc.reads, errors + adc.errors
+            total.add(adc.latency)
+        for address, toggle in self.toggles.items():
+            failed = toggle.errors + toggle.mcp.get_verify_faults()
+            report[('mcp23017', address)] = _report(toggle.writes, failed, toggle.latency, duration)
+            reads, errors = reads + toggle.writes, errors + failed
+            total.add(toggle.latency)
+        report[(AGGREGATE, None)] = _report(reads, errors, total, duration)
+        return report
+
+    def stop(self):
+        ''' Stop driving every device. '''
+        self._stop_event.set()
+        if self.start_time is not None and self.end_time is None:
+            self.end_time = time.monotonic()
+        if self._thread is not None:
+            self._thread.join()
+        for device in list(self.adcs.values()) + list(self.toggles.values()):
+            device.stop()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+           Input Monitor
+====================================
+--------------
+Usage Example:
+--------------
+
+from input_monitor import InputMonitor
+
+# Log every change of the TLS and panel power inputs, woken by the MCP23017 interrupt pin on BCM 17,
+# along with the mode the relays were in.
+monitor = InputMonitor(mcp=mcp, interrupt_pin=17)
+monitor.start()
+...
+monitor.stop()
+for edge in monitor.get_edges():
+    print(edge.timestamp, edge.pin, edge.value, edge.mode, edge.switching)
+'''
+
+from collections import deque, namedtuple
+import threading
+import time
+
+from .adc_config import LatencyHistogram
+from .bus_backend import (
+    MCP23017_GPINTENA, MCP23017_INTCAPA, MCP23017_INTCONA, MCP23017_INTFA, MCP23017_IOCON,
+    MCP23017_IOCON_MIRROR, RegisterDevice
+)
+from .bus_faults import RetryPolicy
+from .bus_manager import bus_manager
+from .mcp_config import INPUT_PINS, MCP, PINS
+
+
+class InputEdge(namedtuple('InputEdge', ('timestamp', 'pin', 'value', 'mode', 'switching', 'captured'))):
+    '''
+    This class is one logged change of an input pin.
+
+    timestamp is when the interrupt was seen on the monotonic clock and mode
+    the mode the relays were in at that time. switching is True if the relays
+    were being switched at any time the change could have happened, up to the
+    settle time before it. captured is False when the
+    change was only seen on GPIO because it came after the interrupt was
+    raised, for example the end of a pulse too short to be serviced in time.
+    '''
+
+    __slots__ = ()
+
+
+class InputMonitor:
+    '''
+    This class logs the changes of the MCP23017 input pins using interrupt-on-change.
+
+    Every monitored pin is enabled in GPINTEN and compared against its last
+    level through INTCON, with IOCON.MIRROR tying both ports to one interrupt
+    pin. With interrupt_pin set the bus is only read when that GPIO says an
+    interrupt is pending. Otherwise INTF is polled every poll_interval
+    seconds, and INTCAP and GPIO are only read once it is set. Every poll is
+    a bus read whether or not an input changed, so the interval is kept
+    coarse by default and the interrupt pin should be used where it is wired.
+
+    A failed read is waited out under the retry policy's backoff, so a bus
+    fault with the interrupt still pending does not spin the thread.
+
+    The monitor only reads the inputs, so it can run alongside a sequence on
+    the same MCP, whose mode is logged with every edge. A change is only
+    known to have happened since the inputs were last read, so it is matched
+    against the switch windows the MCP keeps rather than whether it happens
+    to be switching when the change is serviced. A window still counts for
+    settle seconds after its last pin is written, while the relay contacts
+    move and bounce.
+    '''
+
+    def __init__(self, pins=None, mcp=None, backend=None, interrupt_pin=None, poll_interval=0.05, max_edges=100000,
+                 retry=None, settle=0.02):
+        pins = INPUT_PINS if pins is None else tuple(pins)
+        for pin in pins:
+            if pin not in INPUT_PINS:
+                raise ValueError(f'Unknown input pin: {pin}, expected one of: {", ".join(INPUT_PINS)}')
+        self.pins = pins
+        self.mask = sum(1 << PINS[pin] for pin in pins)
+        if poll_interval <= 0:
+            raise ValueError(f'Poll interval must be longer than 0 seconds, got: {poll_interval}')
+        self.poll_interval = poll_interval
+        if settle < 0:
+            raise ValueError(f'Settle time cannot be negative, got: {settle}')
+        self.settle = settle
+        self.retry = retry or RetryPolicy()
+        self.interrupt_pin = interrupt_pin
+        self.edges = deque(maxlen=max_edges)
+        self.edge_counts = dict.fromkeys(pins, 0)
+        self.uncaptured = 0
+        self.interrupts = 0
+        self.bus_reads = 0
+        self.errors = 0
+        self.last_error = None
+        self.levels = 0
+        self.start_time = None
+        self.latency = LatencyHistogram()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._interrupt = None
+        self.mcp = mcp or MCP(backend=backend)
+        if not self.mcp.is_initialized():
+            return
+        self._bus = bus_manager.get_bus(self.mcp.backend)
+        self._registers = RegisterDevice(self._bus, self.mcp.address)
+        if interrupt_pin is not None:
+            self._interrupt = self._bus.get_device(
+                ('mcp23017', self.mcp.address, 'interrupt', interrupt_pin),
+                lambda: self.mcp.backend.create_interrupt_pin(self._bus, interrupt_pin, self.mcp.address)
+            )
+
+    def is_initialized(self) -> bool:
+        ''' Check if the MCP hardware was initialized. '''
+        return self.mcp.is_initialized()
+
+    def _update(self, register, mask, values):
+        ''' Set the masked bits of a 16-bit register pair, leaving the others as they are. '''
+        current = int.from_bytes(self._registers.read(register, 2), 'little')
+        self._registers.write(register, ((current & ~mask) | (values & mask)).to_bytes(2, 'little'))
+
+    def start(self):
+        ''' Enable interrupt-on-change for the monitored pins and start the monitoring thread. '''
+        if not self.is_initialized() or self._thread is not None:
+            return
+        with self._bus:
+            iocon = self._registers.read(MCP23017_IOCON, 1)[0]
+            self._registers.write(MCP23017_IOCON, bytes([iocon | MCP23017_IOCON_MIRROR]))
+            self._update(MCP23017_INTCONA, self.mask, 0)
+            self._update(MCP23017_GPINTENA, self.mask, self.mask)
+            # Reading INTCAP and GPIO clears anything already pending and gives the starting levels.
+            self.levels = int.from_bytes(self._registers.read(MCP23017_INTCAPA, 4)[2:4], 'little')
+        self.start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._monitor_continuous)
+        self._thread.start()
+
+    def _monitor_continuous(self):
+        ''' Service interrupts until the stop event is set, backing off after every failed read. '''
+        failures = 0
+        last_read = self.start_time
+        while not self._stop_event.is_set():
+            if self._interrupt is not None:
+                if not self._interrupt.wait(0.1):
+                    continue
+            elif self._stop_event.wait(self.poll_interval):
+                break
+            timestamp = time.monotonic()
+            mode = self.mcp.get_mode()
+            # The interrupt wakes the thread as soon as an input changes, a poll only bounds it by the last read.
+            since = timestamp if self._interrupt is not None else last_read
+            try:
+                if self._interrupt is not None:
+                    registers = self._registers.read(MCP23017_INTFA, 6)
+                    self.bus_reads += 1
+                else:
+                    registers = self._registers.read(MCP23017_INTFA, 2)
+                    self.bus_reads += 1
+                    if not int.from_bytes(registers, 'little') & self.mask:
+                        failures = 0
+                        last_read = timestamp
+                        continue
+                    registers += self._registers.read(MCP23017_INTCAPA, 4)
+                    self.bus_reads += 1
+            except IOError as error:
+                self.errors += 1
+                self.last_error = str(error)
+                failures += 1
+                self._stop_event.wait(self.retry.delay(failures))
+                continue
+            failures = 0
+            self.interrupts += 1
+            now = time.monotonic()
+            self.latency.record(now - timestamp)
+            switching = self.mcp.switched_between(since - self.settle, now)
+            last_read = timestamp
+            flags, captured, levels = (int.from_bytes(registers[index:index + 2], 'little') for index in (0, 2, 4))
+            self._log(timestamp, mode, switching, flags, captured, levels)
+
+    def _log(self, timestamp, mode, switching, flags, captured, levels):
+        ''' Log the edge captured by the interrupt, then any change seen only on GPIO. '''
+        for pin in self.pins:
+            bit = 1 << PINS[pin]
+            if flags & bit and (captured ^ self.levels) & bit:
+                self._record(InputEdge(timestamp, pin, bool(captured & bit), mode, switching, True))
+                self.levels ^= bit
+            if (levels ^ self.levels) & bit:
+                self._record(InputEdge(timestamp, pin, bool(levels & bit), mode, switching, False))
+                self.levels ^= bit
+                self.uncaptured += 1
+
+    def _record(self, edge):
+        ''' Add an edge to the log. '''
+        self.edges.append(edge)
+        self.edge_counts[edge.pin] += 1
+
+    def get_edges(self) -> list:
+        ''' Get the logged edges, oldest first. '''
+        return list(self.edges)
+
+    def get_levels(self) -> dict:
+        ''' Get the last known level of every monitored pin. '''
+        return {pin: bool(self.levels & (1 << PINS[pin])) for pin in self.pins}
+
+    def get_report(self) -> dict:
+        '''
+        Get the edges of every pin, split by whether the relays were switching, and the
+        interrupts serviced, the bus reads spent on them and the service latency percentiles.
+        '''
+        edges = self.get_edges()
+        report = {
+            'edges': dict(self.edge_counts),
+            'switching': sum(1 for edge in edges if edge.switching),
+            'uncaptured': self.uncaptured,
+            'interrupts': self.interrupts,
+            'bus_reads': self.bus_reads,
+            'errors': self.errors
+        }
+        report.update(self.latency.summary())
+        return report
+
+    def stop(self):
+        ''' Stop the monitoring thread and disable interrupt-on-change for the monitored pins. '''
+        self._stop_event.set()
+        if self._thread is None:
+            return
+        self._thread.join()
+        try:
+            with self._bus:
+                self._update(MCP23017_GPINTENA, self.mask, 0)
+        except IOError:
+            pass
@@ -6,49 +6,116 @@
 ====================================
 '''
 
-import threading
+from collections import deque
 import time
-try:
-    import board
-    import busio
-    from digitalio import Direction
-    from adafruit_mcp230xx.mcp23017 import MCP23017
-except (ImportError, NotImplementedError):
-    busio = None
-    board = None
-    MCP23017 = None
 
+from .bus_backend import MCP23017_ADDRESS, MCP23017_GPIOA, MCP23017_OLATA, Direction, RegisterDevice, get_backend
+from .bus_manager import bus_manager
+from .relay_sequences import GAP_CYCLE, GAP_PIN, compile_sequence, load_definitions
+from .sequencer import Sequencer
 
-class MCP:
+
+# Pins, modes and sequences are declared in settings/sequences.json.
+DEFINITIONS = load_definitions()
+PINS = DEFINITIONS.pins
+MODES = {mode: {pin: value for pin, _, value in pins} for mode, pins in DEFINITIONS.modes.items()}
+SEQUENCES = DEFINITIONS.sequences
+OUTPUT_PINS = DEFINITIONS.outputs
+INPUT_PINS = DEFINITIONS.inputs
+
+# Output latch bits of the output pins and the mode pins, and the bits each mode sets, with GPIOA in the low byte.
+OUTPUT_PINS_MASK = DEFINITIONS.outputs_mask()
+MODE_PINS_MASK = DEFINITIONS.mode_pins_mask()
+MODE_MASKS = {mode: DEFINITIONS.mode_mask(mode) for mode in MODES}
+# Switch windows kept for attributing input edges, far more than switch between two polls of the inputs.
+SWITCH_HISTORY = 1000
+
+
+class DelayStats:
     '''
-    This class is used to interface with the MCP23017 I/O Expander.
+    This class compares the requested and actual length of one kind of timed step.
+
+    An error is positive for a step that overslept and negative for one that woke
+    early, the worst error is the one furthest from 0 either way.
     '''
 
     def __init__(self):
+        self.count = 0
+        self.total_error = 0.0
+        self.worst_error = None
+
+    def record(self, requested, actual):
+        ''' Record a step that was requested to take a delay and actually took another. '''
+        error = actual - requested
+        self.count += 1
+        self.total_error += error
+        if self.worst_error is None or abs(error) > abs(self.worst_error):
+            self.worst_error = error
+
+    def report(self) -> dict:
+        ''' Get the number of steps and their mean and worst timing error in milliseconds. '''
+        return {
+            'count': self.count,
+            'mean': self.total_error / self.count * 1000 if self.count else 0.0,
+            'worst': self.worst_error * 1000 if self.worst_error is not None else 0.0
+        }
+
+
+class MCP:
+    '''
+    This class is used to interface with the MCP23017 I/O Expander at an address.
+
+    Every MCP at the same address shares its pins and sequencer. A new one only
+    rests the relays if no sequence is running or queued on the sequencer.
+    '''
+
+    def __init__(self, backend=None, address=MCP23017_ADDRESS):
+        self.address = address
         self.pin_delay = None
         self.cycle_delay = None
         self.mode = None
+        self.atomic = False
+        self.verify = False
+        self.verify_faults = 0
+        self.last_verify_fault = None
+        self.switching = False
+        self.switches = deque(maxlen=SWITCH_HISTORY)
+        self.overruns = 0
+        self.max_overrun = 0.0
+        self.last_error = None
+        self.timing = {'pin': DelayStats(), 'cycle': DelayStats()}
+        self.sequencer = Sequencer()
         self._hardware_initialized = False
-        if busio is None or board is None or MCP23017 is None:
+        self.backend = backend or get_backend()
+        if not self.backend.is_available():
             return
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._mcp = MCP23017(i2c)
+        self._bus = bus_manager.get_bus(self.backend)
+        self._registers = RegisterDevice(self._bus, self.address)
+        # A device that does not answer while it is set up is left uninitialized, with the error kept in last_error.
         self._hardware_initialized = True
-        self.pins = {
-            'motor': self._mcp.get_pin(0),
-            'v1': self._mcp.get_pin(1),
-            'v2': self._mcp.get_pin(2),
-            'v5': self._mcp.get_pin(3),
-            'shutdown': self._mcp.get_pin(4),
-            'tls': self._mcp.get_pin(8),
-            'panel_power': self._mcp.get_pin(10)
-        }
-        self.mode_thread = None
-        self.cycle_thread = None
-        self._stop_mode_thread = threading.Event()
-        self._stop_cycle_thread = threading.Event()
+        try:
+            self._mcp = self._bus.get_device(
+                ('mcp23017', self.address), lambda: self.backend.create_mcp(self._bus, address=self.address)
+            )
+            self.pins = self._bus.get_device(('mcp23017', self.address, 'pins'), self.create_pins)
+            self.sequencer = self._bus.get_device(('mcp23017', self.address, 'sequencer'), Sequencer)
+            self._olat = int.from_bytes(self._registers.read(MCP23017_OLATA, 2), 'little')
+            # The sequencer is shared by every MCP at the address, one may be running a sequence on it right now.
+            if not self.sequencer.is_busy():
+                self.set_mode('rest')
+        except IOError as error:
+            self._hardware_initialized = False
+            self.last_error = f'Initialization: {error}'
+
+    def create_pins(self) -> dict:
+        ''' Create the pins and set their directions, this only runs the first time the MCP23017 is used. '''
+        self.pins = {pin: self._mcp.get_pin(number) for pin, number in PINS.items()}
         self.setup_pins()
-        self.set_mode('rest')
+        return self.pins
+
+    def is_initialized(self) -> bool:
+        ''' Check if the MCP hardware was initialized. '''
+        return self._hardware_initialized
 
     def set_pin_delay(self, pin_delay):
         ''' Set the delay between each pin setup.'''
@@ -58,125 +125,266 @@ class MCP:
         ''' Set the delay between each cycle. '''
         self.cycle_delay = cycle_delay
 
-    def sleep_with_check(self, delay):
-        ''' Sleep for the specified delay, checking for a stop event. '''
-        total_time = 0
-        while total_time < delay and not self._stop_cycle_thread.is_set():
-            time.sleep(0.01)
-            total_time += 0.01
+    def set_atomic(self, atomic):
+        '''
+        Switch every pin of a mode with a single write of the output latch instead of
+        one pin at a time with the pin delay between each.
+        '''
+        self.atomic = atomic
+
+    def set_verify(self, verify):
+        '''
+        Read the GPIO and output latch registers back every time the values are requested,
+        flagging any difference from the cached output latch as a bus fault.
+        '''
+        self.verify = verify
+
+    def get_bus_transactions(self) -> int:
+        ''' Return the number of transactions made on the shared bus. '''
+        if not self._hardware_initialized:
+            return 0
+        return self._bus.transactions
+
+    def wait_until(self, deadline) -> bool:
+        ''' Wait until a monotonic deadline, returning False if the sequence was stopped first. '''
+        stop_event = self.sequencer.stop_event
+        remaining = deadline - time.monotonic()
+        while remaining > 0:
+            if stop_event.wait(remaining):
+                return False
+            remaining = deadline - time.monotonic()
+        return not stop_event.is_set()
 
     def setup_pins(self):
         ''' Setup the MCP23017 pins. '''
         if self._hardware_initialized:
-            for pin in ['motor', 'v1', 'v2', 'v5', 'shutdown']:
+            for pin in DEFINITIONS.outputs:
                 self.pins[pin].direction = Direction.OUTPUT
-            for pin in ['tls', 'panel_power']:
+            for pin in DEFINITIONS.inputs:
                 self.pins[pin].direction = Direction.INPUT
 
-    def thread_mode(self, mode):
-        ''' Run the mode in a new thread. '''
-        self._stop_mode_thread.clear()
-        self.mode_thread = threading.Thread(target=self.set_mode, args=(mode,))
-        self.mode_thread.start()
+    def write_outputs(self, mask, values):
+        ''' Set the masked output pins to the given values with a single write of the cached output latch. '''
+        with self._bus:
+            olat = (self._olat & ~mask) | (values & mask)
+            self._registers.write(MCP23017_OLATA, olat.to_bytes(2, 'little'))
+            self._olat = olat
+
+    def set_pin(self, pin, value):
+        '''
+        Set a single output pin through the cached output latch. Going through the Adafruit pin
+        would read GPIO first, clearing any input change the input monitor has not serviced yet.
+        '''
+        bit = 1 << PINS[pin]
+        self.write_outputs(bit, bit if value else 0)
+
+    def verify_outputs(self) -> bool:
+        ''' Read GPIO and OLAT back in one burst and compare the output pins with the cached output latch. '''
+        with self._bus:
+            expected = self._olat & OUTPUT_PINS_MASK
+            try:
+                registers = self._registers.read(MCP23017_GPIOA, 4)
+            except IOError as error:
+                fault = f'Read back failed: {error}'
+            else:
+                gpio = int.from_bytes(registers[0:2], 'little') & OUTPUT_PINS_MASK
+                olat = int.from_bytes(registers[2:4], 'little') & OUTPUT_PINS_MASK
+                if gpio == expected and olat == expected:
+                    return True
+                fault = f'Expected {expected:#06x}, read GPIO {gpio:#06x} and OLAT {olat:#06x}'
+        self.verify_faults += 1
+        self.last_verify_fault = fault
+        return False
 
     def set_mode(self, mode):
         ''' Set the pins for the specified mode. '''
-        modes = {
-            'run': {'motor': True, 'v1': True, 'v2': False, 'v5': True},
-            'rest': {'motor': False, 'v1': False, 'v2': False, 'v5': False},
-            'purge': {'motor': True, 'v1': False, 'v2': True, 'v5': False},
-            'burp': {'motor': False, 'v1': False, 'v2': False, 'v5': True},
-            'bleed': {'motor': False, 'v1': False, 'v2': True, 'v5': True},
-            'leak': {'motor': False, 'v1': True, 'v2': True, 'v5': True}
-        }
-        if mode in modes:
+        if mode in MODES:
             self.mode = mode
-            for pin, value in modes[mode].items():
-                if self._stop_cycle_thread.is_set():
-                    break
-                self.pins[pin].value = value
-                if self.pin_delay:
-                    self.sleep_with_check(self.pin_delay)
+            self._begin_switch()
+            try:
+                if self.atomic:
+                    self.write_outputs(MODE_PINS_MASK, MODE_MASKS[mode])
+                    return
+                step_start = time.monotonic()
+                for pin, value in MODES[mode].items():
+                    if self.sequencer.stop_event.is_set():
+                        break
+                    self.set_pin(pin, value)
+                    if not self.pin_delay:
+                        continue
+                    # The next pin's slot starts at this deadline, not when we woke, so oversleep never adds up.
+                    deadline = step_start + self.pin_delay
+                    now = time.monotonic()
+                    if now > deadline:
+                        deadline = now
+                    elif not self.wait_until(deadline):
+                        break
+                    self.timing['pin'].record(self.pin_delay, time.monotonic() - step_start)
+                    step_start = deadline
+            finally:
+                self._end_switch()
         else:
             print(f'Invalid mode: {mode}')
 
+    def compile_sequence(self, sequence) -> tuple:
+        '''
+        Compile a sequence, the key of a declared sequence or a list of modes, into a timing plan
+        for the current delays and atomic setting.
+        '''
+        steps = SEQUENCES[sequence].steps if isinstance(sequence, str) else [(mode, None) for mode in sequence]
+        return compile_sequence(DEFINITIONS, steps, self.pin_delay or 0, self.cycle_delay or 0, self.atomic)
+
     def set_sequence(self, sequence):
-        ''' Set the pins for the specified sequence. '''
+        ''' Set the pins for the specified sequence, compiling it first. '''
+        self.run_plan(self.compile_sequence(sequence))
+
+    def run_plan(self, plan):
+        '''
+        Replay a compiled timing plan. Each mode owns a slot of its hold from when it starts,
+        a mode that takes longer than its slot to switch is counted as an overrun. A late step
+        pushes every later one back rather than cutting them short to catch up.
+        '''
         try:
-            for mode in sequence:
-                if self._stop_cycle_thread.is_set():
+            start = time.monotonic()
+            shift = 0.0
+            previous = mode_start = start
+            for step in plan:
+                deadline = start + step.offset + shift
+                now = time.monotonic()
+                if step.gap == GAP_CYCLE and step.delay and now > mode_start + step.delay:
+                    self.record_overrun(now - mode_start - step.delay)
+                if now > deadline:
+                    shift += now - deadline
+                    deadline = now
+                elif not self.wait_until(deadline):
                     break
-                self.thread_mode(mode)
-                if self.cycle_delay:
-                    self.sleep_with_check(self.cycle_delay)
-        except KeyboardInterrupt:
-            self.set_mode('rest')
-        finally:
-            self.set_mode('rest')
+                if self.sequencer.stop_event.is_set():
+                    break
+                if step.delay:
+                    if step.gap == GAP_CYCLE:
+                        self.timing['cycle'].record(step.delay, time.monotonic() - mode_start)
+                    elif step.gap == GAP_PIN:
+                        self.timing['pin'].record(step.delay, time.monotonic() - previous)
+                previous = deadline
+                if not step.mask:
+                    self._end_switch()
+                    continue
+                if step.gap != GAP_PIN:
+                    self.mode = step.mode
+                    self._begin_switch()
+                    mode_start = deadline
+                self.write_outputs(step.mask, step.values)
+            self._end_switch()
             self.mode = 'Complete'
+        except IOError as error:
+            self._end_switch()
+            self.last_error = f'{self.mode}: {error}'
+            self.mode = None
+
+    def _begin_switch(self):
+        ''' Open a switch window when the first pin of a mode is written. '''
+        if not self.switching:
+            self.switches.append([time.monotonic(), None])
+            self.switching = True
 
-    def thread_sequence(self, sequence):
-        ''' Run the specified sequence in a new thread. '''
+    def _end_switch(self):
+        ''' Close the open switch window once every pin of the mode is written. '''
+        if self.switching:
+            self.switches[-1][1] = time.monotonic()
+            self.switching = False
+
+    def record_overrun(self, overrun):
+        ''' Record a mode that took longer than its slot, the counters are reported once the sequence ends. '''
+        self.overruns += 1
+        self.max_overrun = max(self.max_overrun, overrun)
+
+    def queue_sequence(self, sequence):
+        ''' Queue the specified sequence on the sequencer worker. '''
         if not self._hardware_initialized:
             self.mode = None
-        self._stop_cycle_thread.clear()
-        self.cycle_thread = threading.Thread(target=self.set_sequence, args=(sequence,))
-        self.cycle_thread.start()
-
-    def get_values(self) -> str:
-        ''' Return the values of the motor, v1, v2, and v5 pins. '''
-        motor = self.pins['motor'].value
-        v1 = self.pins['v1'].value
-        v2 = self.pins['v2'].value
-        v5 = self.pins['v5'].value
-        return motor, v1, v2, v5
+            return
+        self.mode = 'rest'
+        self.sequencer.submit(self.run_plan, self.compile_sequence(sequence))
+
+    def get_values(self) -> tuple:
+        '''
+        Return the values of the motor, v1, v2, and v5 pins from the cached output latch,
+        only touching the bus when verify is set.
+        '''
+        if not self._hardware_initialized:
+            return None, None, None, None
+        if self.verify:
+            self.verify_outputs()
+        olat = self._olat
+        return tuple(bool(olat & (1 << PINS[pin])) for pin in ('motor', 'v1', 'v2', 'v5'))
+
+    def get_verify_faults(self) -> int:
+        ''' Return the number of read backs that did not match the cached output latch. '''
+        return self.verify_faults
 
     def get_mode(self) -> str:
         ''' Return the current mode. '''
         return self.mode
 
+    def is_switching(self) -> bool:
+        ''' Return True while the pins of a mode are being written. '''
+        return self.switching
+
+    def switched_between(self, start, end) -> bool:
+        '''
+        Return True if the pins of a mode were being written at any time between two monotonic times.
+        A change seen between two reads of the inputs can then be matched to a switch that already ended.
+        '''
+        for switch_start, switch_end in reversed(tuple(self.switches)):
+            if switch_end is not None and switch_end < start:
+                return False
+            if switch_start <= end:
+                return True
+        return False
+
+    def run_sequence(self, name):
+        ''' Queue a sequence declared in the sequence definitions by its key. '''
+        self.queue_sequence(name)
+
     def run_cycle(self):
         ''' Set the sequence for a run cycle. '''
-        self.thread_sequence(
-            ['run', 'rest'] + ['purge', 'burp'] * 6 + ['rest']
-        )
+        self.run_sequence('run_cycle')
 
     def functionality_test(self):
         ''' Set the sequence for a functionality test. '''
-        self.thread_sequence(
-            ['run', 'purge'] * 5 + ['rest']
-        )
+        self.run_sequence('functionality_test')
 
     def test_mode(self):
         ''' Set the sequence for a test mode. '''
-        self.thread_sequence(
-            ['run', 'rest'] * 2 + ['purge', 'bleed']
-        )
+        self.run_sequence('test_mode')
 
     def leak_test(self):
         ''' Set the sequence for a leak test. '''
-        self.thread_sequence(
-            ['leak']
-        )
+        self.run_sequence('leak_test')
+
+    def get_timing_error(self) -> dict:
+        ''' Return the mean and worst difference between the actual and requested pin and cycle delays. '''
+        return {kind: stats.report() for kind, stats in self.timing.items()}
+
+    def get_overruns(self) -> int:
+        ''' Return the number of modes that took longer than their slot. '''
+        return self.overruns
 
     def stop_cycle(self):
-        ''' Stop the current sequence. '''
+        ''' Stop the current sequence, preempting the running mode, then set to rest. '''
         print('Stopping sequence')
-        if self.cycle_thread and self.cycle_thread.is_alive():
-            self._stop_cycle_thread.set()
-            self.cycle_thread.join()
-            self.cycle_thread = None
-        self.stop_mode()
+        self.sequencer.stop()
         self.set_rest()
 
-    def stop_mode(self):
-        ''' Stop the current mode. '''
-        if self.mode_thread and self.mode_thread.is_alive():
-            self._stop_mode_thread.set()
-            self.mode_thread.join()
-            self.cycle_thread = None
-
     def set_rest(self):
-        ''' Set to rest mode. '''
-        for pin in ['motor', 'v1', 'v2', 'v5']:
-            self.pins[pin].value = False
\ No newline at end of file
+        ''' Set to rest mode, a bus error is kept in last_error so the relays can be rested while stopping. '''
+        if not self._hardware_initialized:
+            return
+        try:
+            if self.atomic:
+                self.write_outputs(MODE_PINS_MASK, MODE_MASKS['rest'])
+                return
+            for pin in ['motor', 'v1', 'v2', 'v5']:
+                self.set_pin(pin, False)
+        except IOError as error:
+            self.last_error = f'rest: {error}'
\ No newline at end of file
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            Mixed Stress
+====================================
+--------------
+Usage Example:
+--------------
+
+from mixed_stress import MixedStress
+
+# Read the ADC 100 times a second while the MCP runs a run cycle on the same bus.
+mixed = MixedStress(requests=100, frequency=1, sequence='run_cycle', cycle_delay=5)
+mixed.start()
+'''
+
+import threading
+
+from .adc_config import ADC, ReadStats
+from .mcp_config import MCP
+
+
+class ModeStats(ReadStats):
+    ''' This class holds the ADC reads, errors and latency seen while the MCP was in one mode. '''
+
+    def __init__(self):
+        super().__init__()
+        self.time = 0.0
+
+
+class MixedStress:
+    '''
+    This class runs the ADC read loop while the MCP runs a relay sequence on the same bus.
+
+    Every ADC read is attributed to the MCP mode active when it completed, and to
+    whether the relays of that mode were still being switched or were steady.
+    '''
+
+    def __init__(self, requests=100, frequency=1, sequence='run_cycle', pin_delay=0, cycle_delay=1, backend=None):
+        self.sequence = sequence
+        self.adc = ADC(requests=requests, frequency=frequency, backend=backend, autostart=False)
+        self.mcp = MCP(backend=self.adc.backend)
+        self.mcp.set_pin_delay(pin_delay)
+        self.mcp.set_cycle_delay(cycle_delay)
+        self.mode_stats = {}
+        self._lock = threading.Lock()
+        self._current = None
+        self._current_since = None
+        self.adc.add_sample_listener(self.record_sample)
+
+    def is_initialized(self) -> bool:
+        ''' Check if both the ADC and the MCP hardware were initialized. '''
+        return self.adc.is_initialized() and self.mcp.is_initialized()
+
+    def record_sample(self, timestamp, payload, latency, error, channel):
+        ''' Attribute an ADC read to the active MCP mode and phase. '''
+        key = (self.mcp.get_mode() or 'None', 'switching' if self.mcp.is_switching() else 'steady')
+        with self._lock:
+            stats = self.mode_stats.get(key)
+            if stats is None:
+                stats = self.mode_stats[key] = ModeStats()
+            if key != self._current:
+                if self._current is not None:
+                    self.mode_stats[self._current].time += timestamp - self._current_since
+                self._current = key
+                self._current_since = timestamp
+            stats.record(int(latency * 1_000_000_000), error)
+
+    def start(self):
+        ''' Start the ADC read loop, then the MCP sequence. '''
+        self.adc.start()
+        self.mcp.run_sequence(self.sequence)
+
+    def is_complete(self) -> bool:
+        ''' Check if the MCP sequence has finished, either completed or stopped by a bus error. '''
+        return self.mcp.get_mode() in ('Complete', None)
+
+    def is_failed(self) -> bool:
+        ''' Check if the MCP sequence was stopped by a bus error, which is kept in the MCP last_error. '''
+        return self.mcp.get_mode() is None
+
+    def stop(self):
+        ''' Stop the MCP sequence and the ADC read loop, the read loop is stopped even if the MCP is not. '''
+        try:
+            self.mcp.stop_cycle()
+        finally:
+            self.adc.stop()
+        with self._lock:
+            if self._current is not None:
+                self.mode_stats[self._current].time += self.adc.end_time - self._current_since
+                self._current = None
+
+    def get_report(self) -> dict:
+        ''' Get the ADC statistics for every MCP mode and phase seen so far. '''
+        with self._lock:
+            return {key: stats.report(stats.time) for key, stats in self.mode_stats.items()}
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+          Relay Sequences
+====================================
+--------------
+Usage Example:
+--------------
+
+from relay_sequences import compile_sequence, load_definitions
+
+# Load the pins, modes and sequences once, then compile a sequence for the delays of a run.
+definitions = load_definitions()
+plan = compile_sequence(definitions, definitions.sequences['run_cycle'].steps, pin_delay=0.25, cycle_delay=5)
+'''
+
+from collections import namedtuple
+import json
+import os
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'settings', 'sequences.json')
+
+# The delay a plan step waited out after the step before it.
+GAP_PIN = 'pin'
+GAP_CYCLE = 'cycle'
+
+# Mode every sequence ends in.
+REST_MODE = 'rest'
+
+
+class Sequence(namedtuple('Sequence', ('name', 'steps'))):
+    ''' This class is a named sequence, its steps are (mode, hold) pairs with hold None for the cycle delay. '''
+
+    __slots__ = ()
+
+
+class Definitions(namedtuple('Definitions', ('pins', 'outputs', 'inputs', 'modes', 'sequences'))):
+    '''
+    This class holds the loaded pin map, modes and sequences.
+
+    Every mode is a tuple of (pin, bit, value) in the order its pins are
+    switched, with bit the output latch bit of the pin.
+    '''
+
+    __slots__ = ()
+
+    def mode_mask(self, mode) -> int:
+        ''' Get the output latch bits a mode sets. '''
+        return sum(bit for _, bit, value in self.modes[mode] if value)
+
+    def mode_pins_mask(self) -> int:
+        ''' Get the output latch bits of every pin switched by a mode. '''
+        return sum({bit for pins in self.modes.values() for _, bit, _ in pins})
+
+    def outputs_mask(self) -> int:
+        ''' Get the output latch bits of the output pins. '''
+        return sum(1 << self.pins[pin] for pin in self.outputs)
+
+
+class PlanStep(namedtuple('PlanStep', ('offset', 'mask', 'values', 'mode', 'gap', 'delay'))):
+    '''
+    This class is one step of a compiled plan.
+
+    At offset seconds from the start of the plan the masked output latch bits
+    are set to values, a step with an empty mask only marks the end of a mode
+    switching. gap is the kind of delay waited since the step before and delay
+    its requested length, a GAP_CYCLE step starts mode.
+    '''
+
+    __slots__ = ()
+
+
+def _expand(steps, modes, path):
+    ''' Expand repeat blocks into a flat list of (mode, hold) pairs, checking every mode exists. '''
+    expanded = []
+    for step in steps:
+        if isinstance(step, str):
+            step = {'mode': step}
+        if 'repeat' in step:
+            expanded += _expand(step['steps'], modes, path) * int(step['repeat'])
+            continue
+        mode = step['mode']
+        if mode not in modes:
+            raise ValueError(f'{path}: unknown mode {mode!r} in a sequence, expected one of: {", ".join(modes)}')
+        expanded.append((mode, step.get('hold')))
+    return expanded
+
+
+def parse_definitions(data, path='<definitions>') -> Definitions:
+    ''' Check and convert a decoded definitions document. '''
+    pins = {pin: int(number) for pin, number in data['pins'].items()}
+    for pin, number in pins.items():
+        if not 0 <= number <= 15:
+            raise ValueError(f'{path}: pin {pin!r} must be numbered 0-15, got: {number}')
+    for pin in data['outputs'] + data.get('inputs', []):
+        if pin not in pins:
+            raise ValueError(f'{path}: unknown pin {pin!r}, expected one of: {", ".join(pins)}')
+    modes = {}
+    for mode, values in data['modes'].items():
+        for pin in values:
+            if pin not in data['outputs']:
+                raise ValueError(f'{path}: mode {mode!r} sets {pin!r}, which is not an output pin')
+        modes[mode] = tuple((pin, 1 << pins[pin], bool(value)) for pin, value in values.items())
+    if REST_MODE not in modes:
+        raise ValueError(f'{path}: a {REST_MODE!r} mode is required, every sequence ends in it')
+    sequences = {
+        key: Sequence(sequence.get('name', key), tuple(_expand(sequence['steps'], modes, path)))
+        for key, sequence in data['sequences'].items()
+    }
+    return Definitions(pins, tuple(data['outputs']), tuple(data.get('inputs', ())), modes, sequences)
+
+
+def load_definitions(path=DEFAULT_PATH) -> Definitions:
+    ''' Load pins, modes and sequences from a JSON file, or a YAML file when PyYAML is installed. '''
+    with open(path) as file:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError('PyYAML is required to load YAML sequences, use JSON instead.')
+            data = yaml.safe_load(file)
+        else:
+            data = json.load(file)
+    return parse_definitions(data, path)
+
+
+def compile_sequence(definitions, steps, pin_delay=0, cycle_delay=0, atomic=False) -> tuple:
+    '''
+    Compile (mode, hold) steps, followed by rest, into a flat plan of PlanSteps.
+
+    Each mode owns a slot of its hold, or the cycle delay, from when it starts.
+    Its pins are written one at a time pin_delay apart, or all at once when
+    atomic, and the next mode starts when the slot ends or, if switching the
+    pins takes longer, when they are all switched.
+    '''
+    pins_mask = definitions.mode_pins_mask()
+    plan = []
+    start = 0.0
+    previous_hold = None
+    for mode, hold in list(steps) + [(REST_MODE, 0)]:
+        hold = cycle_delay if hold is None else hold
+        gap = GAP_CYCLE if previous_hold is not None else None
+        if atomic:
+            plan.append(PlanStep(start, pins_mask, definitions.mode_mask(mode), mode, gap, previous_hold))
+            plan.append(PlanStep(start, 0, 0, mode, None, None))
+            switched = start
+        else:
+            offset = start
+            for index, (_, bit, value) in enumerate(definitions.modes[mode]):
+                if index == 0:
+                    plan.append(PlanStep(offset, bit, bit if value else 0, mode, gap, previous_hold))
+                else:
+                    plan.append(PlanStep(offset, bit, bit if value else 0, mode, GAP_PIN, pin_delay))
+                offset += pin_delay
+            plan.append(PlanStep(offset, 0, 0, mode, GAP_PIN if pin_delay else None, pin_delay))
+            switched = offset
+        start = max(start + hold, switched)
+        previous_hold = hold
+    return tuple(plan)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+          Sample Recorder
+====================================
+--------------
+Usage Example:
+--------------
+
+from sample_recorder import SampleRecorder, read_log
+
+# Stream every ADC read into a binary log.
+recorder = SampleRecorder('logs/adc.bin')
+adc.add_sample_listener(recorder.record)
+...
+adc.stop()
+recorder.close()
+
+# Read the log back as a zero-copy NumPy view.
+samples = read_log('logs/adc.bin')
+samples['latency'].max()
+'''
+
+import math
+import mmap
+import os
+import struct
+
+from .bus_backend import ADS1115_CHANNELS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = b'I2CSAMPL'
+VERSION = 2
+
+# Every record holds the monotonic timestamp, the latency in seconds, the raw value, the error code
+# and the channel as its index in ADS1115_CHANNELS.
+RECORD = struct.Struct('<dfiHBx')
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = mmap.ALLOCATIONGRANULARITY
+MISSING_VALUE = -2 ** 31
+CHANNEL_CODES = {channel: code for code, channel in enumerate(ADS1115_CHANNELS)}
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([
+        ('timestamp', '<f8'),
+        ('latency', '<f4'),
+        ('value', '<i4'),
+        ('error', '<u2'),
+        ('channel', 'u1'),
+        ('reserved', 'V1')
+    ])
+else:
+    RECORD_DTYPE = None
+
+
+class SampleRecorder:
+    '''
+    This class streams samples into a memory-mapped binary log one chunk at a time.
+
+    Records are packed straight into a mapped chunk of the file, so recording a
+    sample is a single pack_into with no allocation or system call. Only when a
+    chunk fills is the file grown and the next chunk mapped, leaving the kernel
+    to write the pages back in batches. Memory use is one chunk however long
+    the run is.
+    '''
+
+    def __init__(self, path, chunk_records=16384):
+        alignment = math.lcm(RECORD.size, mmap.ALLOCATIONGRANULARITY) // RECORD.size
+        self.chunk_records = math.ceil(chunk_records / alignment) * alignment
+        self.chunk_bytes = self.chunk_records * RECORD.size
+        self.path = path
+        self.records = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w+b')
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, HEADER_SIZE).ljust(HEADER_SIZE, b'\0'))
+        self._file.flush()
+        self._chunk = None
+        self._chunk_start = HEADER_SIZE
+        self._offset = 0
+        self._map_chunk()
+
+    def _map_chunk(self):
+        ''' Grow the file by one chunk and map it. '''
+        if self._chunk is not None:
+            self._chunk.close()
+            self._chunk_start += self.chunk_bytes
+        os.ftruncate(self._file.fileno(), self._chunk_start + self.chunk_bytes)
+        self._chunk = mmap.mmap(self._file.fileno(), self.chunk_bytes, offset=self._chunk_start)
+        self._offset = 0
+
+    def record(self, timestamp, value, latency, error, channel='P0'):
+        ''' Append a sample, this matches the ADC sample listener signature. '''
+        RECORD.pack_into(
+            self._chunk, self._offset, timestamp, latency,
+            MISSING_VALUE if value is None else value, error, CHANNEL_CODES[channel]
+        )
+        self._offset += RECORD.size
+        self.records += 1
+        if self._offset == self.chunk_bytes:
+            self._map_chunk()
+
+    def close(self):
+        ''' Unmap the last chunk and trim the file to the recorded samples. '''
+        if self._chunk is None:
+            return
+        self._chunk.close()
+        self._chunk = None
+        os.ftruncate(self._file.fileno(), HEADER_SIZE + self.records * RECORD.size)
+        self._file.close()
+
+
+def _read_header(file):
+    ''' Read and check the header of a log, returning the header size. '''
+    magic, version, record_size, header_size = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f'{file.name} is not a version {VERSION} sample log')
+    return header_size
+
+
+def read_log(path):
+    ''' Map a log as a read-only structured NumPy array without copying it. '''
+    if numpy is None:
+        raise RuntimeError('NumPy is required to map a sample log, use iter_records instead.')
+    with open(path, 'rb') as file:
+        header_size = _read_header(file)
+    count = (os.path.getsize(path) - header_size) // RECORD.size
+    if count == 0:
+        return numpy.empty(0, dtype=RECORD_DTYPE)
+    return numpy.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=header_size, shape=(count,))
+
+
+def iter_records(path):
+    ''' Yield (timestamp, value, latency, error, channel) for every record of a log, without NumPy. '''
+    with open(path, 'rb') as file:
+        file.seek(_read_header(file))
+        while True:
+            chunk = file.read(RECORD.size * 4096)
+            if not chunk:
+                return
+            for timestamp, latency, value, error, channel in RECORD.iter_unpack(chunk):
+                yield timestamp, None if value == MISSING_VALUE else value, latency, error, ADS1115_CHANNELS[channel]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+             Sequencer
+====================================
+--------------
+Usage Example:
+--------------
+
+from sequencer import Sequencer
+
+# Commands run one after another on a single long-lived worker thread.
+sequencer = Sequencer()
+sequencer.submit(mcp.set_sequence, 'run_cycle')
+
+# Preempt the running command, drop the queued ones and wait until the worker is idle.
+sequencer.stop()
+'''
+
+import queue
+import threading
+import traceback
+
+
+class Sequencer:
+    '''
+    This class runs commands in order on one long-lived worker thread.
+
+    Commands check stop_event between their steps. stop() sets it, drops every
+    queued command and only returns once the worker is idle, so nothing is
+    left touching the pins after it returns. A command submitted from another
+    thread while a stop is under way is queued once it returns, instead of
+    being dropped or slipping in before stop_event is cleared.
+    '''
+
+    def __init__(self, name='sequencer'):
+        self.name = name
+        self.stop_event = threading.Event()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop_lock = threading.Lock()
+
+    def _start(self):
+        ''' Start the worker thread the first time a command is submitted. '''
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        ''' Run queued commands until the worker is shut down. '''
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                command, args = item
+                if not self.stop_event.is_set():
+                    command(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def submit(self, command, *args):
+        ''' Queue a command to run after the ones already queued. '''
+        self._start()
+        # The worker is never waiting on a stop to submit from it, and a stop would deadlock waiting on the worker.
+        if threading.current_thread() is self._thread:
+            self._queue.put((command, args))
+            return
+        with self._stop_lock:
+            self._queue.put((command, args))
+
+    def is_busy(self) -> bool:
+        ''' Check if a command is running or queued. '''
+        return self._queue.unfinished_tasks > 0
+
+    def wait(self):
+        ''' Wait until every queued command has run. '''
+        self._queue.join()
+
+    def stop(self):
+        ''' Preempt the running command, drop the queued ones and wait until the worker is idle. '''
+        with self._stop_lock:
+            self.stop_event.set()
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+            self._queue.join()
+            self.stop_event.clear()
+
+    def shutdown(self):
+        ''' Stop the worker thread. '''
+        self.stop()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
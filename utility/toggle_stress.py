@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+           Toggle Stress
+====================================
+--------------
+Usage Example:
+--------------
+
+from toggle_stress import ToggleStress
+
+# Toggle the output latch 500 times a second without switching any relay, reading GPIO back after every write.
+toggle = ToggleStress(rate=500, pins=())
+toggle.start()
+...
+toggle.stop()
+toggle.get_snapshot().latency_summary()
+'''
+
+from collections import namedtuple
+import threading
+import time
+
+from .adc_config import LatencyHistogram, PacedScheduler
+from .bus_backend import MCP23017_ADDRESS
+from .bus_faults import FaultCounters, RetryPolicy, classify
+from .mcp_config import MCP, OUTPUT_PINS, PINS
+
+
+class ToggleSnapshot(namedtuple('ToggleSnapshot', (
+    'timestamp', 'writes', 'errors', 'verify_failures', 'missed', 'duration', 'achieved_rate', 'target_rate',
+    'latency', 'last_fault', 'faults'
+))):
+    '''
+    This class is an immutable view of a toggle stress run at one point in time.
+
+    Every write is timed together with its read back, and target_rate is 0
+    when the latch is written as fast as the bus allows.
+    '''
+
+    __slots__ = ()
+
+    def latency_summary(self) -> dict:
+        ''' Get the p50, p90, p99, p99.9 and max write latencies in milliseconds. '''
+        return self.latency.summary()
+
+
+class ToggleStress:
+    '''
+    This class drives the MCP23017 output latch as fast as possible, or at a target rate.
+
+    Every write flips the bits of pins, all the output pins by default. Relays
+    left out of pins are never switched, with no pins at all every write puts
+    the same value back, so the bus is stressed without wearing out a relay.
+    With verify set GPIO and OLAT are read back after every write and any
+    difference counts as a verify failure.
+
+    The writing thread publishes a ToggleSnapshot every SNAPSHOT_INTERVAL
+    seconds and when it stops, get_snapshot returns the latest one.
+    '''
+
+    SNAPSHOT_INTERVAL = 0.05
+
+    def __init__(self, rate=0, pins=None, verify=True, backend=None, fail_after=10, address=MCP23017_ADDRESS):
+        pins = OUTPUT_PINS if pins is None else tuple(pins)
+        for pin in pins:
+            if pin not in OUTPUT_PINS:
+                raise ValueError(f'Unknown output pin: {pin}, expected one of: {", ".join(OUTPUT_PINS)}')
+        if rate < 0:
+            raise ValueError(f'Rate must be 0 or more writes per second, got: {rate}')
+        self.pins = pins
+        self.mask = sum(1 << PINS[pin] for pin in pins)
+        self.rate = rate
+        self.verify = verify
+        self.writes = 0
+        self.errors = 0
+        self.start_time = None
+        self.end_time = None
+        self.scheduler = PacedScheduler(rate, 1) if rate else None
+        self.latency = LatencyHistogram()
+        self.faults = FaultCounters(RetryPolicy(retries=0, recover_after=0, fail_after=fail_after))
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._snapshot = None
+        self._values = 0
+        self.mcp = MCP(backend=backend, address=address)
+        self._publish(time.monotonic())
+
+    def is_initialized(self) -> bool:
+        ''' Check if the MCP hardware was initialized. '''
+        return self.mcp.is_initialized()
+
+    def start(self):
+        ''' Start the writing thread. '''
+        if not self.is_initialized() or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._toggle_continuous)
+        self._thread.start()
+
+    def toggle(self):
+        ''' Flip the pins with one write of the latch, then read it back if verify is set. '''
+        self._values ^= self.mask
+        started = time.perf_counter_ns()
+        try:
+            self.mcp.write_outputs(self.mask, self._values)
+            if self.verify:
+                self.mcp.verify_outputs()
+            self.faults.record_success(False)
+        except IOError as error:
+            self.errors += 1
+            self.faults.record_fault(classify(error))
+            self.faults.record_failure()
+        self.latency.record_ns(time.perf_counter_ns() - started)
+        self.writes += 1
+
+    def _toggle_continuous(self):
+        ''' Toggle the latch until the stop event is set or the bus fails, paced by the scheduler if one is set. '''
+        self.start_time = time.monotonic()
+        if self.scheduler is not None:
+            self.scheduler.start()
+        next_snapshot = self.start_time
+        try:
+            while not self._stop_event.is_set() and not self.faults.bus_failed:
+                if self.scheduler is not None and not self.scheduler.wait_next(self._stop_event):
+                    break
+                self.toggle()
+                now = time.monotonic()
+                self.end_time = now
+                if now >= next_snapshot:
+                    self._publish(now)
+                    next_snapshot = now + self.SNAPSHOT_INTERVAL
+        finally:
+            self.release()
+            self._publish(time.monotonic())
+
+    def release(self):
+        ''' Leave the toggled relays off. '''
+        try:
+            self.mcp.write_outputs(self.mask, 0)
+        except IOError:
+            pass
+
+    def _publish(self, now):
+        ''' Publish a snapshot of the run, replacing the previous one in a single assignment. '''
+        duration = now - self.start_time if self.start_time is not None else 0.0
+        self._snapshot = ToggleSnapshot(
+            timestamp=now,
+            writes=self.writes,
+            errors=self.errors,
+            verify_failures=self.mcp.get_verify_faults(),
+            missed=self.scheduler.get_missed() if self.scheduler is not None else 0,
+            duration=duration,
+            achieved_rate=self.writes / duration if duration > 0 else 0.0,
+            target_rate=float(self.rate),
+            latency=self.latency.copy(),
+            last_fault=self.mcp.last_verify_fault,
+            faults=self.faults.summary()
+        )
+
+    def get_snapshot(self) -> ToggleSnapshot:
+        ''' Get the latest snapshot published by the writing thread. '''
+        return self._snapshot
+
+    def is_running(self) -> bool:
+        ''' Check if the writing thread is still running, it stops by itself once the bus fails. '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        ''' Stop the writing thread. '''
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
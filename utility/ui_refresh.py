@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+'''
+====================================
+            UI Refresh
+====================================
+--------------
+Usage Example:
+--------------
+
+from ui_refresh import AdaptiveRefresh
+
+# Refresh at most 20 times a second, backing off to twice a second while nothing changes.
+refresh = AdaptiveRefresh(min_interval=0.05, max_interval=0.5)
+started = time.perf_counter()
+changed = dialog.update_information(...)
+Clock.schedule_once(update, refresh.frame(changed, time.perf_counter() - started))
+'''
+
+import time
+
+from .adc_config import LatencyHistogram
+
+
+class AdaptiveRefresh:
+    '''
+    This class paces UI refreshes and measures what they cost.
+
+    A refresh that changed something brings the interval back to the base
+    interval, one that changed nothing doubles it up to max_interval. The base
+    interval grows whenever a refresh takes more than budget of the time until
+    the next one, so the UI never takes more than its share of the CPU from the
+    I2C threads.
+    '''
+
+    def __init__(self, min_interval=0.05, max_interval=0.5, budget=0.02, clock=time.monotonic):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self.clock = clock
+        self.interval = min_interval
+        self.frames = 0
+        self.renders = 0
+        self.busy = 0.0
+        self.start_time = None
+        self.cost = LatencyHistogram()
+
+    def start(self):
+        ''' Start measuring from the current time. '''
+        self.interval = self.min_interval
+        self.frames = 0
+        self.renders = 0
+        self.busy = 0.0
+        self.start_time = self.clock()
+        self.cost.reset()
+
+    def frame(self, changed, cost) -> float:
+        ''' Record a refresh and what it cost in seconds, returning the interval until the next one. '''
+        if self.start_time is None:
+            self.start()
+        self.frames += 1
+        self.busy += cost
+        self.cost.record(cost)
+        base = min(max(self.min_interval, cost / self.budget), self.max_interval)
+        if changed:
+            self.renders += 1
+            self.interval = base
+        else:
+            self.interval = min(max(self.interval * 2, base), self.max_interval)
+        return self.interval
+
+    def report(self) -> dict:
+        ''' Get the refreshes, the ones that rendered, the share of time spent refreshing and the cost percentiles. '''
+        elapsed = self.clock() - self.start_time if self.start_time is not None else 0.0
+        report = {
+            'frames': self.frames,
+            'renders': self.renders,
+            'load': self.busy / elapsed if elapsed > 0 else 0.0
+        }
+        report.update(self.cost.summary())
+        return report